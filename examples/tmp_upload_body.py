@@ -5,9 +5,13 @@ from hematite.request import Request
 DEFAULT_URL = 'http://localhost:5000/debug'
 
 
-def test_post(url, method='POST'):
+def test_post(url, method='POST', filename=None):
     client = Client()
     data = '{}'  # 'a' * 2 ** 22
+    if filename:
+        # files are sent with their size as the Content-Length, using
+        # sendfile where available
+        data = open(filename, 'rb')
     req = Request(method, url, body=data)
     req.content_type = 'application/json'
     client_resp = client.request(request=req)
@@ -20,8 +24,9 @@ def main():
     prs = argparse.ArgumentParser()
     prs.add_argument('url', nargs='?', default=DEFAULT_URL)
     prs.add_argument('--method', default='POST')
+    prs.add_argument('--file', help='upload the contents of a file')
     args = prs.parse_args()
-    test_post(url=args.url, method=args.method)
+    test_post(url=args.url, method=args.method, filename=args.file)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""\
+An asyncio transport for the client. Rather than going through
+:func:`hematite.async.join`, the request writer and response reader
+are driven directly from an asyncio :class:`Protocol`'s callbacks, so
+requests run concurrently with everything else on the event loop:
+
+    resp = await client.get.coro('http://example.com/')
+
+On Python 2, the trollius port of asyncio is used if it's installed.
+"""
+
+import time
+import socket
+
+try:
+    import asyncio
+except ImportError:
+    try:
+        import trollius as asyncio
+    except ImportError:
+        asyncio = None
+
+from hematite.raw import core
+from hematite.raw import messages as M
+from hematite.raw.parser import ResponseReader
+from hematite.response import Response
+
+if asyncio is not None:
+    _ensure_future = (getattr(asyncio, 'ensure_future', None)
+                      or getattr(asyncio, 'async'))
+    _BaseProtocol = asyncio.Protocol
+else:
+    _BaseProtocol = object
+
+
+def _get_state_machine():
+    from hematite.client import _State  # circular
+    return _State
+
+
+class ClientResponseProtocol(_BaseProtocol):
+    """\
+    Sends a :class:`~hematite.client.ClientResponse`'s request and
+    reads its response, resolving *future* with the ClientResponse
+    once the response is complete.
+    """
+    def __init__(self, client_resp, future):
+        self.client_resp = client_resp
+        self.future = future
+        self.transport = None
+
+        self.writer = client_resp.raw_request.get_writer()
+        self.writer_iter = iter(self.writer)
+        self.file_iter = None
+        self.sent = False
+        self.reader = ResponseReader(
+            request_method=client_resp.raw_request.method)
+        self.paused = False
+
+    def connection_made(self, transport):
+        _State = _get_state_machine()
+        self.transport = transport
+        self.client_resp.state = _State.Sending
+        self.client_resp.timings['connected'] = time.time()
+        metrics = self.client_resp.metrics
+        metrics.mark('connect_done')
+        if transport.get_extra_info('sslcontext') is not None:
+            metrics.mark('tls_done')  # handshakes before connection_made
+        metrics.mark('send_start')
+        self._write()
+
+    def pause_writing(self):
+        self.paused = True
+
+    def resume_writing(self):
+        self.paused = False
+        self._write()
+
+    def data_received(self, data):
+        if 'first_read' not in self.client_resp.timings:
+            self.client_resp.timings['first_read'] = time.time()
+        self.client_resp.metrics.mark('first_byte')
+        self._read(data)
+
+    def eof_received(self):
+        self._read(b'')  # signals EOF to the reader
+        return False  # let the transport close itself
+
+    def connection_lost(self, exc):
+        if self.future.done():
+            return
+        if exc is None:
+            exc = core.EndOfStream('connection closed before the'
+                                   ' response was complete')
+        self._fail(exc)
+
+    def _write(self):
+        _State = _get_state_machine()
+        if self.future.done() or self.sent:
+            return
+        while True:
+            if self.file_iter is not None:
+                # file bodies are read in as the transport drains
+                for data in self.file_iter:
+                    self.transport.write(data)
+                    if self.paused:
+                        return
+                self.file_iter = None
+            state = next(self.writer_iter)
+            if state is M.Complete:
+                self.sent = True
+                self.client_resp.state = _State.Receiving
+                self.client_resp.timings['sent'] = time.time()
+                self.client_resp.metrics.mark('sent')
+                return
+            elif state.type == M.HaveFile.type:
+                self.file_iter = iter(state.value.send_data())
+                continue
+            self.transport.write(state.value)
+            if self.paused:
+                return
+
+    def _read(self, data):
+        if self.future.done():
+            return
+        try:
+            events = self.reader.feed(data)
+        except Exception as e:
+            self._fail(e)
+            return
+        for event in events:
+            if event.type == M.HeadersComplete.type:
+                self.client_resp.metrics.mark('headers_complete')
+        if self.reader.complete:
+            self._complete()
+
+    def _complete(self):
+        _State = _get_state_machine()
+        client_resp = self.client_resp
+        client_resp.raw_response = self.reader.raw_response
+        client_resp.response = Response.from_raw_response(
+            client_resp.raw_response)
+        client_resp.state = _State.Complete
+        client_resp.timings['complete'] = time.time()
+        client_resp.metrics.mark('complete')
+        client_resp.reader, client_resp.writer = self.reader, self.writer
+        client_resp._record_metrics()
+        self.transport.close()
+        self.future.set_result(client_resp)
+
+    def _fail(self, exc):
+        self.client_resp.error = exc
+        self.client_resp.reader = self.reader
+        self.client_resp.writer = self.writer
+        self.client_resp._record_metrics()
+        if self.transport is not None:
+            self.transport.close()
+        if not self.future.done():
+            self.future.set_exception(exc)
+
+
+def request_coro(client_resp, timeout=None, loop=None):
+    """\
+    Starts *client_resp* on the event loop, returning a Future that
+    resolves to *client_resp* once the response has been read.
+    """
+    if asyncio is None:
+        raise RuntimeError('asyncio (or trollius on Python 2) is'
+                           ' required for coroutine requests')
+    from hematite.client import ConnectionError, RequestTimeout  # circular
+    _State = _get_state_machine()
+
+    loop = loop or asyncio.get_event_loop()
+    future = asyncio.Future(loop=loop)
+    url = client_resp.raw_request.host_url
+    is_ssl = url.scheme.lower() == 'https'
+    port = url.port or (443 if is_ssl else 80)
+    protocol = ClientResponseProtocol(client_resp, future)
+
+    client_resp.state = _State.Connecting
+    client_resp.timings['started'] = time.time()
+    client_resp.metrics.mark('started')
+    client_resp.metrics.mark('connect_start')  # dns included
+    conn_future = _ensure_future(loop.create_connection(lambda: protocol,
+                                                        url.host,
+                                                        port,
+                                                        ssl=is_ssl or None),
+                                 loop=loop)
+
+    def _on_connected(f):
+        if f.cancelled():
+            return
+        exc = f.exception()
+        if exc is None:
+            return
+        if isinstance(exc, socket.error):
+            exc = ConnectionError(socket_error=exc)
+        protocol._fail(exc)
+
+    conn_future.add_done_callback(_on_connected)
+
+    if timeout is not None:
+        def _on_timeout():
+            if future.done():
+                return
+            conn_future.cancel()
+            protocol._fail(RequestTimeout('request did not complete within'
+                                          ' %s seconds' % timeout))
+
+        timer = loop.call_later(timeout, _on_timeout)
+        future.add_done_callback(lambda f: timer.cancel())
+    return future
@@ -1,38 +1,206 @@
 # -*- coding: utf-8 -*-
 
+import heapq
 import time
-import select
+from itertools import count
 
+from hematite.compat import selectors, monotonic
 
-def join(reqs, timeout=5.0, raise_exc=True,
-         follow_redirects=None, select_timeout=0.05):
-    ret = list(reqs)
-    cutoff_time = time.time() + timeout
-
-    while True:
-        readers = [r for r in reqs if r.want_read]
-        writers = [r for r in reqs if r.want_write]
-
-        # forced writers are e.g., resolving/connecting, don't have sockets yet
-        forced_writers = [r for r in writers if r.fileno() is None]
-        selectable_writers = [r for r in writers if r.fileno() is not None]
-
-        if not (readers or writers):
-            break
-        if time.time() > cutoff_time:
-            # TODO: is time.time monotonic? no, so... time.clock()?
-            break
-
-        if readers or selectable_writers:
-            read_ready, write_ready, _ = select.select(readers,
-                                                       selectable_writers,
-                                                       [],
-                                                       select_timeout)
-            write_ready.extend(forced_writers)
-        else:
-            read_ready = []
-            write_ready = forced_writers
+EVENT_READ, EVENT_WRITE = selectors.EVENT_READ, selectors.EVENT_WRITE
+
+# the selector class join() polls with. swap in any class implementing
+# the selectors API (e.g., selectors.PollSelector) to change backends.
+DefaultPoller = selectors.DefaultSelector
+
+
+class _Registry(object):
+    """\
+    Tracks which joinables are registered with the poller, and for
+    what. Joinables are registered once, when they first have a
+    socket, and only modified when their want_read/want_write flips,
+    rather than rebuilding the full set of fds on every tick.
+    """
+    def __init__(self, poller):
+        self.poller = poller
+        self.registered = {}  # joinable -> (fd, events)
+        self.fd_owners = {}  # fd -> joinable
+        self.forced = []  # wants to write but has no fd (resolving, etc.)
+        self.finished = []  # want nothing, as of the last update
+
+    def update(self, joinables):
+        """Re-checks the interest of the given joinables, returning
+        whether anything is left to poll or force. Those that no longer
+        want anything are left in :attr:`finished`.
+        """
+        joinables = set(joinables)
+        forced = [jn for jn in self.forced if jn not in joinables]
+        finished = []
+        for jn in joinables:
+            want_read, want_write = jn.want_read, jn.want_write
+            if not (want_read or want_write):
+                self._unregister(jn)
+                finished.append(jn)
+                continue
+            fd = jn.fileno()
+            if fd is None:
+                self._unregister(jn)
+                if want_write:
+                    forced.append(jn)
+                continue
+            events = ((EVENT_READ if want_read else 0)
+                      | (EVENT_WRITE if want_write else 0))
+            cur = self.registered.get(jn)
+            if cur == (fd, events):
+                continue
+            if cur is not None and cur[0] != fd:
+                self._unregister(jn)
+                cur = None
+            owner = self.fd_owners.get(fd)
+            if owner is not None and owner is not jn:
+                # pooled sockets can be handed from one response to
+                # another within the same join
+                self._unregister(owner)
+            if cur is None:
+                self.poller.register(fd, events, jn)
+            else:
+                self.poller.modify(fd, events, jn)
+            self.registered[jn] = (fd, events)
+            self.fd_owners[fd] = jn
+        self.forced = forced
+        self.finished = finished
+        return bool(self.registered or forced)
+
+    def _unregister(self, jn):
+        cur = self.registered.pop(jn, None)
+        if cur is None:
+            return
+        fd = cur[0]
+        if self.fd_owners.get(fd) is jn:
+            del self.fd_owners[fd]
+        try:
+            self.poller.unregister(fd)
+        except (KeyError, ValueError):
+            pass
+
+
+class _Timers(object):
+    """\
+    A heap of joinables' deadlines. Joinables with a ``deadline``
+    (monotonic time, or None) are failed through their
+    ``check_deadline`` once it passes, see ClientResponse. Deadlines
+    that have moved since they were pushed are skipped when popped,
+    rather than searched for and removed.
+    """
+    def __init__(self):
+        self.heap = []
+        self.scheduled = {}  # joinable -> deadline
+        self._counter = count()  # breaks ties, joinables don't compare
+
+    def update(self, joinables):
+        scheduled = self.scheduled
+        for jn in joinables:
+            deadline = getattr(jn, 'deadline', None)
+            if deadline == scheduled.get(jn):
+                continue
+            if deadline is None:
+                del scheduled[jn]
+                continue
+            scheduled[jn] = deadline
+            heapq.heappush(self.heap, (deadline, next(self._counter), jn))
+
+    @property
+    def next_deadline(self):
+        heap, scheduled = self.heap, self.scheduled
+        while heap and scheduled.get(heap[0][2]) != heap[0][0]:
+            heapq.heappop(heap)  # stale
+        return heap[0][0] if heap else None
 
+    def pop_expired(self, now):
+        """Returns the joinables whose deadlines have passed, having
+        given each a chance to fail."""
+        ret = []
+        while True:
+            deadline = self.next_deadline
+            if deadline is None or deadline > now:
+                break
+            jn = heapq.heappop(self.heap)[2]
+            del self.scheduled[jn]
+            jn.check_deadline(now)
+            ret.append(jn)
+        return ret
+
+
+class Joiner(object):
+    """\
+    Drives a changing set of joinables: add them as they come, and
+    :meth:`poll` to service whichever are ready, getting back those
+    that are done (i.e., no longer want to read or write). See
+    :func:`join` for running a fixed set to completion.
+    """
+    def __init__(self, raise_exc=True, select_timeout=0.05):
+        self.raise_exc = raise_exc
+        self.select_timeout = select_timeout
+        self.poller = DefaultPoller()
+        self.registry = _Registry(self.poller)
+        self.timers = _Timers()
+        self.active = set()
+        # active, but with nothing to poll or force, so stuck
+        self.stalled = False
+        self._to_update = []  # joinables that may have changed state
+        self._last_forced = set()
+
+    def add(self, joinable):
+        self.active.add(joinable)
+        self._to_update.append(joinable)
+
+    def poll(self, timeout=None):
+        """\
+        Waits up to *timeout* seconds (or until the nearest deadline)
+        for joinables to be ready, and services them. Returns the
+        joinables that are done, if any, without waiting.
+        """
+        registry, timers = self.registry, self.timers
+        to_update, self._to_update = self._to_update, []
+        registry.update(to_update)
+        timers.update(to_update)
+        done = [jn for jn in registry.finished if jn in self.active]
+        self.active.difference_update(done)
+        self.stalled = bool(self.active and not (registry.registered
+                                                 or registry.forced))
+        if done or not self.active or self.stalled:
+            return done
+
+        poll_timeout = timeout
+        next_deadline = timers.next_deadline
+        if next_deadline is not None:
+            until_deadline = next_deadline - monotonic()
+            if poll_timeout is None or until_deadline < poll_timeout:
+                poll_timeout = until_deadline
+        if registry.forced:
+            if poll_timeout is None or self.select_timeout < poll_timeout:
+                poll_timeout = self.select_timeout
+        if poll_timeout is not None:
+            poll_timeout = max(poll_timeout, 0)
+
+        read_ready, write_ready = [], []
+        forced = registry.forced
+        if registry.registered:
+            for key, events in self.poller.select(poll_timeout):
+                if events & EVENT_READ:
+                    read_ready.append(key.data)
+                if events & EVENT_WRITE:
+                    write_ready.append(key.data)
+        elif poll_timeout and self._last_forced.issuperset(forced):
+            # all forced last time too, and still without an fd (e.g.,
+            # waiting on the pool), so there's nothing to do but wait
+            time.sleep(poll_timeout)
+        self._last_forced = set(forced)
+        write_ready.extend(forced)
+        expired = timers.pop_expired(monotonic())
+
+        # only joinables that were serviced (or timed out) can have
+        # changed state
+        self._to_update = read_ready + write_ready + expired
         try:
             for wr in write_ready:
                 _keep_writing = True
@@ -43,6 +211,42 @@ def join(reqs, timeout=5.0, raise_exc=True,
                 while _keep_reading:
                     _keep_reading = rr.do_read()
         except Exception:
-            if raise_exc:
+            if self.raise_exc:
                 raise
+        return []
+
+    def close(self):
+        self.poller.close()
+
+
+def join(reqs, timeout=5.0, raise_exc=True,
+         follow_redirects=None, select_timeout=0.05):
+    """\
+    Drives *reqs* until they're done or *timeout* seconds have passed.
+    Individual requests can time out sooner, according to their own
+    deadlines, without affecting the rest. The poller waits until the
+    nearest deadline, or *select_timeout* while there are joinables
+    without a file descriptor (e.g., waiting on the connection pool).
+    Joinables left unfinished are closed, if they can be, so that they
+    don't hold onto connections (or their slots in the pool).
+    """
+    ret = list(reqs)
+    cutoff_time = monotonic() + timeout
+    joiner = Joiner(raise_exc=raise_exc, select_timeout=select_timeout)
+    for jn in ret:
+        joiner.add(jn)
+    try:
+        while joiner.active:
+            remaining = cutoff_time - monotonic()
+            if remaining < 0:
+                break
+            joiner.poll(remaining)
+            if joiner.stalled:
+                break
+    finally:
+        joiner.close()
+        for jn in joiner.active:
+            close = getattr(jn, 'close', None)
+            if close is not None:
+                close()
     return ret
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""\
+Benchmarks for hematite's parsers, serializers and client. Each
+benchmark runs fixed inputs a fixed number of times, so that runs are
+comparable from one commit to the next. Results are written out as
+JSON, and a previous run's results can be passed in as a baseline:
+
+    python -m hematite.bench -o after.json --baseline before.json
+"""
+
+import gc
+import sys
+import json
+import time
+import platform
+from timeit import default_timer
+
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 0.10  # fraction slower than baseline to flag
+
+_BENCHMARKS = []
+
+
+class Benchmark(object):
+    """\
+    A named benchmark. *setup* is called once per repeat and returns
+    the callable that's timed, which is then called *number* times.
+    """
+    def __init__(self, name, setup, number):
+        self.name = name
+        self.setup = setup
+        self.number = number
+
+    def run(self, repeat=DEFAULT_REPEAT, number=None):
+        number = number or self.number
+        times = []
+        gc_was_enabled = gc.isenabled()
+        try:
+            for _ in range(repeat):
+                func = self.setup()
+                gc.collect()
+                gc.disable()
+                start = default_timer()
+                for _ in xrange(number):
+                    func()
+                times.append(default_timer() - start)
+                if gc_was_enabled:
+                    gc.enable()
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        per_op = sorted([t / number for t in times])
+        return {'number': number,
+                'repeat': repeat,
+                'min': per_op[0],
+                'median': per_op[len(per_op) // 2],
+                'max': per_op[-1]}
+
+    def __repr__(self):
+        cn = self.__class__.__name__
+        return '<%s name=%r number=%r>' % (cn, self.name, self.number)
+
+
+def benchmark(name, number):
+    """\
+    Registers the decorated setup function as a :class:`Benchmark`.
+    """
+    def decorator(setup):
+        _BENCHMARKS.append(Benchmark(name, setup, number))
+        return setup
+    return decorator
+
+
+def get_benchmarks(names=None):
+    # importing registers them
+    from hematite.bench import micro, loopback, replay
+    if not names:
+        return list(_BENCHMARKS)
+    return [b for b in _BENCHMARKS
+            if any([b.name.startswith(n) for n in names])]
+
+
+def run_benchmarks(benchmarks, repeat=DEFAULT_REPEAT, scale=1.0,
+                   out=None):
+    results = {}
+    for bench in benchmarks:
+        number = max(1, int(bench.number * scale))
+        results[bench.name] = bench.run(repeat=repeat, number=number)
+        if out is not None:
+            out.write('%-36s %12.3f us\n'
+                      % (bench.name, results[bench.name]['min'] * 1e6))
+    return {'meta': {'python': sys.version.split()[0],
+                     'implementation': platform.python_implementation(),
+                     'platform': platform.platform(),
+                     'timestamp': time.time()},
+            'results': results}
+
+
+def save_results(results, path):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare_results(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """\
+    Returns a list of ``(name, baseline_min, current_min, ratio,
+    regressed)`` for every benchmark present in both runs. Minimums are
+    compared, as the least noisy of the measurements.
+
+    >>> base = {'results': {'x': {'min': 1.0}, 'y': {'min': 1.0}}}
+    >>> cur = {'results': {'x': {'min': 1.5}, 'y': {'min': 0.5}}}
+    >>> [(name, regressed) for name, _, _, _, regressed
+    ...  in compare_results(base, cur)]
+    [(u'x', True), (u'y', False)]
+    """
+    ret = []
+    base_results = baseline['results']
+    for name, cur in sorted(current['results'].items()):
+        base = base_results.get(name)
+        if base is None:
+            continue
+        ratio = cur['min'] / base['min'] if base['min'] else float('inf')
+        ret.append((unicode(name), base['min'], cur['min'], ratio,
+                    ratio > 1 + threshold))
+    return ret
+
+
+def main(argv=None):
+    import argparse
+    prs = argparse.ArgumentParser(prog='python -m hematite.bench')
+    prs.add_argument('names', nargs='*',
+                     help='only run benchmarks starting with these names')
+    prs.add_argument('-o', '--output', help='write JSON results here')
+    prs.add_argument('--baseline', help='compare with these JSON results')
+    prs.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    prs.add_argument('--scale', type=float, default=1.0,
+                     help='multiplies the number of iterations')
+    prs.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    args = prs.parse_args(argv)
+
+    results = run_benchmarks(get_benchmarks(args.names), repeat=args.repeat,
+                             scale=args.scale, out=sys.stdout)
+    if args.output:
+        save_results(results, args.output)
+    if not args.baseline:
+        return 0
+    regressed = False
+    for name, base, cur, ratio, is_regression in compare_results(
+            load_results(args.baseline), results, args.threshold):
+        regressed = regressed or is_regression
+        sys.stdout.write('%-36s %6.2fx%s\n'
+                         % (name, ratio,
+                            '  REGRESSED' if is_regression else ''))
+    return 1 if regressed else 0
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""\
+End-to-end client benchmarks: batches of requests sent through
+:func:`hematite.async.join` to a local LoopbackServer, so that the
+connection pool, drivers, parsers and polling are all exercised over
+real sockets.
+"""
+
+from hematite import async
+from hematite.bench import benchmark
+from hematite.client import Client
+from hematite.loopback import LoopbackServer, make_response
+
+BATCH_SIZE = 50
+SMALL_BODY = 'x' * 64
+LARGE_BODY = 'x' * 2 ** 18
+
+
+def _make_response(body):
+    return make_response(body, headers=[('Content-Type', 'text/plain')])
+
+
+_server = None
+
+
+def get_server():
+    global _server
+    if _server is None:
+        _server = LoopbackServer({'/': _make_response(SMALL_BODY),
+                                  '/large': _make_response(LARGE_BODY)})
+    return _server
+
+
+def _make_batch(path):
+    url = get_server().url(path)
+    client = Client()
+
+    def run_batch():
+        resps = [client.get.async(url) for _ in range(BATCH_SIZE)]
+        async.join(resps, timeout=30.0)
+        for resp in resps:
+            if not resp.is_complete:
+                raise RuntimeError('loopback request failed: %r'
+                                   % (resp.error,))
+    return run_batch
+
+
+@benchmark('loopback.join_small', number=20)
+def join_small():
+    return _make_batch('/')
+
+
+@benchmark('loopback.join_large', number=5)
+def join_large():
+    return _make_batch('/large')
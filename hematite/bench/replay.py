@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""\
+The loopback benchmarks' batches, replayed from a recording rather
+than sent to the stand-in server, so that only the client's own work
+(pool, join, parsing) is measured.
+"""
+
+import atexit
+import shutil
+import tempfile
+
+from hematite import async
+from hematite.bench import benchmark
+from hematite.bench.loopback import BATCH_SIZE, get_server
+from hematite.replay import TrafficRecording, RecordingClient, ReplayClient
+
+_recording = None
+
+
+def get_recording():
+    global _recording
+    if _recording is None:
+        path = tempfile.mkdtemp(prefix='hematite-bench-')
+        atexit.register(shutil.rmtree, path, True)
+        _recording = TrafficRecording(path + '/traffic')
+        client = RecordingClient(_recording)
+        for path in ('/', '/large'):
+            client.get(get_server().url(path))
+    return _recording
+
+
+def _make_batch(path):
+    url = get_server().url(path)
+    client = ReplayClient(get_recording())
+
+    def run_batch():
+        resps = [client.get.async(url) for _ in range(BATCH_SIZE)]
+        async.join(resps, timeout=30.0)
+        for resp in resps:
+            if not resp.is_complete:
+                raise RuntimeError('replayed request failed: %r'
+                                   % (resp.error,))
+    return run_batch
+
+
+@benchmark('replay.join_small', number=20)
+def join_small():
+    return _make_batch('/')
+
+
+@benchmark('replay.join_large', number=5)
+def join_large():
+    return _make_batch('/large')
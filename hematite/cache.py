@@ -0,0 +1,530 @@
+# -*- coding: utf-8 -*-
+"""\
+An HTTP cache for :class:`~hematite.client.Client`. Responses to GETs
+are kept, and later requests for the same URL are answered with them,
+without touching the network, for as long as they're fresh (per their
+Cache-Control, Expires and Last-Modified). Stale responses are
+revalidated with If-None-Match/If-Modified-Since, and a 304 refreshes
+the kept response rather than replacing it. Responses that Vary are
+kept per variant:
+
+    client = Client(cache=HTTPCache(MemoryCacheStorage(2 ** 26)))
+
+Storage is pluggable: anything with ``get(key)``, ``set(key, entries)``
+and ``delete(key)`` will do, where *entries* is the list of
+:class:`CacheEntry` variants kept for a URL. Besides memory, entries
+can be kept in files (:class:`DiskCacheStorage`), or in a mapped
+:class:`~hematite.store.ResponseStore` (:class:`StoreCacheStorage`).
+"""
+
+import os
+import json
+import time
+import errno
+import hashlib
+import calendar
+import tempfile
+from collections import OrderedDict
+
+from hematite.request import Request
+from hematite.response import Response
+from hematite.raw.response import RawResponse
+from hematite.store import ResponseStore, StoreError, get_stored_headers
+from hematite.raw.datastructures import Headers, CompactHeaders, Body
+
+DEFAULT_MAX_BYTES = 2 ** 26
+MAX_VARIANTS = 8
+# without explicit freshness, responses with a Last-Modified stay fresh
+# for a fraction of their age at the time, up to a limit (RFC7234 4.2.2)
+HEURISTIC_FRACTION = 0.1
+MAX_HEURISTIC_LIFETIME = 24 * 60 * 60
+# an estimate of what an entry costs beyond its bytes
+ENTRY_OVERHEAD = 512
+
+CACHEABLE_STATUS_CODES = frozenset([200, 203, 300, 301, 404, 410])
+UNSAFE_METHODS = frozenset(['POST', 'PUT', 'DELETE', 'PATCH'])
+# requests with these are left alone, as their responses are partial or
+# conditional on something the cache doesn't know about
+UNCACHED_REQUEST_HEADERS = ('If-None-Match', 'If-Modified-Since',
+                            'If-Match', 'If-Unmodified-Since',
+                            'If-Range', 'Range')
+# headers a 304 doesn't update (RFC7234 4.3.4)
+UNUPDATED_HEADERS = frozenset(['content-length', 'transfer-encoding'])
+
+
+def _get_field(message, name):
+    # missing and malformed headers are as good as absent
+    try:
+        return getattr(message, name)
+    except Exception:
+        return None
+
+
+def _get_timestamp(message, name):
+    value = _get_field(message, name)
+    if value is None:
+        return None
+    return calendar.timegm(value.utctimetuple())
+
+
+def _get_directives(message):
+    items = _get_field(message, 'cache_control') or []
+    return dict([(key.strip().lower(), value) for key, value in items])
+
+
+def _get_seconds(directives, name):
+    try:
+        return max(0, int(directives[name]))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _get_header_value(headers, name):
+    if name not in headers:
+        return None
+    return ', '.join([str(v) for v in headers.getlist(name)])
+
+
+def get_vary_values(names, raw_request):
+    """\
+    Returns the request's values for the headers *names* (from the
+    response's Vary), as kept in :attr:`CacheEntry.vary`.
+    """
+    return tuple([(name.lower(), _get_header_value(raw_request.headers, name))
+                  for name in names])
+
+
+class CacheEntry(object):
+    """\
+    A response as kept in the cache, along with what's needed to tell
+    how fresh it is, all as bytes and timestamps so that it's simple to
+    store. *vary* holds the values the request had for the headers the
+    response Varied on, as ``(lowercased name, value)`` pairs.
+    """
+    __slots__ = ('status_line', 'headers', 'body', 'vary', 'request_time',
+                 'response_time', 'date', 'age', 'lifetime', 'etag',
+                 'last_modified')
+
+    def __init__(self, status_line, headers, body, vary=(),
+                 request_time=None, response_time=None, date=None, age=0,
+                 lifetime=0, etag=None, last_modified=None):
+        self.status_line = status_line
+        self.headers = CompactHeaders(headers)
+        self.body = body
+        self.vary = tuple([tuple(pair) for pair in vary])
+        self.response_time = response_time or time.time()
+        self.request_time = request_time or self.response_time
+        self.date = date
+        self.age = age
+        self.lifetime = lifetime
+        self.etag = etag
+        self.last_modified = last_modified
+
+    @classmethod
+    def from_response(cls, response, raw_response, vary=(),
+                      request_time=None, response_time=None):
+        """\
+        Creates an entry from a received *raw_response* and its
+        *response* (built from it), working out its lifetime from its
+        fields.
+        """
+        response_time = response_time or time.time()
+        date = _get_timestamp(response, 'date')
+        directives = _get_directives(response)
+        max_age = _get_seconds(directives, 'max-age')
+        expires = _get_timestamp(response, 'expires')
+        last_modified = _get_timestamp(response, 'last_modified')
+        if 'no-cache' in directives:
+            lifetime = 0
+        elif max_age is not None:
+            lifetime = max_age
+        elif expires is not None:
+            lifetime = max(0, expires - (date or response_time))
+        elif last_modified is not None:
+            since = max(0, (date or response_time) - last_modified)
+            lifetime = min(since * HEURISTIC_FRACTION,
+                           MAX_HEURISTIC_LIFETIME)
+        else:
+            lifetime = 0
+        try:
+            age = max(0, int(raw_response.headers.get('Age', 0)))
+        except ValueError:
+            age = 0
+        headers = get_stored_headers(raw_response)
+        return cls(status_line=bytes(raw_response.status_line),
+                   headers=headers.iteritems(multi=True),
+                   body=raw_response.body.data,
+                   vary=vary,
+                   request_time=request_time,
+                   response_time=response_time,
+                   date=date,
+                   age=age,
+                   lifetime=lifetime,
+                   etag=headers.get('ETag'),
+                   last_modified=headers.get('Last-Modified'))
+
+    @property
+    def size(self):
+        return (ENTRY_OVERHEAD + len(self.status_line) + len(self.body)
+                + sum([len(k) + len(str(v)) for k, v
+                       in self.headers.iteritems(multi=True)]))
+
+    @property
+    def has_validators(self):
+        return bool(self.etag or self.last_modified)
+
+    def get_age(self, now=None):
+        "The response's current age in seconds (RFC7234 4.2.3)."
+        now = time.time() if now is None else now
+        date = self.date if self.date is not None else self.response_time
+        apparent_age = max(0, self.response_time - date)
+        response_delay = self.response_time - self.request_time
+        initial_age = max(apparent_age, self.age + response_delay)
+        return initial_age + max(0, now - self.response_time)
+
+    def is_fresh(self, now=None, max_age=None):
+        """True if the response can be used without revalidating it, no
+        older than *max_age* seconds, if given."""
+        age = self.get_age(now)
+        if max_age is not None and age > max_age:
+            return False
+        return age < self.lifetime
+
+    def matches(self, raw_request):
+        "True if *raw_request* is for this variant."
+        headers = raw_request.headers
+        for name, value in self.vary:
+            if _get_header_value(headers, name) != value:
+                return False
+        return True
+
+    def to_raw_response(self, now=None):
+        """Returns a new, complete RawResponse for the entry, with an
+        Age header."""
+        headers = Headers(self.headers.iteritems(multi=True))
+        headers['Age'] = str(int(self.get_age(now)))
+        body = Body()
+        if self.body:
+            body.data_received(self.body)
+        body.complete(len(self.body))
+        return RawResponse(status_line=self.status_line,
+                           headers=headers,
+                           body=body)
+
+    def to_dict(self):
+        "Everything but the body, for storing as JSON."
+        ret = dict([(attr, getattr(self, attr)) for attr in self.__slots__
+                    if attr not in ('headers', 'body')])
+        ret['headers'] = list(self.headers.iteritems(multi=True))
+        ret['body_length'] = len(self.body)
+        return ret
+
+    @classmethod
+    def from_dict(cls, entry_dict, body):
+        kw = dict([(str(k), v) for k, v in entry_dict.items()
+                   if k != 'body_length'])
+        kw['body'] = body
+        return cls(**kw)
+
+    def __repr__(self):
+        cn = self.__class__.__name__
+        return '<%s %r, %s bytes, lifetime=%r>' % (cn, self.status_line,
+                                                   len(self.body),
+                                                   self.lifetime)
+
+
+def _latin1_to_bytes(value):
+    # JSON has no bytes, so they round trip through latin-1 text
+    if isinstance(value, unicode):
+        return value.encode('latin-1')
+    elif isinstance(value, list):
+        return [_latin1_to_bytes(v) for v in value]
+    elif isinstance(value, dict):
+        return dict([(k, _latin1_to_bytes(v)) for k, v in value.items()])
+    return value
+
+
+def _dump_entries(entries):
+    # a line of JSON, and the bodies, back to back
+    entry_dicts = [entry.to_dict() for entry in entries]
+    head = json.dumps(entry_dicts, encoding='latin-1', sort_keys=True)
+    bodies = [entry.body.tobytes() if isinstance(entry.body, memoryview)
+              else entry.body for entry in entries]
+    return head, b''.join(bodies)
+
+
+def dump_entries(entries):
+    """\
+    Serializes a list of entries as a line of JSON, followed by their
+    bodies, back to back.
+    """
+    return b'\n'.join(_dump_entries(entries))
+
+
+def load_entries(data):
+    "The reverse of :func:`dump_entries`, raising ValueError if invalid."
+    head, sep, bodies = data.partition(b'\n')
+    if not sep:
+        raise ValueError('missing entry bodies')
+    return _load_entries(head, bodies)
+
+
+def _load_entries(head, bodies):
+    ret, pos = [], 0
+    for entry_dict in json.loads(head):
+        entry_dict = _latin1_to_bytes(entry_dict)
+        end = pos + entry_dict['body_length']
+        if end > len(bodies):
+            raise ValueError('truncated entry body')
+        ret.append(CacheEntry.from_dict(entry_dict, bodies[pos:end]))
+        pos = end
+    return ret
+
+
+class MemoryCacheStorage(object):
+    """\
+    Keeps entries in memory, up to *max_bytes* in all, dropping the
+    least recently used as needed.
+    """
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()  # key -> (entries, size)
+
+    def get(self, key):
+        try:
+            item = self._entries.pop(key)
+        except KeyError:
+            return None
+        self._entries[key] = item
+        return item[0]
+
+    def set(self, key, entries):
+        self.delete(key)
+        size = sum([entry.size for entry in entries])
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (entries, size)
+        self.size += size
+        while self.size > self.max_bytes:
+            _, (_, dropped_size) = self._entries.popitem(last=False)
+            self.size -= dropped_size
+
+    def delete(self, key):
+        item = self._entries.pop(key, None)
+        if item is not None:
+            self.size -= item[1]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskCacheStorage(object):
+    """\
+    Keeps entries in files under the directory *path*, one per key,
+    named by the key's hash. Files are replaced whole, so readers never
+    see one half-written, and unreadable files count as missing.
+    """
+    def __init__(self, path):
+        self.path = path
+        try:
+            os.makedirs(path)
+        except OSError as ose:
+            if ose.errno != errno.EEXIST:
+                raise
+
+    def get_path(self, key):
+        if isinstance(key, unicode):
+            key = key.encode('utf-8')
+        return os.path.join(self.path, hashlib.sha1(key).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self.get_path(key), 'rb') as f:
+                data = f.read()
+        except IOError:
+            return None
+        try:
+            return load_entries(data)
+        except (ValueError, KeyError, TypeError):
+            return None
+
+    def set(self, key, entries):
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, prefix='.tmp')
+        renamed = False
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(dump_entries(entries))
+            os.rename(tmp_path, self.get_path(key))
+            renamed = True
+        finally:
+            if not renamed:
+                os.remove(tmp_path)
+
+    def delete(self, key):
+        try:
+            os.remove(self.get_path(key))
+        except OSError as ose:
+            if ose.errno != errno.ENOENT:
+                raise
+
+
+class StoreCacheStorage(object):
+    """\
+    Keeps entries in a :class:`~hematite.store.ResponseStore` at
+    *path*, a record per key, so that a cache of any size opens
+    instantly, and bodies are read straight out of the map: entries
+    from :meth:`get` have memoryviews for bodies. Keys too long for
+    the store aren't kept.
+
+    Setting or deleting a key supersedes its record, which takes up
+    space until the store is compacted, see :meth:`compact`.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.store = ResponseStore(path)
+
+    def get(self, key):
+        try:
+            stored = self.store.get(key)
+        except StoreError:
+            return None
+        if stored is None:
+            return None
+        try:
+            return _load_entries(stored.head.tobytes(), stored.body) or None
+        except (ValueError, KeyError, TypeError):
+            return None
+
+    def set(self, key, entries):
+        head, bodies = _dump_entries(entries)
+        try:
+            self.store.add_bytes(key, head, bodies)
+        except StoreError:
+            pass
+
+    def delete(self, key):
+        if self.get(key) is not None:
+            # there's no removing a record, only superseding it
+            self.set(key, [])
+
+    def compact(self):
+        self.store.compact()
+
+    def close(self):
+        self.store.close()
+
+    def __repr__(self):
+        cn = self.__class__.__name__
+        return '<%s %r>' % (cn, self.path)
+
+
+class HTTPCache(object):
+    """\
+    Answers a :class:`~hematite.client.Client`'s requests from, and
+    keeps their responses in, *storage* (an in-memory
+    :class:`MemoryCacheStorage` by default). The cache is private, as
+    in RFC7234, so ``private`` responses are kept, too.
+    """
+    def __init__(self, storage=None):
+        self.storage = storage if storage is not None else \
+            MemoryCacheStorage()
+
+    def get_key(self, request, method=None):
+        url = request.url.partition(u'#')[0]
+        return u'%s %s' % (method or request.method, url)
+
+    def _is_cacheable_request(self, request):
+        if not isinstance(request, Request) or request.method != 'GET':
+            return False
+        if 'no-store' in _get_directives(request):
+            return False
+        return True
+
+    def prepare(self, client_resp):
+        """\
+        Called as a request is made, before anything is sent. Completes
+        *client_resp* from the cache if there's a fresh response for it,
+        or makes it a conditional request if there's a stale one to
+        revalidate.
+        """
+        request = client_resp.request
+        if not isinstance(request, Request):
+            return
+        if request.method in UNSAFE_METHODS:
+            self.storage.delete(self.get_key(request, 'GET'))
+            return
+        if not self._is_cacheable_request(request):
+            return
+        headers = client_resp.raw_request.headers
+        if any([name in headers for name in UNCACHED_REQUEST_HEADERS]):
+            return
+        for entry in self.storage.get(self.get_key(request)) or []:
+            if entry.matches(client_resp.raw_request):
+                break
+        else:
+            return
+        now = time.time()
+        directives = _get_directives(request)
+        max_age = _get_seconds(directives, 'max-age')
+        if 'no-cache' not in directives and entry.is_fresh(now, max_age):
+            client_resp.load_cached(entry.to_raw_response(now))
+            return
+        if not entry.has_validators:
+            return
+        conditional = request.get_copy()
+        if entry.etag:
+            conditional.if_none_match = entry.etag
+        if entry.last_modified:
+            conditional.if_modified_since = entry.last_modified
+        client_resp._set_request(conditional)
+        client_resp.cache_entry = entry
+
+    def response_received(self, client_resp):
+        """\
+        Called once *client_resp* is complete. Keeps its response, if
+        cacheable, or on a 304 to a revalidation, refreshes the kept
+        response and completes *client_resp* with it instead.
+        """
+        request = client_resp.request
+        if not self._is_cacheable_request(request):
+            return
+        raw_response, response = client_resp.raw_response, client_resp.response
+        entry = client_resp.cache_entry
+        if entry is not None and raw_response.status_code == 304:
+            refreshed = entry.to_raw_response()
+            for name, value in raw_response.headers.iteritems():
+                if name.lower() not in UNUPDATED_HEADERS:
+                    refreshed.headers[name] = value
+            raw_response = refreshed
+            response = Response.from_raw_response(refreshed)
+            client_resp.raw_response, client_resp.response = \
+                raw_response, response
+            client_resp.from_cache = True
+        elif raw_response.status_code not in CACHEABLE_STATUS_CODES:
+            return
+        if raw_response.body.data is None:
+            return  # streamed, so not kept
+        if 'no-store' in _get_directives(response):
+            return
+        vary = [name for name in _get_field(response, 'vary') or []]
+        if '*' in vary:
+            return
+        new_entry = CacheEntry.from_response(
+            response, raw_response,
+            vary=get_vary_values(vary, client_resp.raw_request),
+            request_time=client_resp.timings['created'])
+        if not new_entry.lifetime and not new_entry.has_validators:
+            return
+        self.store(self.get_key(request), new_entry)
+
+    def store(self, key, entry):
+        "Keeps *entry* under *key*, replacing the same variant, if any."
+        entries = [e for e in self.storage.get(key) or []
+                   if e.vary != entry.vary]
+        entries.insert(0, entry)
+        self.storage.set(key, entries[:MAX_VARIANTS])
+
+    def __repr__(self):
+        cn = self.__class__.__name__
+        return '<%s storage=%r>' % (cn, self.storage)
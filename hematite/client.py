@@ -3,15 +3,22 @@
 import ssl
 import time
 import errno
+import select
 import socket
 from io import BlockingIOError
+from collections import deque, defaultdict
 
-from hematite.async import join as async_join
-from hematite.request import Request, RawRequest
+from hematite.async import join as async_join, Joiner
+from hematite.request import (Request, RawRequest, RequestTemplate,
+                              DEFAULT_TEMPLATE_SLOTS)
 from hematite.response import Response
+from hematite.raw.core import OverlongRead
 from hematite.raw.parser import ResponseReader
-from hematite.raw.drivers import SSLSocketDriver
+from hematite.raw.drivers import SSLSocketDriver, PipelinedSocketDriver
 from hematite.profile import HematiteProfile
+from hematite.metrics import RequestMetrics, MetricsCollector
+from hematite.pool import ConnectionPool, get_pool_key
+from hematite.resolver import Resolver
 
 
 class ConnectionError(Exception):  # TODO: maybe inherit from socket.error?
@@ -42,6 +49,10 @@ class RequestTimeout(Exception):
 
 
 DEFAULT_TIMEOUT = 10.0
+DEFAULT_CHUNK_SIZE = 2 ** 14
+# the most iter_content/iter_lines will buffer up, see ClientResponse
+DEFAULT_HIGH_WATER = 2 ** 20
+DEFAULT_CONCURRENCY = 32
 CLIENT_METHODS = ['GET', 'HEAD', 'POST', 'PUT', 'DELETE',
                   'TRACE', 'OPTIONS', 'PATCH']  # CONNECT intentionally omitted
 
@@ -51,15 +62,22 @@ class ClientOperation(object):
         self.client = client
         self.method = method
 
-    def __call__(self, url, body=None, timeout=DEFAULT_TIMEOUT):
+    def __call__(self, url, body=None, timeout=DEFAULT_TIMEOUT, **kw):
         req = Request(self.method, url, body=body)
         self.client.populate_headers(req)
-        return self.client.request(request=req, timeout=timeout)
+        return self.client.request(request=req, timeout=timeout, **kw)
 
-    def async(self, url, body=None, nonblocking=True):
+    def async(self, url, body=None, timeout=DEFAULT_TIMEOUT, **kw):
         req = Request(self.method, url, body=body)
         self.client.populate_headers(req)
-        return self.client.request(request=req, async=True)
+        return self.client.request(request=req, async=True, timeout=timeout,
+                                   **kw)
+
+    def coro(self, url, body=None, timeout=DEFAULT_TIMEOUT, loop=None):
+        req = Request(self.method, url, body=body)
+        self.client.populate_headers(req)
+        return self.client.request_coro(request=req, timeout=timeout,
+                                        loop=loop)
 
 
 class UnboundClientOperation(object):
@@ -76,64 +94,68 @@ class UnboundClientOperation(object):
         return '%s(method=%r)' % (cn, self.method)
 
 
-def lookup_url(url):
-    host = url.host
-    port = url.port or (443 if url.scheme.lower() == 'https' else 80)
-
-    # here we use the value of url.family to indicate whether host
-    # is already an IP or not. the user might have mucked with
-    # this, so maybe a better check is in order.
-    if url.family is None:
-        # assuming TCP ;P
-        # big wtf: no kwargs on getaddrinfo
-        addrinfos = socket.getaddrinfo(host,
-                                       port,
-                                       socket.AF_UNSPEC,  # v4/v6
-                                       socket.SOCK_STREAM,
-                                       socket.IPPROTO_TCP)
-        # TODO: configurable behavior on multiple returns?
-        # TODO: (cont.) set preference for IPv4/v6
-
-        # NOTE: raises exception on unresolvable hostname, so
-        #       addrinfo[0] should never indexerror
-        family, socktype, proto, canonname, sockaddr = addrinfos[0]
-        ret = (family, socktype) + sockaddr
-    elif url.family is socket.AF_INET:
-        ret = (url.family, socket.SOCK_STREAM, host, port)
-    elif url.family is socket.AF_INET6:
-        # TODO: how to handle flowinfo, scopeid here? is None even valid?
-        ret = (url.family, socket.SOCK_STREAM, host, port, None, None)
-    else:
-        raise ValueError('invalid family on url: %r' % url)
-
-    # NOTE: it'd be cool to just return an unconnected socket
-    # here, but even unconnected sockets use fds
-    return ret
-
-
 class Client(object):
 
     for client_method in CLIENT_METHODS:
         locals()[client_method.lower()] = UnboundClientOperation(client_method)
     del client_method
 
-    def __init__(self, profile=None):
+    def __init__(self, profile=None, pool=None, resolver=None,
+                 metrics_sink=None, cache=None):
         self.profile = profile or HematiteProfile()
+        self.pool = pool if pool is not None else ConnectionPool()
+        self.resolver = resolver if resolver is not None else Resolver()
+        # an HTTPCache, see hematite.cache
+        self.cache = cache
+        # called with lists of RequestMetrics, see hematite.metrics
+        self.metrics_collector = None
+        if metrics_sink is not None:
+            self.metrics_collector = MetricsCollector(metrics_sink)
+
+    def record_metrics(self, metrics):
+        if self.metrics_collector is not None:
+            self.metrics_collector.add(metrics)
+
+    def flush_metrics(self):
+        """Hands any buffered metrics to the metrics sink, rather than
+        waiting for a full batch."""
+        if self.metrics_collector is not None:
+            self.metrics_collector.flush()
+
+    def make_driver(self, raw_request, sock, reader, writer):
+        """Returns the driver to send *raw_request* with *writer* and
+        read its response with *reader*, over *sock*. For subclasses to
+        swap out the transport, see hematite.replay."""
+        return SSLSocketDriver(sock, reader=reader, writer=writer)
 
     def populate_headers(self, request):
         if self.profile:
             self.profile.populate_headers(request)
 
+    def get_template(self, request, slots=DEFAULT_TEMPLATE_SLOTS):
+        """Returns a RequestTemplate for *request* (or a URL, to GET),
+        with the profile's headers baked in. Pass the template's
+        to_raw_request() to request() for each send."""
+        if isinstance(request, basestring):
+            request = Request('GET', request)
+            self.populate_headers(request)
+        return RequestTemplate(request, slots=slots)
+
     def get_addrinfo(self, request):
         # TODO: call from/merge with get_socket? would lose timing info
         # TODO: should one still run getaddrinfo even when a request has an IP
         # minor wtf: socket.getaddrinfo port can be a service name like 'http'
         url = request.host_url  # a URL object
         try:
-            return lookup_url(url)
+            return self.resolver.resolve(url)
         except socket.error as se:
             raise UnknownHost(socket_error=se)
 
+    def lookup_addrinfo(self, request):
+        """Nonblocking counterpart to get_addrinfo, returns a
+        PendingLookup (see hematite.resolver)."""
+        return self.resolver.lookup(request.host_url)
+
     # TODO: maybe split out addrinfo into relevant fields
     # TODO: make request optional?
     def get_socket(self, request, addrinfo, nonblocking):
@@ -170,18 +192,201 @@ class Client(object):
                 request,
                 async=False,
                 autoload_body=True,
-                timeout=DEFAULT_TIMEOUT):
+                timeout=DEFAULT_TIMEOUT,
+                connect_timeout=None,
+                read_timeout=None):
+        """\
+        Sends *request*, returning its ClientResponse once complete, or
+        right away with *async*, for use with join(). *timeout* bounds
+        the whole request, *connect_timeout* the DNS lookup and connect
+        (not counting any wait for a pooled connection), and
+        *read_timeout* the wait for each read once the request is sent.
+        """
         # TODO: kwargs for raise_exc, follow_redirects
-        kw = dict(client=self, request=request, autoload_body=autoload_body)
+        kw = dict(client=self, request=request, autoload_body=autoload_body,
+                  nonblocking=True, timeout=timeout,
+                  connect_timeout=connect_timeout, read_timeout=read_timeout)
         client_resp = ClientResponse(**kw)
-        if async:
+        if self.cache is not None:
+            self.cache.prepare(client_resp)
+        if async or client_resp.is_complete:
             return client_resp
         async_join([client_resp], timeout=timeout)
+        if not autoload_body and client_resp.headers_received:
+            return client_resp  # body left for iter_content
         if not client_resp.is_complete:
+            client_resp.close()
+            if client_resp.error:
+                raise client_resp.error
             raise RequestTimeout('request did not complete within %s seconds'
                                  % timeout)
         return client_resp
 
+    def fetch_many(self, requests, concurrency=DEFAULT_CONCURRENCY,
+                   per_host=None, timeout=DEFAULT_TIMEOUT, **kw):
+        """\
+        Sends the Requests (or URLs, to GET) from the iterable
+        *requests*, with no more than *concurrency* in flight at once,
+        and no more than *per_host* to any one host. Yields each
+        ClientResponse as it finishes, complete or not (see its error),
+        so not necessarily in order. *requests* is consumed lazily, so
+        it can be a generator of any length. Extra keyword arguments,
+        like *read_timeout*, are passed on to each ClientResponse.
+        """
+        requests = iter(requests)
+        joiner = Joiner(raise_exc=False)
+        waiting = deque()  # pulled from requests, but their host is busy
+        in_flight = defaultdict(int)  # pool key -> count
+        kw.update(nonblocking=True, timeout=timeout)
+
+        def _can_start(client_resp):
+            if per_host is None:
+                return True
+            return in_flight[client_resp.pool_key] < per_host
+
+        def _start(client_resp):
+            in_flight[client_resp.pool_key] += 1
+            joiner.add(client_resp)
+
+        try:
+            while True:
+                for client_resp in list(waiting):
+                    if len(joiner.active) >= concurrency:
+                        break
+                    if _can_start(client_resp):
+                        waiting.remove(client_resp)
+                        _start(client_resp)
+                while (requests is not None
+                       and len(joiner.active) < concurrency
+                       and len(waiting) < concurrency):
+                    try:
+                        request = next(requests)
+                    except StopIteration:
+                        requests = None
+                        break
+                    if isinstance(request, basestring):
+                        request = Request('GET', request)
+                        self.populate_headers(request)
+                    client_resp = ClientResponse(client=self, request=request,
+                                                 **kw)
+                    if self.cache is not None:
+                        self.cache.prepare(client_resp)
+                    if _can_start(client_resp):
+                        _start(client_resp)
+                    else:
+                        waiting.append(client_resp)
+                if not joiner.active:
+                    break
+                for client_resp in joiner.poll():
+                    in_flight[client_resp.pool_key] -= 1
+                    yield client_resp
+                if joiner.stalled:
+                    raise RuntimeError('requests stalled: %r'
+                                       % list(joiner.active))
+        finally:
+            joiner.close()
+            for client_resp in joiner.active:
+                client_resp.close()  # abandoned partway
+
+    def pipeline(self, requests, timeout=DEFAULT_TIMEOUT):
+        """\
+        Sends *requests*, all to the same host, back to back on a single
+        connection (HTTP/1.1 pipelining), and returns a ClientResponse
+        for each, in order. Only meant for idempotent requests: if the
+        server closes the connection early or the timeout is hit, the
+        unanswered responses have their error set instead.
+        """
+        client_resps = [ClientResponse(client=self, request=req)
+                        for req in requests]
+        if not client_resps:
+            return []
+        keys = set([cr.pool_key for cr in client_resps])
+        if len(keys) > 1:
+            raise ValueError('pipelined requests must all be to the same'
+                             ' host, not %r' % sorted(keys))
+        first = client_resps[0]
+        conn = self.pool.acquire(first.pool_key)
+        if conn is None:
+            raise ConnectionError('no connection available to %s:%s'
+                                  % first.pool_key[1:])
+        start = time.time()
+        try:
+            if not conn.is_connected:
+                addrinfo = self.get_addrinfo(first.raw_request)
+                conn.socket = self.get_socket(first.raw_request, addrinfo,
+                                              nonblocking=True)
+        except Exception:
+            self.pool.discard(conn)
+            raise
+        sock = conn.socket
+        orig_timeout = sock.gettimeout()
+        sock.setblocking(0)
+
+        driver = PipelinedSocketDriver(sock)
+        for cr in client_resps:
+            cr.writer = cr.raw_request.get_writer()
+            cr.reader = driver.add_request(cr.raw_request, writer=cr.writer)
+            cr.socket, cr.state = sock, _State.Sending
+            cr.timings['started'] = start
+            cr.metrics.mark('started')
+            cr.metrics.mark('send_start')
+        conn.request_count += len(client_resps)
+        cutoff_time = start + timeout
+        try:
+            while driver.want_write or driver.want_read:
+                remaining = cutoff_time - time.time()
+                if remaining <= 0:
+                    raise RequestTimeout('pipeline did not complete within'
+                                         ' %s seconds' % timeout)
+                rlist = [sock] if driver.want_read else []
+                wlist = [sock] if driver.want_write else []
+                readable, writable, _ = select.select(rlist, wlist, [],
+                                                      remaining)
+                try:
+                    if writable:
+                        driver.write()
+                except BlockingIOError:
+                    pass
+                except socket.error:
+                    # the server may have closed its end after answering
+                    # some of the requests, which can still be read
+                    driver.stop_writing()
+                try:
+                    if readable:
+                        driver.read()
+                except BlockingIOError:
+                    pass
+                self._pipeline_completed(client_resps)
+        except Exception as e:
+            self._pipeline_completed(client_resps)
+            for cr in client_resps:
+                if not cr.is_complete:
+                    cr.error = e
+        self._pipeline_completed(client_resps)
+        sock.settimeout(orig_timeout)
+        reusable = all([cr.is_reusable for cr in client_resps])
+        self.pool.release(conn, reusable=reusable)
+        for cr in client_resps:
+            cr._record_metrics()
+        return client_resps
+
+    def _pipeline_completed(self, client_resps):
+        for cr in client_resps:
+            if cr.is_complete or not cr.reader.complete:
+                continue
+            cr.raw_response = cr.reader.raw_response
+            cr.response = Response.from_raw_response(cr.raw_response)
+            cr.state = _State.Complete
+            cr.timings['complete'] = time.time()
+            cr.metrics.mark('complete')
+
+    def request_coro(self, request, timeout=DEFAULT_TIMEOUT, loop=None):
+        """Returns an asyncio Future resolving to the ClientResponse,
+        see hematite.aio. Connections are not pooled on this path."""
+        from hematite.aio import request_coro  # asyncio is optional
+        client_resp = ClientResponse(client=self, request=request)
+        return request_coro(client_resp, timeout=timeout, loop=loop)
+
 
 class _OldState(object):
     # TODO: ssl_connect?
@@ -230,24 +435,37 @@ class ClientResponse(object):
         self.state = _State.NotStarted
         self.socket = None
         self.driver = None
-        self.timings = {'created': time.time()}
+        self.reader = None
+        self.writer = None
+        self.connection = None
+        self.reused_connection = False
+        self.lookup = None
+        self.timings = {'created': time.time(),
+                        'resolver_hits': 0,
+                        'resolver_misses': 0}
+        self.metrics = RequestMetrics()
+        self._metrics_recorded = False
         # TODO: need to set error and Complete state on errors
         self.error = None
 
         self.response = None
         self.raw_response = None
+        # see hematite.cache
+        self.from_cache = False
+        self.cache_entry = None
 
         self.autoload_body = kwargs.pop('autoload_body', True)
         self.nonblocking = kwargs.pop('nonblocking', False)
+        # see deadline
         self.timeout = kwargs.pop('timeout', None)
+        self.connect_timeout = kwargs.pop('connect_timeout', None)
+        self.read_timeout = kwargs.pop('read_timeout', None)
+        self._last_read = 0
+        self.high_water = kwargs.pop('high_water', DEFAULT_HIGH_WATER)
         self.follow_redirects = kwargs.pop('follow_redirects', None)
         if self.follow_redirects is True:
             self.follow_redirects = 3  # TODO: default limit?
 
-        # TODO: request body/total bytes uploaded counters
-        # TODO: response body/total bytes downloaded counters
-        # (for calculating progress)
-
     def _set_request(self, request):
         self.request = request
         if request is None:
@@ -259,6 +477,10 @@ class ClientResponse(object):
         else:
             raise TypeError('expected request to be a Request or RawRequest')
 
+    @property
+    def pool_key(self):
+        return get_pool_key(self.raw_request.host_url)
+
     def execute(self):
         while True:
             if self.want_write:
@@ -271,12 +493,64 @@ class ClientResponse(object):
     def fileno(self):
         if self.socket:
             return self.socket.fileno()
+        if self.is_resolving:
+            return self.lookup.fileno()
         return None  # or raise an exception?
 
     @property
     def norm_timings(self):
-        t = self.timings
-        return dict([(k, v - t['created']) for (k, v) in t.items()])
+        t, created = self.timings, self.timings['created']
+        # counters (e.g., resolver_hits) are passed through as-is
+        return dict([(k, v - created if isinstance(v, float) else v)
+                     for (k, v) in t.items()])
+
+    @property
+    def is_connected(self):
+        marks = self.metrics.marks
+        return self.reused_connection or 'connect_done' in marks
+
+    @property
+    def deadline(self):
+        """The soonest time, on the monotonic clock, that one of the
+        request's timeouts runs out, or None. join() fails the request
+        with RequestTimeout once it passes, see check_deadline."""
+        if self.error or self.is_complete:
+            return None
+        marks, deadlines = self.metrics.marks, []
+        if self.timeout is not None and 'started' in marks:
+            deadlines.append(marks['started'] + self.timeout)
+        if (self.connect_timeout is not None and 'pool_acquired' in marks
+                and not self.is_connected):
+            deadlines.append(marks['pool_acquired'] + self.connect_timeout)
+        if self.read_timeout is not None and 'sent' in marks:
+            last_read = max(marks['sent'], self._last_read)
+            deadlines.append(last_read + self.read_timeout)
+        return min(deadlines) if deadlines else None
+
+    def check_deadline(self, now=None):
+        """Fails the request if its deadline has passed, returning
+        whether it did."""
+        deadline = self.deadline
+        now = self.metrics.clock() if now is None else now
+        if deadline is None or now < deadline:
+            return False
+        marks = self.metrics.marks
+        if (self.timeout is not None
+                and now >= marks['started'] + self.timeout):
+            msg = 'request did not complete within %s seconds' % self.timeout
+        elif 'sent' in marks:
+            msg = 'no data received for %s seconds' % self.read_timeout
+        else:
+            msg = 'could not connect within %s seconds' % self.connect_timeout
+        self.error = RequestTimeout(msg)
+        self.close()
+        return True
+
+    @property
+    def is_resolving(self):
+        """True from when a host lookup is handed off to the client's
+        resolver until its result is picked up by do_read."""
+        return self.lookup is not None
 
     @property
     def semantic_state(self):
@@ -286,22 +560,30 @@ class ClientResponse(object):
     def is_complete(self):
         return self.state == _State.Complete
 
+    @property
+    def headers_received(self):
+        if self.is_complete:
+            return True
+        driver = self.driver
+        return driver is not None and driver.inbound_headers_completed
+
     @property
     def want_write(self):
-        if self.error:
+        if self.error or self.is_complete:
             return False
         driver = self.driver
         if not driver:
-            return True  # to resolve hosts and connect
+            # to resolve hosts and connect
+            return not self.is_resolving
         return driver.want_write
 
     @property
     def want_read(self):
-        if self.error:
+        if self.error or self.is_complete:
             return False
         driver = self.driver
         if not driver:
-            return False
+            return self.is_resolving
         if driver.want_read:
             if not self.autoload_body and driver.inbound_headers_completed:
                 return False
@@ -321,59 +603,318 @@ class ClientResponse(object):
             if state is _State.NotStarted:
                 self.state += 1
                 self.timings['started'] = time.time()
+                self.metrics.mark('started')
             elif state is _State.ResolvingHost:
-                self.addrinfo = self.client.get_addrinfo(request)
-                self.state += 1
-                self.timings['host_resolved'] = time.time()
+                if self.connection is None:
+                    self.metrics.mark('pool_wait_start')
+                    self.connection = self.client.pool.acquire(self.pool_key)
+                    if self.connection is None:
+                        return False  # host at its connection limit
+                    self.metrics.mark('pool_acquired')
+                if self.connection.is_connected:
+                    self.reused_connection = True
+                    self._init_driver()
+                    self.state = _State.Sending
+                    self.timings['connected'] = time.time()
+                elif self._resolve_host():
+                    self.state += 1
+                    self.timings['host_resolved'] = time.time()
+                    self.metrics.mark('dns_done')
+                else:
+                    return False  # lookup pending, see do_read
             elif state is _State.Connecting:
-                self.socket = self.client.get_socket(request,
-                                                     self.addrinfo,
-                                                     self.nonblocking)
-                writer = self.raw_request.get_writer()
-                self.driver = SSLSocketDriver(self.socket,
-                                              reader=ResponseReader(),
-                                              writer=writer)
+                self.metrics.mark('connect_start')
+                self.connection.socket = self.client.get_socket(
+                    request, self.addrinfo, self.nonblocking)
+                self._init_driver()
                 self.state += 1
                 self.timings['connected'] = time.time()
+                if not self.nonblocking:
+                    self.metrics.mark('connect_done')
             elif state is _State.Sending:
-                if self.driver.write():
+                self._check_connected()
+                self.metrics.mark('send_start')
+                done = self.driver.write()
+                if self.is_ssl:
+                    # the handshake is done by the first write
+                    self.metrics.mark('tls_done')
+                if done:
                     self.state += 1
                     self.timings['sent'] = time.time()
+                    self.metrics.mark('sent')
             else:
                 raise RuntimeError('not in a writable state: %r' % state)
         except BlockingIOError:
             return False
         except Exception as e:
             self.error = e
+            self.close()
             raise
         return self.want_write
 
+    @property
+    def is_ssl(self):
+        return self.raw_request.host_url.scheme.lower() == 'https'
+
+    def _check_connected(self):
+        # nonblocking connects finish in the background, so check for
+        # the peer's address until there is one
+        if self.reused_connection or 'connect_done' in self.metrics.marks:
+            return
+        try:
+            self.socket.getpeername()
+        except socket.error:
+            return
+        self.metrics.mark('connect_done')
+
+    def _resolve_host(self):
+        lookup = self.lookup
+        if lookup is None:
+            self.metrics.mark('dns_start')
+            lookup = self.client.lookup_addrinfo(self.raw_request)
+            self.lookup = lookup
+            if lookup.cached:
+                self.timings['resolver_hits'] += 1
+            else:
+                self.timings['resolver_misses'] += 1
+        if not lookup.done:
+            return False
+        self.lookup = None
+        try:
+            self.addrinfo = lookup.get_result()
+        except socket.error as se:
+            raise UnknownHost(socket_error=se)
+        return True
+
+    def _init_driver(self):
+        self.socket = self.connection.socket
+        conn = self.connection
+        conn.request_count += 1
+        # a kept-alive connection's parsers are reset rather than replaced
+        writer = self.raw_request.get_writer(reuse=conn.writer)
+        self.writer = writer
+        # with autoload_body off, the body is likely to be streamed
+        reader = conn.reader
+        if reader is None:
+            reader = ResponseReader(preallocate_body=self.autoload_body,
+                                    request_method=self.raw_request.method)
+        else:
+            reader.reset(preallocate_body=self.autoload_body,
+                         request_method=self.raw_request.method)
+        conn.reader, conn.writer = None, None
+        self.reader = reader
+        self.driver = self.client.make_driver(self.raw_request, self.socket,
+                                              reader=reader, writer=writer)
+
+    def _release_connection(self):
+        conn, self.connection = self.connection, None
+        if conn is None:
+            return
+        reusable = self.is_reusable
+        if reusable:
+            conn.reader, conn.writer = self.reader, self.writer
+        self.client.pool.release(conn, reusable=reusable)
+
+    @property
+    def is_reusable(self):
+        """Whether the connection can be handed back to the pool once
+        the response is complete. Responses delimited by connection
+        close (neither Content-Length nor chunked) use up the
+        connection."""
+        rresp, rreq = self.raw_response, self.raw_request
+        if self.error or not self.is_complete or rresp is None:
+            return False
+        if rresp.connection_close:
+            return False
+        if rreq.headers.get('Connection', '').lower() == 'close':
+            return False
+        if not rresp.http_version or rresp.http_version < (1, 1):
+            return False
+        reader = self.reader
+        if reader is not None and reader.unparsed:
+            return False  # the server sent more than one response
+        if reader is not None and reader.no_body:
+            return True
+        return rresp.chunked or rresp.content_length is not None
+
+    def close(self):
+        """Drops the connection, if any, without returning it to the
+        pool. Incomplete responses should be closed so they don't hold
+        onto their host's connection slot."""
+        conn, self.connection = self.connection, None
+        if conn is not None:
+            self.client.pool.discard(conn)
+        lookup, self.lookup = self.lookup, None
+        if lookup is not None:
+            lookup.close()
+        self._record_metrics()
+
+    def _record_metrics(self):
+        """Fills in the metrics' byte counts and outcome once the
+        request is over, and passes them along to the client."""
+        if self._metrics_recorded:
+            return
+        self._metrics_recorded = True
+        metrics, rreq = self.metrics, self.raw_request
+        metrics.method = rreq.method
+        url = rreq.host_url
+        metrics.url = url.to_text() if hasattr(url, 'to_text') else url
+        metrics.reused_connection = self.reused_connection
+        metrics.error = self.error
+        if self.raw_response is not None:
+            metrics.status_code = self.raw_response.status_code
+        writer = self.writer
+        if writer is not None:
+            body_bytes = writer.body.bytes_written if writer.body else 0
+            metrics.request_header_bytes = writer.bytes_written - body_bytes
+            metrics.request_body_bytes = body_bytes
+        reader = self.reader
+        if reader is not None:
+            metrics.response_header_bytes = reader.bytes_read
+            metrics.response_body_bytes = reader.body_bytes_read
+        self.client.record_metrics(metrics)
+
     def get_data(self):
-        return self.driver.reader.raw_response.body.data
+        return self.raw_response.body.data
+
+    def _finish_response(self):
+        self.state = _State.Complete
+        self.timings['complete'] = time.time()
+        self.metrics.mark('headers_complete')
+        self.metrics.mark('complete')
+        self.response = Response.from_raw_response(self.raw_response)
+        if self.client.cache is not None:
+            self.client.cache.response_received(self)
+        # metrics come from the reader and writer, which the connection's
+        # next request may reuse once it's released
+        self._record_metrics()
+        self._release_connection()
+
+    def load_cached(self, raw_response):
+        """Completes the response with *raw_response*, from the
+        client's cache, without sending the request."""
+        self.raw_response = raw_response
+        self.from_cache = True
+        self.state = _State.Complete
+        self.timings['started'] = self.timings['complete'] = time.time()
+        for mark in ('started', 'complete'):
+            self.metrics.mark(mark)
+        self.response = Response.from_raw_response(raw_response)
+        self._record_metrics()
+
+    def iter_content(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Yields the (decompressed) body in pieces of *chunk_size*
+        bytes, the last of which may be shorter. With autoload_body off,
+        the body is read from the connection as the pieces are consumed,
+        and no more than ``high_water`` bytes, compressed or decoded,
+        are buffered at a time. Streamed bodies aren't kept, so
+        get_data() returns None after.
+        """
+        if not self.is_complete:
+            self._wait_for_headers()
+        body = self.raw_response.body
+        # bodies left compressed are decoded as they're streamed
+        deferred = body.decoder is not None and body.defer_decoding
+        if self.is_complete and not body.streaming and not deferred:
+            view = body.view
+            for i in xrange(0, len(view), chunk_size):
+                yield view[i:i + chunk_size].tobytes()
+            return
+        body.start_streaming()
+        high_water = max(self.high_water, chunk_size)
+        try:
+            while True:
+                while body.pending_size >= chunk_size:
+                    yield body.read_pending(chunk_size)
+                # no more is decoded than there's room for
+                if body.decode_received(high_water - body.pending_size):
+                    continue
+                if self.is_complete:
+                    break
+                self._read_body_some(high_water - body.pending_size)
+            if body.pending_size:
+                yield body.read_pending(body.pending_size)
+        finally:
+            if not self.is_complete:
+                # abandoned partway, so the connection can't be reused
+                self.close()
+
+    def iter_lines(self, chunk_size=DEFAULT_CHUNK_SIZE, keepends=False):
+        """Yields the body line by line, see :meth:`iter_content`. Lines
+        longer than ``high_water`` raise OverlongRead."""
+        partial = b''
+        for chunk in self.iter_content(chunk_size):
+            lines = (partial + chunk).split(b'\n')
+            partial = lines.pop()
+            if len(partial) > self.high_water:
+                raise OverlongRead('line exceeded %s bytes'
+                                   % self.high_water)
+            for line in lines:
+                yield line + b'\n' if keepends else line.rstrip(b'\r')
+        if partial:
+            yield partial
+
+    def _wait_for_headers(self):
+        if not self.headers_received:
+            timeout = self.timeout or DEFAULT_TIMEOUT
+            async_join([self], timeout=timeout)
+        if self.error:
+            raise self.error
+        if not self.headers_received:
+            raise RequestTimeout('response headers not received')
+
+    def _read_body_some(self, max_amount):
+        try:
+            if self.driver.read_some(max_amount):
+                self._finish_response()
+        except BlockingIOError:
+            timeout = self.timeout or DEFAULT_TIMEOUT
+            if not select.select([self.socket], [], [], timeout)[0]:
+                self.error = RequestTimeout('no body data within %s seconds'
+                                            % timeout)
+                self.close()
+                raise self.error
+        except Exception as e:
+            self.error = e
+            self.close()
+            raise
 
     def do_read(self):
         if self.error:
             return False
         state = self.state
         try:
-            if state is _State.Receiving:
+            if state is _State.ResolvingHost and self.is_resolving:
+                # the lookup's pipe became readable
+                if self._resolve_host():
+                    self.state += 1
+                    self.timings['host_resolved'] = time.time()
+                    self.metrics.mark('dns_done')
+                return False
+            elif state is _State.Receiving:
                 self.raw_response = self.driver.reader.raw_response
                 self.timings['first_read'] = time.time()
-                res = self.driver.read()
-                if res:
-                    self.state += 1
-                    self.timings['complete'] = time.time()
-                    resp = Response.from_raw_response(self.raw_response)
-                    self.response = resp
+                self.metrics.mark('first_byte')
+                self._last_read = self.metrics.clock()
+                try:
+                    if self.autoload_body:
+                        done = self.driver.read()
+                    else:
+                        done = self.driver.read(headers_only=True,
+                                                max_amount=self.high_water)
+                finally:
+                    if self.headers_received:
+                        self.metrics.mark('headers_complete')
+                if done:
+                    self._finish_response()
             else:
                 raise RuntimeError('not in a readable state: %r' % state)
         except BlockingIOError:
             return False
         except Exception as e:
             self.error = e
+            self.close()
         return self.want_read
-        # TODO: return socket
         # TODO: how to resolve socket returns with as-yet-unfetched body
         # (terminology: lazily-fetched?)
         # TODO: compression support goes where? how about charset decoding?
-        # TODO: callback on read complete (to release socket)
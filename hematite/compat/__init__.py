@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
+import os
 import sys
+import time
 
 is_py2 = sys.version_info[0] == 2
 is_py3 = sys.version_info[0] == 3
@@ -25,6 +27,7 @@ if is_py2:
     import cookielib
     from Cookie import Morsel
     from ._py2_socketio import SocketIO
+    from . import _py2_selectors as selectors
 
     BytestringHelperMeta = make_BytestringHelperMeta(target='__str__')
 
@@ -37,6 +40,7 @@ elif is_py3:
     from http import cookiejar as cookielib
     from http.cookies import Morsel
     from socket import SocketIO
+    import selectors
 
     BytestringHelperMeta = make_BytestringHelperMeta(target='__bytes__')
 
@@ -64,3 +68,38 @@ def make_sentinel(name='_MISSING', var_name=None):
         def __nonzero__(self):
             return False
     return Sentinel()
+
+
+def _make_monotonic():
+    try:
+        return time.monotonic
+    except AttributeError:
+        pass
+    # python 2: clock_gettime(CLOCK_MONOTONIC) on linux, else wall time
+    if not sys.platform.startswith('linux'):
+        return time.time
+    try:
+        import ctypes
+        import ctypes.util
+
+        class _timespec(ctypes.Structure):
+            _fields_ = [('tv_sec', ctypes.c_long),
+                        ('tv_nsec', ctypes.c_long)]
+
+        libc_name = ctypes.util.find_library('c') or 'libc.so.6'
+        clock_gettime = ctypes.CDLL(libc_name, use_errno=True).clock_gettime
+        clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(_timespec)]
+    except (ImportError, OSError, AttributeError):
+        return time.time
+    CLOCK_MONOTONIC = 1
+
+    def monotonic():
+        ts = _timespec()
+        if clock_gettime(CLOCK_MONOTONIC, ctypes.byref(ts)):
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        return ts.tv_sec + ts.tv_nsec * 1e-9
+    return monotonic
+
+
+monotonic = _make_monotonic()
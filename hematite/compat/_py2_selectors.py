@@ -0,0 +1,340 @@
+'''Compatability module that backports the selectors API (PEP 3156) to
+Python 2.7, covering the pieces hematite uses.'''
+import errno
+import math
+import select
+from collections import namedtuple, Mapping
+
+EVENT_READ = (1 << 0)
+EVENT_WRITE = (1 << 1)
+
+SelectorKey = namedtuple('SelectorKey', ['fileobj', 'fd', 'events', 'data'])
+
+
+def _fileobj_to_fd(fileobj):
+    if isinstance(fileobj, (int, long)):
+        fd = fileobj
+    else:
+        try:
+            fd = int(fileobj.fileno())
+        except (AttributeError, TypeError, ValueError):
+            raise ValueError("Invalid file object: %r" % (fileobj,))
+    if fd < 0:
+        raise ValueError("Invalid file descriptor: %r" % (fd,))
+    return fd
+
+
+def _retry_on_eintr(func, *args):
+    while True:
+        try:
+            return func(*args)
+        except (OSError, IOError, select.error) as e:
+            if e.args and e.args[0] == errno.EINTR:
+                continue
+            raise
+
+
+class _SelectorMapping(Mapping):
+    def __init__(self, selector):
+        self._selector = selector
+
+    def __len__(self):
+        return len(self._selector._fd_to_key)
+
+    def __getitem__(self, fileobj):
+        fd = self._selector._fileobj_lookup(fileobj)
+        return self._selector._fd_to_key[fd]
+
+    def __iter__(self):
+        return iter(self._selector._fd_to_key)
+
+
+class BaseSelector(object):
+    def __init__(self):
+        self._fd_to_key = {}
+        self._map = _SelectorMapping(self)
+
+    def _fileobj_lookup(self, fileobj):
+        try:
+            return _fileobj_to_fd(fileobj)
+        except ValueError:
+            # the file object may have been closed already; search
+            # the registered keys for it
+            for key in self._fd_to_key.values():
+                if key.fileobj is fileobj:
+                    return key.fd
+            raise
+
+    def register(self, fileobj, events, data=None):
+        if (not events) or (events & ~(EVENT_READ | EVENT_WRITE)):
+            raise ValueError("Invalid events: %r" % (events,))
+        key = SelectorKey(fileobj, self._fileobj_lookup(fileobj),
+                          events, data)
+        if key.fd in self._fd_to_key:
+            raise KeyError("%r (FD %d) is already registered"
+                           % (fileobj, key.fd))
+        self._fd_to_key[key.fd] = key
+        return key
+
+    def unregister(self, fileobj):
+        try:
+            return self._fd_to_key.pop(self._fileobj_lookup(fileobj))
+        except KeyError:
+            raise KeyError("%r is not registered" % (fileobj,))
+
+    def modify(self, fileobj, events, data=None):
+        try:
+            key = self._fd_to_key[self._fileobj_lookup(fileobj)]
+        except KeyError:
+            raise KeyError("%r is not registered" % (fileobj,))
+        if events != key.events:
+            self.unregister(fileobj)
+            key = self.register(fileobj, events, data)
+        elif data != key.data:
+            key = key._replace(data=data)
+            self._fd_to_key[key.fd] = key
+        return key
+
+    def select(self, timeout=None):
+        raise NotImplementedError()
+
+    def close(self):
+        self._fd_to_key.clear()
+        self._map = None
+
+    def get_key(self, fileobj):
+        mapping = self.get_map()
+        if mapping is None:
+            raise RuntimeError('Selector is closed')
+        try:
+            return mapping[fileobj]
+        except KeyError:
+            raise KeyError("%r is not registered" % (fileobj,))
+
+    def get_map(self):
+        return self._map
+
+    def _key_from_fd(self, fd):
+        return self._fd_to_key.get(fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class SelectSelector(BaseSelector):
+    def __init__(self):
+        super(SelectSelector, self).__init__()
+        self._readers = set()
+        self._writers = set()
+
+    def register(self, fileobj, events, data=None):
+        key = super(SelectSelector, self).register(fileobj, events, data)
+        if events & EVENT_READ:
+            self._readers.add(key.fd)
+        if events & EVENT_WRITE:
+            self._writers.add(key.fd)
+        return key
+
+    def unregister(self, fileobj):
+        key = super(SelectSelector, self).unregister(fileobj)
+        self._readers.discard(key.fd)
+        self._writers.discard(key.fd)
+        return key
+
+    def select(self, timeout=None):
+        timeout = None if timeout is None else max(timeout, 0)
+        ready = []
+        r, w, _ = _retry_on_eintr(select.select, self._readers,
+                                  self._writers, [], timeout)
+        r, w = set(r), set(w)
+        for fd in r | w:
+            events = ((EVENT_READ if fd in r else 0)
+                      | (EVENT_WRITE if fd in w else 0))
+            key = self._key_from_fd(fd)
+            if key:
+                ready.append((key, events & key.events))
+        return ready
+
+
+class _PollLikeSelector(BaseSelector):
+    _selector_cls = None
+    _EVENT_READ = None
+    _EVENT_WRITE = None
+
+    def __init__(self):
+        super(_PollLikeSelector, self).__init__()
+        self._selector = self._selector_cls()
+
+    def _to_native(self, events):
+        native = 0
+        if events & EVENT_READ:
+            native |= self._EVENT_READ
+        if events & EVENT_WRITE:
+            native |= self._EVENT_WRITE
+        return native
+
+    def register(self, fileobj, events, data=None):
+        key = super(_PollLikeSelector, self).register(fileobj, events, data)
+        try:
+            self._selector.register(key.fd, self._to_native(events))
+        except:
+            super(_PollLikeSelector, self).unregister(fileobj)
+            raise
+        return key
+
+    def unregister(self, fileobj):
+        key = super(_PollLikeSelector, self).unregister(fileobj)
+        try:
+            self._selector.unregister(key.fd)
+        except (OSError, IOError, KeyError):
+            # the fd may have been closed before being unregistered
+            pass
+        return key
+
+    def modify(self, fileobj, events, data=None):
+        try:
+            key = self._fd_to_key[self._fileobj_lookup(fileobj)]
+        except KeyError:
+            raise KeyError("%r is not registered" % (fileobj,))
+        if events != key.events:
+            self._selector.modify(key.fd, self._to_native(events))
+        key = key._replace(events=events, data=data)
+        self._fd_to_key[key.fd] = key
+        return key
+
+    def _poll(self, timeout):
+        raise NotImplementedError()
+
+    def select(self, timeout=None):
+        ready = []
+        for fd, native in self._poll(timeout):
+            events = 0
+            if native & ~self._EVENT_READ:
+                events |= EVENT_WRITE
+            if native & ~self._EVENT_WRITE:
+                events |= EVENT_READ
+            key = self._key_from_fd(fd)
+            if key:
+                ready.append((key, events & key.events))
+        return ready
+
+
+if hasattr(select, 'poll'):
+    class PollSelector(_PollLikeSelector):
+        _selector_cls = select.poll
+        _EVENT_READ = select.POLLIN
+        _EVENT_WRITE = select.POLLOUT
+
+        def _poll(self, timeout):
+            if timeout is not None:
+                # poll() takes milliseconds
+                timeout = int(math.ceil(max(timeout, 0) * 1e3))
+            return _retry_on_eintr(self._selector.poll, timeout)
+
+
+if hasattr(select, 'epoll'):
+    class EpollSelector(_PollLikeSelector):
+        _selector_cls = select.epoll
+        _EVENT_READ = select.EPOLLIN
+        _EVENT_WRITE = select.EPOLLOUT
+
+        def fileno(self):
+            return self._selector.fileno()
+
+        def _poll(self, timeout):
+            if timeout is None:
+                timeout = -1
+            elif timeout <= 0:
+                timeout = 0
+            else:
+                # epoll_wait has millisecond resolution; round up so we
+                # don't wake before the timeout is actually up
+                timeout = math.ceil(timeout * 1e3) * 1e-3
+            max_ev = max(len(self._fd_to_key), 1)
+            return _retry_on_eintr(self._selector.poll, timeout, max_ev)
+
+        def close(self):
+            self._selector.close()
+            super(EpollSelector, self).close()
+
+
+if hasattr(select, 'kqueue'):
+    class KqueueSelector(BaseSelector):
+        def __init__(self):
+            super(KqueueSelector, self).__init__()
+            self._selector = select.kqueue()
+
+        def fileno(self):
+            return self._selector.fileno()
+
+        def _control(self, fd, filters, flags):
+            for kfilter in filters:
+                kev = select.kevent(fd, kfilter, flags)
+                try:
+                    self._selector.control([kev], 0, 0)
+                except (OSError, IOError):
+                    if flags != select.KQ_EV_DELETE:
+                        raise
+
+        @staticmethod
+        def _filters(events):
+            filters = []
+            if events & EVENT_READ:
+                filters.append(select.KQ_FILTER_READ)
+            if events & EVENT_WRITE:
+                filters.append(select.KQ_FILTER_WRITE)
+            return filters
+
+        def register(self, fileobj, events, data=None):
+            key = super(KqueueSelector, self).register(fileobj, events, data)
+            try:
+                self._control(key.fd, self._filters(events),
+                              select.KQ_EV_ADD)
+            except:
+                super(KqueueSelector, self).unregister(fileobj)
+                raise
+            return key
+
+        def unregister(self, fileobj):
+            key = super(KqueueSelector, self).unregister(fileobj)
+            self._control(key.fd, self._filters(key.events),
+                          select.KQ_EV_DELETE)
+            return key
+
+        def select(self, timeout=None):
+            timeout = None if timeout is None else max(timeout, 0)
+            max_ev = max(len(self._fd_to_key), 1)
+            kev_list = _retry_on_eintr(self._selector.control,
+                                       None, max_ev, timeout)
+            ready_map = {}
+            for kev in kev_list:
+                fd = kev.ident
+                events = ready_map.get(fd, 0)
+                if kev.filter == select.KQ_FILTER_READ:
+                    events |= EVENT_READ
+                if kev.filter == select.KQ_FILTER_WRITE:
+                    events |= EVENT_WRITE
+                ready_map[fd] = events
+            ready = []
+            for fd, events in ready_map.items():
+                key = self._key_from_fd(fd)
+                if key:
+                    ready.append((key, events & key.events))
+            return ready
+
+        def close(self):
+            self._selector.close()
+            super(KqueueSelector, self).close()
+
+
+if 'KqueueSelector' in globals():
+    DefaultSelector = KqueueSelector
+elif 'EpollSelector' in globals():
+    DefaultSelector = EpollSelector
+elif 'PollSelector' in globals():
+    DefaultSelector = PollSelector
+else:
+    DefaultSelector = SelectSelector
@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
+from collections import namedtuple
+
 from .compat.dictutils import OMD
 
 HEADER_CASE_MAP = None
@@ -84,6 +86,50 @@ HOP_BY_HOP_HEADERS = ['Connection',
 _init_headers()
 del _init_headers
 
+
+# a header name as received, lowercased, and in its canonical case
+# (the key in HEADER_CASE_MAP and the fields' maps), or None if unknown
+HeaderName = namedtuple('HeaderName', 'name lower canonical')
+
+_HEADER_NAMES = {}
+
+
+def get_header_name(name):
+    """\
+    Returns the :class:`HeaderName` for *name*. Names seen before give
+    the same object back, with the same strings in it, sparing the
+    ``lower()`` and the copies of the names that every message would
+    otherwise have. Up to :data:`MAX_HEADER_CASE_ENTRIES` names are
+    kept, so unusual names can't grow the table without bound.
+
+    >>> get_header_name('content-TYPE').canonical
+    'Content-Type'
+    >>> get_header_name('X-Foo') is get_header_name('X-Foo')
+    True
+    """
+    try:
+        return _HEADER_NAMES[name]
+    except KeyError:
+        pass
+    lower = name.lower()
+    canonical = HEADER_CASE_MAP.get(lower)
+    if canonical is not None:
+        lower = _HEADER_NAMES[canonical].lower
+    ret = HeaderName(name, lower, canonical)
+    if len(_HEADER_NAMES) < MAX_HEADER_CASE_ENTRIES:
+        _HEADER_NAMES[name] = ret
+    return ret
+
+
+def _init_header_names():
+    for lower, canonical in HEADER_CASE_MAP.items():
+        name = HeaderName(canonical, lower, canonical)
+        _HEADER_NAMES[canonical] = _HEADER_NAMES[lower] = name
+
+
+_init_header_names()
+del _init_header_names
+
 CODE_REASONS = OMD([(100, 'Continue'),
                     (101, 'Switching Protocols'),
                     (102, 'Processing'),  # RFC2518
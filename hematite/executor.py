@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""\
+Spreads fetches across worker processes, so that parsing isn't held to
+a single core. Each worker has its own :class:`~hematite.client.Client`
+(and so its own connection pool and DNS cache) and its own poll loop.
+Hosts are assigned to workers by consistent hashing, so all of a
+host's requests go to the same worker, where its connections and
+lookups can be reused:
+
+    with ShardedExecutor(workers=4) as executor:
+        for result in executor.fetch(urls):
+            print result.url, result.raw_response.status_code
+
+Requests and responses cross process boundaries as plain tuples of
+bytes, which multiprocessing pickles cheaply. Response bodies come back
+whole, and decoded from any chunked framing.
+"""
+
+import time
+import bisect
+import hashlib
+import multiprocessing
+from collections import namedtuple
+from Queue import Empty
+
+from hematite.url import URL
+from hematite.pool import ConnectionPool, get_pool_key
+from hematite.raw.datastructures import Headers, Body, ChunkedBody
+from hematite.raw.request import RawRequest
+from hematite.raw.response import RawResponse
+from hematite.request import Request
+from hematite.profile import HematiteProfile
+
+DEFAULT_REPLICAS = 100
+DEFAULT_CONCURRENCY = 32
+DEFAULT_TIMEOUT = 10.0
+# how often busy workers check for more requests
+POLL_INTERVAL = 0.01
+# how often the parent checks that its workers are still alive
+RESULT_INTERVAL = 1.0
+# how long close() waits for the workers to finish before terminating them
+CLOSE_TIMEOUT = 30.0
+
+
+class HashRing(object):
+    """\
+    Maps keys to nodes by consistent hashing: each node gets
+    *replicas* points on a ring, and a key goes to the node owning the
+    next point after the key's hash. Adding or removing a node only
+    moves the keys between it and its neighbors.
+
+    >>> ring = HashRing(['a', 'b', 'c'])
+    >>> ring.get_node('example.com') == ring.get_node('example.com')
+    True
+    """
+    def __init__(self, nodes, replicas=DEFAULT_REPLICAS):
+        self.replicas = replicas
+        self._hashes = []
+        self._nodes = []
+        for node in nodes:
+            self.add_node(node)
+
+    @staticmethod
+    def _hash(key):
+        return int(hashlib.md5(key).hexdigest()[:16], 16)
+
+    def add_node(self, node):
+        for i in range(self.replicas):
+            point = self._hash('%s-%s' % (node, i))
+            idx = bisect.bisect(self._hashes, point)
+            self._hashes.insert(idx, point)
+            self._nodes.insert(idx, node)
+
+    def remove_node(self, node):
+        pairs = [(h, n) for h, n in zip(self._hashes, self._nodes)
+                 if n != node]
+        self._hashes = [h for h, _ in pairs]
+        self._nodes = [n for _, n in pairs]
+
+    def get_node(self, key):
+        if not self._nodes:
+            raise LookupError('no nodes in the ring')
+        if isinstance(key, unicode):
+            key = key.encode('utf-8')
+        idx = bisect.bisect(self._hashes, self._hash(key))
+        return self._nodes[idx % len(self._nodes)]
+
+
+FetchResult = namedtuple('FetchResult', 'index url raw_response error')
+
+
+def _dump_request(rreq):
+    body = None
+    if isinstance(rreq.body, ChunkedBody):
+        raise TypeError('chunked request bodies are not supported')
+    elif rreq.body is not None:
+        body = b''.join(rreq.body.send_data())
+    return (rreq.method, rreq.host_url.to_text(), rreq.url,
+            list(rreq.headers.iteritems(multi=True)), body)
+
+
+def _load_request(dumped):
+    method, url_text, url, header_items, body = dumped
+    return RawRequest(method=method,
+                      url=url,
+                      host_url=URL(url_text),
+                      headers=Headers(header_items),
+                      body=Body(body) if body is not None else None)
+
+
+def _dump_response(rresp):
+    return (bytes(rresp.status_line),
+            list(rresp.headers.iteritems(multi=True)),
+            rresp.body.data)
+
+
+def _load_response(dumped):
+    status_line, header_items, data = dumped
+    body = Body()
+    if data:
+        body.data_received(data)
+    body.complete(len(data or ''))
+    return RawResponse(status_line=status_line,
+                       headers=Headers(header_items),
+                       body=body)
+
+
+def _worker_main(inbox, outbox, concurrency, per_host, timeout):
+    """\
+    A worker's loop: takes ``(index, dumped_request)`` off *inbox*
+    (None to stop), and puts ``(index, dumped_response, error)`` on
+    *outbox* as each finishes.
+    """
+    from hematite.async import Joiner
+    from hematite.client import Client, ClientResponse
+    pool_kw = {}
+    if per_host is not None:
+        pool_kw['max_per_host'] = per_host
+    client = Client(pool=ConnectionPool(**pool_kw))
+    joiner = Joiner(raise_exc=False)
+    stopping = False
+    try:
+        while not stopping or joiner.active:
+            while not stopping and len(joiner.active) < concurrency:
+                try:
+                    item = inbox.get(block=not joiner.active)
+                except Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                index, dumped = item
+                try:
+                    client_resp = ClientResponse(
+                        client=client, request=_load_request(dumped),
+                        nonblocking=True, timeout=timeout)
+                except Exception as e:
+                    outbox.put((index, None, repr(e)))
+                    continue
+                client_resp.index = index
+                joiner.add(client_resp)
+            if not joiner.active:
+                continue
+            for client_resp in joiner.poll(POLL_INTERVAL):
+                if client_resp.is_complete:
+                    result = (client_resp.index,
+                              _dump_response(client_resp.raw_response), None)
+                else:
+                    error = client_resp.error or 'request did not complete'
+                    result = (client_resp.index, None, repr(error))
+                outbox.put(result)
+    finally:
+        joiner.close()
+
+
+class ShardedExecutor(object):
+    """\
+    Fetches requests across *workers* processes (defaulting to one
+    per CPU). Each worker keeps up to *concurrency* requests in flight,
+    no more than *per_host* of them to one host.
+    """
+    def __init__(self, workers=None, concurrency=DEFAULT_CONCURRENCY,
+                 per_host=None, timeout=DEFAULT_TIMEOUT,
+                 replicas=DEFAULT_REPLICAS, profile=None):
+        self.worker_count = workers or multiprocessing.cpu_count()
+        self.profile = profile or HematiteProfile()
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.ring = HashRing(range(self.worker_count), replicas=replicas)
+        self.processes = []
+        self.inboxes = []
+        self.outbox = None
+
+    def start(self):
+        if self.processes:
+            return
+        self.outbox = multiprocessing.Queue()
+        for i in range(self.worker_count):
+            inbox = multiprocessing.Queue()
+            proc = multiprocessing.Process(target=_worker_main,
+                                           args=(inbox, self.outbox,
+                                                 self.concurrency,
+                                                 self.per_host,
+                                                 self.timeout))
+            proc.daemon = True
+            proc.start()
+            self.inboxes.append(inbox)
+            self.processes.append(proc)
+
+    def close(self):
+        """\
+        Stops the workers once they've finished what they were sent,
+        dropping any results that weren't fetched. Workers still going
+        after CLOSE_TIMEOUT seconds are terminated.
+        """
+        for inbox in self.inboxes:
+            inbox.put(None)
+        deadline = time.time() + CLOSE_TIMEOUT
+        # a worker can't exit until its results are all on the outbox,
+        # so what an abandoned fetch() didn't take has to be drained
+        while any([proc.is_alive() for proc in self.processes]):
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                self.outbox.get(timeout=min(remaining, RESULT_INTERVAL))
+            except Empty:
+                pass
+        for proc, inbox in zip(self.processes, self.inboxes):
+            proc.join(max(deadline - time.time(), 0))
+            if proc.is_alive():
+                proc.terminate()
+                proc.join()
+                # what it didn't read can't hold up this process's exit
+                inbox.cancel_join_thread()
+        self.processes, self.inboxes = [], []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def get_worker(self, url):
+        "Returns the index of the worker that *url*'s host belongs to."
+        key = u'%s://%s:%s' % get_pool_key(url)
+        return self.ring.get_node(key)
+
+    def fetch(self, requests):
+        """\
+        Sends the Requests (or URLs, to GET) from the iterable
+        *requests* to the workers, and yields a :class:`FetchResult`
+        for each as it comes back, not necessarily in order. The
+        result's index is the request's position in *requests*, which
+        is consumed lazily, keeping a bounded number outstanding.
+        """
+        self.start()
+        max_outstanding = 2 * self.worker_count * self.concurrency
+        requests = enumerate(requests)
+        urls = {}  # index -> url, of those outstanding
+        while True:
+            while requests is not None and len(urls) < max_outstanding:
+                try:
+                    index, request = next(requests)
+                except StopIteration:
+                    requests = None
+                    break
+                if isinstance(request, basestring):
+                    request = Request('GET', request)
+                    self.profile.populate_headers(request)
+                rreq = request.to_raw_request()
+                worker = self.get_worker(rreq.host_url)
+                urls[index] = rreq.host_url.to_text()
+                self.inboxes[worker].put((index, _dump_request(rreq)))
+            if not urls:
+                break
+            try:
+                index, dumped, error = self.outbox.get(timeout=RESULT_INTERVAL)
+            except Empty:
+                dead = [p for p in self.processes if not p.is_alive()]
+                if dead:
+                    raise RuntimeError('worker processes exited: %r' % dead)
+                continue
+            raw_response = None
+            if dumped is not None:
+                raw_response = _load_response(dumped)
+            yield FetchResult(index, urls.pop(index), raw_response, error)
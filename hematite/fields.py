@@ -62,7 +62,7 @@ class ETag(HeaderValueWrapper):
     def to_bytes(self):
         if self.tag == '*':
             return '*'  # can't have a weak star
-        ret = quote_header_value(self.tag, allow_token=False)
+        ret = quote_header_value(self.tag, quote_token=True)
         if self.is_weak:
             ret = 'W/' + ret
         return ret
@@ -161,6 +161,9 @@ class Field(object):
 
 
 class HTTPHeaderField(Field):
+    # parsed on first access, rather than when the message is built
+    is_lazy = True
+
     def __init__(self, name, **kw):
         assert name
         assert name == name.lower()
@@ -196,9 +199,25 @@ class HTTPHeaderField(Field):
         if obj is None:
             return self
         try:
-            return obj.headers[self.http_name]
+            value = obj.headers[self.http_name]
         except KeyError:
             raise AttributeError(self.attr_name)
+        unparsed = getattr(obj, '_unparsed_headers', None)
+        if unparsed and self.http_name in unparsed:
+            if value:
+                value = self.from_bytes(value)
+            # in place, so that the headers' order is kept
+            obj.headers.replace(self.http_name, value)
+            unparsed.discard(self.http_name)
+        return value
+
+    def set_raw(self, obj, bytestr):
+        """Stores the header's bytes as-is, to be parsed the first time
+        the field is accessed (see serdes._parse_headers)."""
+        if not self.is_lazy:
+            return self.__set__(obj, bytestr)
+        obj.headers[self.http_name] = bytestr
+        obj._unparsed_headers.add(self.http_name)
 
     def _default_set_value(self, obj, value):
         # TODO: special handling for None? text/unicode type? (i.e, not bytes)
@@ -215,6 +234,9 @@ class HTTPHeaderField(Field):
                             % (ntn, self.attr_name, vtn))
         # TODO: if obj.headers.get(self.http_name) != value:
         obj.headers[self.http_name] = value
+        unparsed = getattr(obj, '_unparsed_headers', None)
+        if unparsed:
+            unparsed.discard(self.http_name)
 
     __set__ = _default_set_value
 
@@ -427,6 +449,8 @@ referer = HTTPHeaderField('referer',
 
 
 class HostHeaderField(HTTPHeaderField):
+    is_lazy = False  # also sets the url's host
+
     def __init__(self):
         super(HostHeaderField, self).__init__(name='host')
 
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""\
+A local HTTP/1.1 server for the tests (see the ``loopback_server``
+fixture) and the loopback benchmarks.
+"""
+
+import re
+import socket
+import threading
+
+
+_CONTENT_LENGTH_RE = re.compile(r'^content-length:\s*(\d+)\s*$', re.I | re.M)
+_CHUNKED_RE = re.compile(r'^transfer-encoding:.*chunked', re.I | re.M)
+
+
+def make_response(body='hello', status='200 OK', headers=None):
+    headers = list(headers or [])
+    if not any([k.lower() in ('content-length', 'transfer-encoding')
+                for k, _ in headers]):
+        headers.append(('Content-Length', str(len(body))))
+    lines = ['HTTP/1.1 ' + status] + ['%s: %s' % h for h in headers]
+    return '\r\n'.join(lines) + '\r\n\r\n' + body
+
+
+class LoopbackServer(object):
+    """\
+    A tiny threaded HTTP/1.1 server for exercising the client against
+    real sockets. ``routes`` maps request paths to raw response bytes,
+    or to a callable taking the request head and body and returning
+    them. Unknown paths get a plain 200. Connections are kept alive
+    unless the response says otherwise.
+    """
+    def __init__(self, routes=None):
+        self.routes = dict(routes or {})
+        self.requests = []
+        self.connection_count = 0
+        self._sock = socket.socket()
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(('127.0.0.1', 0))
+        self._sock.listen(128)
+        self.host, self.port = self._sock.getsockname()
+        self._stopped = False
+        self._conns = []
+        self._thread = threading.Thread(target=self._serve)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def url(self, path='/'):
+        return 'http://%s:%s%s' % (self.host, self.port, path)
+
+    def stop(self):
+        self._stopped = True
+        try:
+            socket.create_connection((self.host, self.port)).close()
+        except socket.error:
+            pass
+        self._thread.join()
+        self._sock.close()
+        for conn in self._conns:
+            try:
+                conn.close()
+            except socket.error:
+                pass
+
+    def _serve(self):
+        while True:
+            conn, _ = self._sock.accept()
+            if self._stopped:
+                conn.close()
+                return
+            self.connection_count += 1
+            self._conns.append(conn)
+            t = threading.Thread(target=self._handle, args=(conn,))
+            t.daemon = True
+            t.start()
+
+    def _read_request(self, conn, buf):
+        while '\r\n\r\n' not in buf:
+            data = conn.recv(65536)
+            if not data:
+                return None, None, buf
+            buf += data
+        head, _, buf = buf.partition('\r\n\r\n')
+        match = _CONTENT_LENGTH_RE.search(head)
+        if match:
+            length = int(match.group(1))
+            while len(buf) < length:
+                data = conn.recv(65536)
+                if not data:
+                    break
+                buf += data
+            body, buf = buf[:length], buf[length:]
+        elif _CHUNKED_RE.search(head):
+            while not (buf.startswith('0\r\n\r\n')
+                       or '\r\n0\r\n\r\n' in buf):
+                data = conn.recv(65536)
+                if not data:
+                    break
+                buf += data
+            if buf.startswith('0\r\n\r\n'):
+                body, buf = '', buf[5:]
+            else:
+                body, _, buf = buf.partition('\r\n0\r\n\r\n')
+                body += '\r\n'
+        else:
+            body = ''
+        return head, body, buf
+
+    def _handle(self, conn):
+        buf = ''
+        try:
+            while True:
+                head, body, buf = self._read_request(conn, buf)
+                if head is None:
+                    break
+                self.requests.append((head, body))
+                path = head.split(' ', 2)[1]
+                resp = self.routes.get(path, None)
+                if resp is None:
+                    resp = make_response()
+                elif callable(resp):
+                    resp = resp(head, body)
+                conn.sendall(resp)
+                resp_head = resp[:resp.find('\r\n\r\n')]
+                if 'connection: close' in resp_head.lower():
+                    break
+        except socket.error:
+            pass
+        finally:
+            conn.close()
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""\
+Per-request instrumentation. Every
+:class:`~hematite.client.ClientResponse` has a :class:`RequestMetrics`
+as its ``metrics``, which records when each phase of the request
+happened, on a monotonic clock, along with how many header and body
+bytes went each way. A :class:`~hematite.client.Client` created with a
+``metrics_sink`` hands the metrics of finished requests to the sink in
+batches (see :class:`MetricsCollector`).
+"""
+
+from hematite.compat import monotonic
+
+# (phase, start mark, end mark). the first eight follow one another;
+# ttfb and total span several.
+PHASES = (('pool_wait', 'pool_wait_start', 'pool_acquired'),
+          ('dns', 'dns_start', 'dns_done'),
+          ('connect', 'connect_start', 'connect_done'),
+          ('tls', 'connect_done', 'tls_done'),
+          ('send', 'send_start', 'sent'),
+          ('wait', 'sent', 'first_byte'),
+          ('headers', 'first_byte', 'headers_complete'),
+          ('body', 'headers_complete', 'complete'),
+          ('ttfb', 'started', 'first_byte'),
+          ('total', 'started', 'complete'))
+
+BYTE_COUNTERS = ('request_header_bytes', 'request_body_bytes',
+                 'response_header_bytes', 'response_body_bytes')
+
+DEFAULT_BATCH_SIZE = 100
+
+
+class RequestMetrics(object):
+    """\
+    Timestamps (``marks``) and byte counts for one request. Only the
+    first time a mark is recorded counts, so marks can be made
+    wherever the phase might end without checking for them first.
+
+    Pooled connections skip the dns, connect and tls phases. For https,
+    the tls phase ends when the first write goes through, as the
+    handshake is done as part of it.
+    """
+    def __init__(self, clock=monotonic):
+        self.clock = clock
+        self.marks = {}
+        self.method = None
+        self.url = None
+        self.status_code = None
+        self.error = None
+        self.reused_connection = False
+        for counter in BYTE_COUNTERS:
+            setattr(self, counter, 0)
+        self.mark('created')
+
+    def mark(self, name):
+        """Records the current time as *name*, unless it has already
+        been recorded. Returns the recorded time."""
+        marks = self.marks
+        if name not in marks:
+            marks[name] = self.clock()
+        return marks[name]
+
+    def get_duration(self, phase):
+        """Returns the length of *phase* (see :data:`PHASES`) in
+        seconds, or None if it didn't happen (yet)."""
+        for name, start, end in PHASES:
+            if name == phase:
+                break
+        else:
+            raise ValueError('unknown phase: %r' % phase)
+        marks = self.marks
+        if start not in marks or end not in marks:
+            return None
+        return marks[end] - marks[start]
+
+    @property
+    def durations(self):
+        ret = {}
+        for name, _, _ in PHASES:
+            duration = self.get_duration(name)
+            if duration is not None:
+                ret[name] = duration
+        return ret
+
+    def to_dict(self):
+        """A JSON-friendly dict of everything recorded, with marks
+        relative to ``created``."""
+        created = self.marks['created']
+        ret = dict([(counter, getattr(self, counter))
+                    for counter in BYTE_COUNTERS])
+        ret.update(method=self.method,
+                   url=self.url,
+                   status_code=self.status_code,
+                   error=repr(self.error) if self.error else None,
+                   reused_connection=self.reused_connection,
+                   marks=dict([(k, v - created)
+                               for k, v in self.marks.items()]),
+                   durations=self.durations)
+        return ret
+
+    def __repr__(self):
+        cn = self.__class__.__name__
+        return '<%s %s %s %r>' % (cn, self.method, self.url,
+                                  self.get_duration('total'))
+
+
+class MetricsCollector(object):
+    """\
+    Buffers the :class:`RequestMetrics` of finished requests, calling
+    *sink* with a list of them every *batch_size* requests, and
+    whenever :meth:`flush` is called.
+    """
+    def __init__(self, sink, batch_size=DEFAULT_BATCH_SIZE):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.pending = []
+
+    def add(self, metrics):
+        self.pending.append(metrics)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        pending, self.pending = self.pending, []
+        if pending:
+            self.sink(pending)
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+
+import time
+import select
+import socket
+from collections import deque
+
+DEFAULT_MAX_PER_HOST = 16
+DEFAULT_MAX_IDLE_PER_HOST = 8
+DEFAULT_IDLE_TIMEOUT = 30.0
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def get_pool_key(url):
+    """\
+    Connections are keyed on (scheme, host, port), with the port
+    filled in from the scheme if the URL doesn't specify one.
+
+    >>> from hematite.url import URL
+    >>> get_pool_key(URL(u'http://Example.com/path'))
+    (u'http', u'example.com', 80)
+    """
+    scheme = url.scheme.lower()
+    port = url.port or DEFAULT_PORTS.get(scheme)
+    return (scheme, url.host.lower(), port)
+
+
+def _is_readable(sock):
+    # an idle keep-alive socket should never be readable. if it is,
+    # the server either hung up or sent something unsolicited, and
+    # either way the connection can't be reused.
+    try:
+        fd = sock.fileno()
+    except socket.error:
+        return True
+    if fd < 0:
+        return True
+    if hasattr(select, 'poll'):
+        poller = select.poll()
+        poller.register(fd, select.POLLIN)
+        return bool(poller.poll(0))
+    readable, _, _ = select.select([fd], [], [], 0)
+    return bool(readable)
+
+
+class PooledConnection(object):
+    """\
+    A socket checked out of (or reserved in) a :class:`ConnectionPool`.
+
+    A connection acquired for a host without any idle sockets starts
+    out with ``socket`` set to ``None``; it only reserves a slot
+    against the per-host limit until the caller connects and sets the
+    socket.
+    """
+    def __init__(self, key, sock=None):
+        self.key = key
+        self.socket = sock
+        self.created = time.time()
+        self.last_released = None
+        self.request_count = 0
+        # the parsers of the connection's last request, reset and reused
+        # for its next one
+        self.reader = None
+        self.writer = None
+
+    @property
+    def is_connected(self):
+        return self.socket is not None
+
+    def is_expired(self, idle_timeout, now=None):
+        if self.last_released is None:
+            return False
+        now = time.time() if now is None else now
+        return (now - self.last_released) > idle_timeout
+
+    def is_stale(self):
+        return self.socket is None or _is_readable(self.socket)
+
+    def close(self):
+        sock, self.socket = self.socket, None
+        if sock is None:
+            return
+        try:
+            sock.close()
+        except socket.error:
+            pass
+
+    def __repr__(self):
+        cn = self.__class__.__name__
+        return ('<%s %r requests=%s connected=%s>'
+                % (cn, self.key, self.request_count, self.is_connected))
+
+
+class ConnectionPool(object):
+    """\
+    A keep-alive socket pool, keyed by (scheme, host, port).
+
+    ``max_per_host`` caps the connections to a single host, idle and
+    in-use combined. ``max_idle_per_host`` caps how many idle sockets
+    are kept around per host; anything released beyond that is
+    closed. Idle sockets are dropped after ``idle_timeout`` seconds.
+    """
+    def __init__(self,
+                 max_per_host=DEFAULT_MAX_PER_HOST,
+                 max_idle_per_host=DEFAULT_MAX_IDLE_PER_HOST,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        self.max_per_host = max_per_host
+        self.max_idle_per_host = max_idle_per_host
+        self.idle_timeout = idle_timeout
+
+        self._idle = {}  # key -> deque of PooledConnections
+        self._active = {}  # key -> count of checked-out connections
+        self._last_sweep = time.time()
+
+    def get_active_count(self, key):
+        return self._active.get(key, 0)
+
+    def get_idle_count(self, key):
+        return len(self._idle.get(key, ()))
+
+    def has_capacity(self, key):
+        total = self.get_active_count(key) + self.get_idle_count(key)
+        return total < self.max_per_host
+
+    def acquire(self, key):
+        """\
+        Returns an idle connection for *key* if one is available,
+        otherwise a new, unconnected :class:`PooledConnection` holding
+        a slot for *key*. Returns ``None`` if *key* is already at
+        ``max_per_host``.
+        """
+        now = time.time()
+        self._maybe_sweep(now)
+        idle = self._idle.get(key)
+        while idle:
+            # LIFO: the most recently used socket is the least likely
+            # to have been closed by the server
+            conn = idle.pop()
+            if conn.is_expired(self.idle_timeout, now) or conn.is_stale():
+                conn.close()
+                continue
+            self._checkout(key)
+            return conn
+        if not self.has_capacity(key):
+            return None
+        self._checkout(key)
+        return PooledConnection(key)
+
+    def release(self, conn, reusable=True):
+        """\
+        Returns a connection to the pool. Unless *reusable* is true
+        and the host has room for another idle socket, the connection
+        is closed instead.
+        """
+        key = conn.key
+        self._checkin(key)
+        if not reusable or not conn.is_connected:
+            conn.close()
+            return
+        idle = self._idle.setdefault(key, deque())
+        if len(idle) >= self.max_idle_per_host:
+            conn.close()
+            return
+        conn.last_released = time.time()
+        idle.append(conn)
+
+    def discard(self, conn):
+        self.release(conn, reusable=False)
+
+    def evict_idle(self, now=None):
+        "Closes any idle connections older than the idle_timeout."
+        now = time.time() if now is None else now
+        for key, idle in self._idle.items():
+            live = deque()
+            for conn in idle:
+                if conn.is_expired(self.idle_timeout, now):
+                    conn.close()
+                else:
+                    live.append(conn)
+            if live:
+                self._idle[key] = live
+            else:
+                del self._idle[key]
+        self._last_sweep = now
+
+    def clear(self):
+        "Closes all idle connections."
+        for idle in self._idle.values():
+            for conn in idle:
+                conn.close()
+        self._idle.clear()
+
+    def _maybe_sweep(self, now):
+        if (now - self._last_sweep) > self.idle_timeout:
+            self.evict_idle(now)
+
+    def _checkout(self, key):
+        self._active[key] = self._active.get(key, 0) + 1
+
+    def _checkin(self, key):
+        count = self._active.get(key, 0) - 1
+        if count > 0:
+            self._active[key] = count
+        else:
+            self._active.pop(key, None)
+
+    def __repr__(self):
+        cn = self.__class__.__name__
+        return ('<%s active=%s idle=%s>'
+                % (cn, sum(self._active.values()),
+                   sum([len(v) for v in self._idle.values()])))
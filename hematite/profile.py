@@ -1,3 +1,8 @@
+from hematite.raw.datastructures import DECODERS
+
+# br is only asked for if it can be decoded
+ACCEPT_ENCODING = 'gzip, br' if 'br' in DECODERS else 'gzip'
+
 
 class Profile(object):
     default_headers = []
@@ -13,4 +18,4 @@ class Profile(object):
 
 class HematiteProfile(Profile):  # TODO: naming? DefaultProfile?
     default_headers = [('User-Agent', 'Hematite/0.6'),
-                       ('Accept-Encoding', 'gzip')]
+                       ('Accept-Encoding', ACCEPT_ENCODING)]
@@ -63,6 +63,14 @@ class EndOfStream(ReadException):
     pass
 
 
+class WriteException(HTTPException):
+    pass
+
+
+class IncompleteWrite(WriteException):
+    pass
+
+
 def readline(io_obj):
     line = io_obj.readline(MAXLINE)
     if not line:
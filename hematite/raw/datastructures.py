@@ -1,7 +1,14 @@
+import os
 import zlib
+from collections import deque
 from hematite.compat import OrderedMultiDict as OMD
 from hematite.compat.dictutils import PREV, NEXT, KEY, VALUE, _MISSING
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 ORIG_KEY = VALUE + 1
 
 
@@ -33,6 +40,14 @@ class Headers(OMD):
             self_insert(k, v, orig_key)
             values.append(v)
 
+    def add_name(self, name, v):
+        """Adds *v* under *name*, a
+        :class:`~hematite.constants.HeaderName`, which is already
+        lowercased."""
+        orig_key, k, _ = name
+        self._insert(k, v, orig_key)
+        super(OMD, self).setdefault(k, []).append(v)
+
     def getlist(self, k):
         return super(Headers, self).getlist(k.lower())
 
@@ -50,7 +65,7 @@ class Headers(OMD):
             return
 
         self_add = self.add
-        if isinstance(E, Headers):
+        if isinstance(E, (Headers, CompactHeaders)):
             for k in E:
                 if k in self:
                     del self[k]
@@ -88,6 +103,13 @@ class Headers(OMD):
         self._insert(k, v, orig_key)
         super(OMD, self).__setitem__(k, [v])
 
+    def replace(self, k, v):
+        """Replaces the last value of *k* where it is, rather than
+        moving *k* to the end, as setting it does."""
+        k = k.lower()
+        super(OMD, self).__getitem__(k)[-1] = v
+        self._map[k][-1][VALUE] = v
+
     def iteritems(self, multi=False, preserve_case=True):
         root = self.root
         curr = root[NEXT]
@@ -128,82 +150,744 @@ class Headers(OMD):
     def __contains__(self, k):
         return super(Headers, self).__contains__(k.lower())
 
+    def __delitem__(self, k):
+        super(Headers, self).__delitem__(k.lower())
 
-class Decompress(object):
-    WBITS = {'gzip': (16 + zlib.MAX_WBITS,),
-             'deflate': ()}
 
-    def __init__(self, decompression):
-        if decompression:
+class CompactHeaders(object):
+    """
+    A more compact alternative to :class:`Headers`, with the same
+    interface: names and values are kept in two parallel lists, in the
+    order they were added, and the lowercased names are only indexed
+    once something is looked up by name. Better suited to holding a
+    lot of responses, e.g., in a cache, than to building one.
+
+    >>> headers = CompactHeaders([('Accept', 'text/html'),
+    ...                           ('ACCEPT', 'text/plain')])
+    >>> headers.getlist('accept')
+    ['text/html', 'text/plain']
+    >>> headers.items()
+    [('ACCEPT', 'text/plain')]
+    """
+    __slots__ = ('_names', '_values', '_index')
+
+    def __init__(self, *args, **kwargs):
+        if len(args) > 1:
+            raise TypeError('%s expected at most 1 argument, got %s'
+                            % (self.__class__.__name__, len(args)))
+        self._names = []
+        self._values = []
+        self._index = None
+        if args:
+            self.update_extend(args[0])
+        if kwargs:
+            self.update(kwargs)
+
+    def _get_index(self):
+        # lowercased name -> positions of its values
+        index = self._index
+        if index is None:
+            index = self._index = {}
+            for i, name in enumerate(self._names):
+                index.setdefault(name.lower(), []).append(i)
+        return index
+
+    def _remove(self, positions):
+        positions = set(positions)
+        names, values = self._names, self._values
+        keep = [i for i in xrange(len(names)) if i not in positions]
+        self._names = [names[i] for i in keep]
+        self._values = [values[i] for i in keep]
+        self._index = None
+
+    def add(self, k, v, multi=False):
+        names, values, index = self._names, self._values, self._index
+        for subv in (v if multi else [v]):
+            if index is not None:
+                index.setdefault(k.lower(), []).append(len(names))
+            names.append(k)
+            values.append(subv)
+
+    def add_name(self, name, v):
+        orig_key, k, _ = name
+        if self._index is not None:
+            self._index.setdefault(k, []).append(len(self._names))
+        self._names.append(orig_key)
+        self._values.append(v)
+
+    def getlist(self, k):
+        values = self._values
+        return [values[i] for i in self._get_index()[k.lower()]]
+
+    def get(self, k, default=None, multi=False):
+        positions = self._get_index().get(k.lower())
+        if not positions:
+            return [default] if multi else default
+        values = self._values
+        if multi:
+            return [values[i] for i in positions]
+        return values[positions[-1]]
+
+    def __getitem__(self, k):
+        return self._values[self._get_index()[k.lower()][-1]]
+
+    def __setitem__(self, k, v):
+        positions = self._get_index().get(k.lower())
+        if positions:
+            self._remove(positions)
+        self.add(k, v)
+
+    def __delitem__(self, k):
+        self._remove(self._get_index()[k.lower()])
+
+    def __contains__(self, k):
+        return k.lower() in self._get_index()
+
+    def __len__(self):
+        return len(self._get_index())
+
+    def __iter__(self):
+        return self.iterkeys()
+
+    def setdefault(self, k, default=None):
+        current = self.get(k, _MISSING)
+        if current is _MISSING:
+            self[k] = default
+            current = default
+        return current
+
+    def replace(self, k, v):
+        """Replaces the last value of *k* where it is, rather than
+        moving *k* to the end, as setting it does."""
+        self._values[self._get_index()[k.lower()][-1]] = v
+
+    def get_cased_items(self, k):
+        names, values = self._names, self._values
+        return [(names[i], values[i]) for i in self._get_index()[k.lower()]]
+
+    def popall(self, k, default=_MISSING):
+        positions = self._get_index().get(k.lower())
+        if not positions:
+            if default is _MISSING:
+                raise KeyError(k)
+            return default
+        values = self._values
+        ret = [values[i] for i in positions]
+        self._remove(positions)
+        return ret
+
+    def pop(self, k, default=_MISSING):
+        ret = self.popall(k, _MISSING if default is _MISSING else [default])
+        return ret[-1]
+
+    def poplast(self, k=_MISSING, default=_MISSING):
+        if k is _MISSING:
+            if not self._names:
+                raise KeyError('empty %r' % type(self))
+            i = len(self._names) - 1
+        else:
+            positions = self._get_index().get(k.lower())
+            if not positions:
+                if default is _MISSING:
+                    raise KeyError(k)
+                return default
+            i = positions[-1]
+        ret = self._values[i]
+        if i == len(self._names) - 1:
+            # the common case, and the index can be kept
+            name = self._names.pop()
+            self._values.pop()
+            if self._index is not None:
+                positions = self._index[name.lower()]
+                positions.pop()
+                if not positions:
+                    del self._index[name.lower()]
+        else:
+            self._remove([i])
+        return ret
+
+    def clear(self):
+        self._names, self._values, self._index = [], [], None
+
+    def copy(self):
+        return self.__class__(self.iteritems(multi=True, preserve_case=True))
+
+    def update(self, E=(), **F):
+        if E is self:
+            return
+        if isinstance(E, (CompactHeaders, OMD)):
+            for k in E:
+                if k in self:
+                    del self[k]
+            self.update_extend(E)
+        elif hasattr(E, 'keys'):
+            for k in E.keys():
+                self[k] = E[k]
+        else:
+            seen = set()
+            for k, v in E:
+                lower_k = k.lower()
+                if lower_k not in seen and lower_k in self:
+                    del self[k]
+                    seen.add(lower_k)
+                self.add(k, v)
+        for k in F:
+            self[k] = F[k]
+
+    def update_extend(self, E=(), **F):
+        if E is self:
+            iterator = iter(E.items(multi=True))
+        elif isinstance(E, (CompactHeaders, OMD)):
+            iterator = E.iteritems(multi=True)
+        elif hasattr(E, 'keys'):
+            iterator = ((k, E[k]) for k in E.keys())
+        else:
+            iterator = E
+        self_add = self.add
+        for k, v in iterator:
+            self_add(k, v)
+        for k in F:
+            self_add(k, F[k])
+
+    def iterkeys(self, multi=False):
+        if multi:
+            for name in self._names:
+                yield name.lower()
+        else:
+            # dicts don't keep order, but the positions do
+            for _, k in sorted([(positions[0], k) for k, positions
+                                in self._get_index().iteritems()]):
+                yield k
+
+    def itervalues(self, multi=False):
+        for _, v in self.iteritems(multi=multi):
+            yield v
+
+    def iteritems(self, multi=False, preserve_case=True):
+        names, values = self._names, self._values
+        if multi:
+            if preserve_case:
+                for item in zip(names, values):
+                    yield item
+            else:
+                for name, value in zip(names, values):
+                    yield name.lower(), value
+        else:
+            index = self._get_index()
+            for k in self.iterkeys():
+                i = index[k][-1]
+                yield (names[i] if preserve_case else k), values[i]
+
+    def itercaseditems(self):
+        for name, value in zip(self._names, self._values):
+            yield name, name.lower(), value
+
+    def keys(self, multi=False):
+        return list(self.iterkeys(multi=multi))
+
+    def values(self, multi=False):
+        return list(self.itervalues(multi=multi))
+
+    def items(self, multi=False, preserve_case=True):
+        return list(self.iteritems(multi=multi,
+                                   preserve_case=preserve_case))
+
+    def todict(self):
+        return dict([(k, self[k]) for k in self])
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, (CompactHeaders, OMD)):
+            return False
+        return self.items(multi=True) == other.items(multi=True)
+
+    def __ne__(self, other):
+        return not (self == other)
+
+    def __repr__(self):
+        cn = self.__class__.__name__
+        kvs = ', '.join([repr(item) for item in zip(self._names,
+                                                    self._values)])
+        return '%s([%s])' % (cn, kvs)
+
+
+# the most decoded data a body's decoder produces at a time, however
+# compressible the input
+MAX_DECODE_SIZE = 2 ** 16
+
+
+class ZlibDecoder(object):
+    "Decodes gzip and (zlib-wrapped) deflate."
+    WBITS = {'gzip': 16 + zlib.MAX_WBITS,
+             'x-gzip': 16 + zlib.MAX_WBITS,
+             'deflate': zlib.MAX_WBITS}
+
+    def __init__(self, coding):
+        self.decompressobj = zlib.decompressobj(self.WBITS[coding])
+        self.inputs = deque()
+        self.tail = b''
+        self.rest = b''
+        self._full = False
+
+    def feed(self, data):
+        self.inputs.append(data)
+
+    def read(self, max_output, final=False):
+        """Decodes up to *max_output* bytes of the data fed so far, or
+        returns '' if there's no more without more data. Once *final*,
+        whatever the decompressor held back is flushed out too."""
+        decompressobj = self.decompressobj
+        while decompressobj is not None:
+            # a full piece may have more output waiting behind it
+            if not self.tail and not self._full:
+                if self.inputs:
+                    self.tail = self.inputs.popleft()
+                elif final:
+                    self.rest = decompressobj.flush()
+                    self.decompressobj = None
+                    break
+                else:
+                    return b''
+            out = decompressobj.decompress(self.tail, max_output)
+            self.tail = decompressobj.unconsumed_tail
+            self._full = len(out) == max_output
+            if out:
+                return out
+        out, self.rest = self.rest[:max_output], self.rest[max_output:]
+        return out
+
+
+class BrotliDecoder(object):
+    """\
+    Decodes br with either of the brotli or brotlipy packages. Neither
+    can stop at an output limit, so each piece of input is decoded
+    whole, and only then handed out bit by bit.
+    """
+    def __init__(self, coding):
+        self.decompressor = brotli.Decompressor()
+        self._process = (getattr(self.decompressor, 'process', None)
+                         or self.decompressor.decompress)
+        self.inputs = deque()
+        self.out = b''
+        self.start = 0
+        self.flushed = False
+
+    def feed(self, data):
+        self.inputs.append(data)
+
+    def read(self, max_output, final=False):
+        "See :meth:`ZlibDecoder.read`."
+        while self.start >= len(self.out):
+            if self.inputs:
+                self.out = self._process(self.inputs.popleft())
+            elif final and not self.flushed:
+                self.flushed = True
+                flush = getattr(self.decompressor, 'flush', None)
+                self.out = flush() if flush else b''
+            else:
+                return b''
+            self.start = 0
+        end = self.start + max_output
+        out, self.start = self.out[self.start:end], end
+        return out
+
+
+DECODERS = {'gzip': ZlibDecoder,
+            'x-gzip': ZlibDecoder,
+            'deflate': ZlibDecoder}
+if brotli is not None:
+    DECODERS['br'] = BrotliDecoder
+
+
+def get_decodable_codings(codings):
+    """\
+    Returns the content-codings at the end of *codings*, listed in the
+    order they were applied (as in Content-Encoding), that can be
+    decoded. Any before an unsupported one are left as they are.
+
+    >>> get_decodable_codings(['compress', 'deflate', 'identity', 'GZIP'])
+    ('deflate', 'gzip')
+    """
+    ret = []
+    for coding in reversed(codings):
+        coding = coding.strip().lower()
+        if coding == 'identity':
+            continue
+        if coding not in DECODERS:
+            break
+        ret.append(coding)
+    return tuple(reversed(ret))
+
+
+class ContentDecoder(object):
+    """\
+    Undoes *codings*, listed in the order they were applied, on data
+    as it's fed in. Decoding is pulled along by :meth:`read`, a piece
+    of at most *max_output* bytes at a time, so that a small, highly
+    compressed input is never decoded all at once, or any sooner than
+    it's wanted.
+    """
+    def __init__(self, codings, max_output=MAX_DECODE_SIZE):
+        if isinstance(codings, basestring):
+            codings = [codings]
+        self.codings = tuple(codings)
+        self.max_output = max_output
+        self.finished = False
+        self.stages = []
+        for coding in reversed(self.codings):
             try:
-                args = self.WBITS[decompression]
+                self.stages.append(DECODERS[coding](coding))
             except KeyError:
                 raise RuntimeError('unknown decompression '
-                                   '{0}'.format(decompression))
-            self.decompressor = zlib.decompressobj(*args)
-            self.decompress = self.decompressor.decompress
+                                   '{0}'.format(coding))
+
+    def feed(self, data):
+        "Queues *data* up to be decoded by :meth:`read`."
+        self.stages[0].feed(data)
+
+    def finish(self):
+        "Marks the end of the data, so that what's held back comes out."
+        self.finished = True
+
+    def read(self, amount=None):
+        """Decodes and returns up to *amount* bytes (no more than
+        ``max_output``), or '' if there's nothing more to decode until
+        more data is fed in."""
+        if amount is None or amount > self.max_output:
+            amount = self.max_output
+        return self._read(len(self.stages) - 1, amount)
+
+    def decode(self, data):
+        "Feeds *data* in, and generates all of it that can be decoded."
+        self.feed(data)
+        return self._read_all()
+
+    def flush(self):
+        "Generates whatever is left once all the data has been fed in."
+        self.finish()
+        return self._read_all()
+
+    def _read(self, index, amount):
+        stage = self.stages[index]
+        while True:
+            out = stage.read(amount)
+            if out or not index:
+                break
+            # the stage needs more input, from the one before it
+            data = self._read(index - 1, self.max_output)
+            if not data:
+                break
+            stage.feed(data)
+        if not out and self.finished:
+            out = stage.read(amount, final=True)
+        return out
+
+    def _read_all(self):
+        out = self.read()
+        while out:
+            yield out
+            out = self.read()
 
-    def decompress(self, data):
-        return data
+    def __repr__(self):
+        cn = self.__class__.__name__
+        return '<%s %s>' % (cn, ', '.join(self.codings))
 
 
-class ChunkedBody(Decompress):
+class Decompress(object):
+    decoder = None
 
-    def __init__(self, chunks=None, decompression=None):
-        super(ChunkedBody, self).__init__(decompression)
-        self.chunks = chunks or []
-        self.data = None
+    def __init__(self, decompression):
+        if decompression:
+            self.decoder = ContentDecoder(decompression)
+
+
+# bodies declaring a larger Content-Length than this grow as they're
+# read instead of being allocated up front
+MAX_PREALLOCATE = 2 ** 28
+
+
+class BufferedBody(Decompress):
+    """\
+    Accumulates a received body into a single bytearray, preallocated
+    when the size is known ahead of time, so that it never has to be
+    joined together at the end. Once complete, the body is available
+    without copying via :attr:`view`, while :attr:`data` copies it
+    into a string on first access. Only the first ``length`` bytes of
+    the buffer are the body.
+
+    The buffer is never resized while views of it are out. A body that
+    outgrows it moves to a new, bigger one instead, leaving the old one
+    to the views.
+
+    Bodies can also be streamed (see :meth:`start_streaming`), in
+    which case data is queued up until read, and not kept after.
+
+    Compressed bodies are decoded as they're received, unless streamed
+    or *defer_decoding*, in which case they're only decoded as far as
+    they're read (see :meth:`decode_received`), or once needed whole.
+    """
+    def __init__(self, decompression=None, size_hint=None,
+                 defer_decoding=False):
+        super(BufferedBody, self).__init__(decompression)
+        self.defer_decoding = defer_decoding
+        if decompression or not size_hint or size_hint > MAX_PREALLOCATE:
+            size_hint = 0
+        self.buffer = bytearray(size_hint)
+        self.length = 0
         self.nominal_length = None
+        self.is_complete = False
+        self._data = None
+
+        self.streaming = False
+        self.pending = deque()
+        self.pending_size = 0
+        # how much of the first pending part's been read already
+        self._pending_start = 0
+
+    def start_streaming(self):
+        """Switches the body from accumulating data to queueing it up
+        for :meth:`read_pending`, which hands it off. Anything received
+        up to this point is queued first."""
+        if self.streaming:
+            return
+        self.streaming = True
+        if self.length:
+            # handed off as it is, not copied
+            self.pending.append(memoryview(self.buffer)[:self.length])
+            self.pending_size = self.length
+        self.buffer = bytearray()
+
+    def read_pending(self, amount):
+        "Pops up to *amount* bytes of streamed data off of the queue."
+        pending, parts, size = self.pending, [], 0
+        while pending and size < amount:
+            part, start = pending[0], self._pending_start
+            end = min(len(part), start + amount - size)
+            if start or end < len(part) or not isinstance(part, bytes):
+                # only what's taken is copied, never the rest of the part
+                parts.append(memoryview(part)[start:end].tobytes())
+            else:
+                parts.append(part)
+            if end == len(part):
+                pending.popleft()
+                end = 0
+            self._pending_start = end
+            size += len(parts[-1])
+        self.pending_size -= size
+        return parts[0] if len(parts) == 1 else b''.join(parts)
+
+    def data_received(self, data):
+        if self.decoder is None:
+            self._decoded_received(data)
+        else:
+            self.decoder.feed(data)
+            if not (self.streaming or self.defer_decoding):
+                self.decode_received()
+
+    def decode_received(self, amount=None):
+        """Decodes up to *amount* bytes (by default, all there is) of
+        the compressed data received so far, onto the queue if
+        streaming, returning how many."""
+        decoder, decoded = self.decoder, 0
+        if decoder is None:
+            return 0
+        while amount is None or decoded < amount:
+            piece = decoder.read(None if amount is None
+                                 else amount - decoded)
+            if not piece:
+                break
+            self._decoded_received(piece)
+            decoded += len(piece)
+        return decoded
+
+    def _decoded_received(self, data):
+        if self.streaming:
+            if data:
+                self.pending.append(data)
+                self.pending_size += len(data)
+                self.length += len(data)
+            return
+        end = self.length + len(data)
+        if end > len(self.buffer):
+            self._grow(end)
+        self.buffer[self.length:end] = data
+        self.length = end
+
+    def _grow(self, size):
+        try:
+            self.buffer.extend(bytearray(size - len(self.buffer)))
+        except BufferError:
+            # there are views of the buffer (see get_view)
+            buf = bytearray(max(size, 2 * len(self.buffer)))
+            buf[:self.length] = memoryview(self.buffer)[:self.length]
+            self.buffer = buf
+
+    def reserve(self, amount):
+        """Returns a writable memoryview of the next *amount* bytes of
+        the buffer, for reading into directly (see :meth:`commit`), or
+        None if the body is being decompressed or wasn't preallocated
+        with enough room."""
+        end = self.length + amount
+        if self.decoder is not None or self.streaming:
+            return None
+        if end > len(self.buffer):
+            return None
+        return memoryview(self.buffer)[self.length:end]
+
+    def commit(self, amount):
+        "Marks *amount* bytes written to a :meth:`reserve` view as read."
+        self.length += amount
+
+    def complete(self, length):
+        if self.is_complete:
+            return
+        if self.decoder is not None:
+            self.decoder.finish()
+            if not (self.streaming or self.defer_decoding):
+                self.decode_received()
+        if len(self.buffer) > self.length:
+            try:
+                del self.buffer[self.length:]  # shrinks in place
+            except BufferError:
+                pass  # there are views of it, so it stays as is
+        self.nominal_length = length
+        self.is_complete = True
+
+    def get_view(self, start=0, end=None):
+        """Returns a memoryview of the body received so far, without
+        copying, once any deferred decoding's been done."""
+        if self.decoder is not None and not self.streaming:
+            self.decode_received()
+        end = self.length if end is None else min(end, self.length)
+        return memoryview(self.buffer)[start:end]
+
+    @property
+    def view(self):
+        "A memoryview of the complete body, or None if incomplete."
+        if not self.is_complete:
+            return None
+        return self.get_view()
+
+    @property
+    def data(self):
+        if not self.is_complete or self.streaming:
+            return None
+        if self._data is None:
+            self._data = self.get_view().tobytes()
+        return self._data
+
+
+class ChunkedBody(BufferedBody):
+
+    def __init__(self, chunks=None, decompression=None,
+                 defer_decoding=False):
+        super(ChunkedBody, self).__init__(decompression,
+                                          defer_decoding=defer_decoding)
+        self.chunks = chunks or []
+        self.chunk_count = 0
 
     def send_chunk(self):
         return iter(self.chunks)
 
     def chunk_received(self, chunk):
-        return self.chunks.append(self.decompress(chunk))
+        self.data_received(chunk)
+        self.chunk_complete()
 
-    def complete(self, length):
-        self.data = ''.join(self.chunks)
-        self.nominal_length = length
+    def chunk_complete(self):
+        self.chunk_count += 1
 
     def __repr__(self):
         cn = self.__class__.__name__
-        if len(self.chunks) == 1:
+        if self.chunks:
+            count = len(self.chunks)
+            totsize = sum([len(c) for c in self.chunks])
+        else:
+            count, totsize = self.chunk_count, self.length
+        if count == 1:
             chunkstr = '1 chunk'
         else:
-            chunkstr = '%s chunks' % len(self.chunks)
-        compstr = 'complete' if self.data else 'incomplete'
-        totsize = sum([len(c) for c in self.chunks])
+            chunkstr = '%s chunks' % count
+        compstr = 'complete' if self.is_complete else 'incomplete'
         return '<%s %s, %s total bytes, %s>' % (cn, chunkstr, totsize, compstr)
 
 
-class Body(Decompress):
+class Body(BufferedBody):
 
-    def __init__(self, body=None, decompression=None):
-        super(Body, self).__init__(decompression)
-        self.body = body or []
-        self.data = None
-        self.nominal_length = None
-
-    def data_received(self, data):
-        # To help determine Content-Length when Transfer-Encoding:
-        # gzip
-        return self.body.append(self.decompress(data))
+    def __init__(self, body=None, decompression=None, size_hint=None,
+                 defer_decoding=False):
+        super(Body, self).__init__(decompression, size_hint=size_hint,
+                                   defer_decoding=defer_decoding)
+        self.body = body
 
     def send_data(self):
         return [self.body]
 
-    def complete(self, length):
-        self.data = ''.join(self.body)
-        self.nominal_length = length
+    def __repr__(self):
+        cn = self.__class__.__name__
+        compstr = 'complete' if self.is_complete else 'incomplete'
+        totsize = len(self.body) if self.body else self.length
+        return '<%s %s total bytes, %s>' % (cn, totsize, compstr)
+
+
+class FileBody(Body):
+    """\
+    An identity-encoded body sent from a file, starting from the
+    file's current position. *size* defaults to the rest of the
+    file. Rather than reading it all in, writers hand the whole
+    FileBody to the driver (see :data:`~hematite.raw.messages.HaveFile`),
+    which can use ``sendfile`` or read it in pieces.
+    """
+    READ_SIZE = 2 ** 16
+
+    def __init__(self, fileobj, size=None):
+        super(FileBody, self).__init__()
+        self.fileobj = fileobj
+        self.offset = fileobj.tell()
+        if size is None:
+            size = self._get_size() - self.offset
+        self.size = int(size)
+
+    def _get_size(self):
+        try:
+            return os.fstat(self.fileobj.fileno()).st_size
+        except (AttributeError, IOError, OSError, ValueError):
+            # not backed by a real file, e.g., a BytesIO
+            pos = self.fileobj.tell()
+            self.fileobj.seek(0, os.SEEK_END)
+            size = self.fileobj.tell()
+            self.fileobj.seek(pos)
+            return size
+
+    def fileno(self):
+        "Returns the file's descriptor, or None if it doesn't have one."
+        try:
+            return self.fileobj.fileno()
+        except (AttributeError, IOError, OSError, ValueError):
+            return None
+
+    def readinto(self, buf, offset):
+        """Reads from *offset* bytes into the body (not the file) into
+        the writable buffer *buf*, returning the amount read."""
+        amount = min(len(buf), self.size - offset)
+        if amount <= 0:
+            return 0
+        self.fileobj.seek(self.offset + offset)
+        return self.fileobj.readinto(memoryview(buf)[:amount]) or 0
+
+    def send_data(self):
+        buf = bytearray(self.READ_SIZE)
+        sent = 0
+        while sent < self.size:
+            amount = self.readinto(buf, sent)
+            if not amount:
+                break
+            sent += amount
+            yield bytes(buf[:amount])
 
     def __repr__(self):
         cn = self.__class__.__name__
-        partstr = ''
-        if len(self.body) > 1:
-            partstr = ' %s parts,' % len(self.body)
-        compstr = 'complete' if self.data else 'incomplete'
-        totsize = sum([len(p) for p in self.body])
-        return '<%s%s %s total bytes, %s>' % (cn, partstr, totsize, compstr)
+        return '<%s %r, %s bytes>' % (cn, self.fileobj, self.size)
 
 
 class UnifiedBody(object):
@@ -5,8 +5,10 @@ from hematite.raw import messages as M
 from hematite.raw import parser as P
 import errno
 import io
+import os
 import socket
 import ssl
+from collections import deque
 from threading import Lock, RLock
 
 
@@ -16,7 +18,7 @@ class BaseIODriver(object):
     def __init__(self, reader, writer):
         self.reader = reader
         self.writer = writer
-        self.writer_iter = iter(writer)
+        self.writer_iter = iter(writer) if writer is not None else None
 
     @abstractmethod
     def write_line(self, line):
@@ -32,6 +34,14 @@ class BaseIODriver(object):
         """
         pass
 
+    def write_file(self, file_body):
+        """
+        Writes a FileBody to output. Drivers that can send files more
+        directly than piece by piece override this.
+        """
+        for data in file_body.send_data():
+            self.write_data(data)
+
     @abstractmethod
     def read_line(self):
         """
@@ -62,6 +72,8 @@ class BaseIODriver(object):
                 self.write_line(state.value)
             elif state.type == M.HaveData.type:
                 self.write_data(state.value)
+            elif state.type == M.HaveFile.type:
+                self.write_file(state.value)
             else:
                 raise RuntimeError("Unknown state {0!r}".format(state))
         return False
@@ -122,6 +134,13 @@ class SocketDriver(BaseIODriver):
     write_backlog_rlock = RLock()
 
     SocketIO = SocketIO
+    RECV_SIZE = 2 ** 16
+    SEND_SIZE = 2 ** 16
+    # writes smaller than this are gathered up to MAX_COALESCE bytes
+    # and sent together, e.g., all the lines of a request's head
+    COALESCE_SIZE = 2 ** 14
+    MAX_COALESCE = 2 ** 16
+    IOV_MAX = 1024
 
     # NB we're shadowing the socket module here!
     def __init__(self, socket, reader, writer):
@@ -131,9 +150,23 @@ class SocketDriver(BaseIODriver):
         self.inbound = io.BufferedReader(self.outbound)
         self.socket = socket
 
+        self.recv_buffer = bytearray(self.RECV_SIZE)
+        self.recv_view = memoryview(self.recv_buffer)
+
         self.readline_buffer = []
         self.peek_buffer = []
         self.write_backlog = ''
+        # buffers queued behind write_backlog, see _write_parts
+        self.parts_backlog = deque()
+        # [file_body, offset] of a file being sent, see write_file
+        self.file_backlog = None
+        self.send_buffer = None
+
+        # sendfile and sendmsg need the kernel to see the plain socket
+        self.sendfile = getattr(os, 'sendfile', None)
+        self.sendmsg = getattr(socket, 'sendmsg', None)
+        if isinstance(socket, ssl.SSLSocket):
+            self.sendfile = self.sendmsg = None
 
     def distinguish_empty(self, io_method, args):
         """Some io.SocketIO methods return the empty string both for
@@ -168,15 +201,68 @@ class SocketDriver(BaseIODriver):
                 # written may be None, but characters_written on
                 # BlockingIOError must be an integer. so set it to 0.
                 written = 0
-                self.write_backlog = data
-            else:
-                self.write_backlog = data[written:]
 
-            if self.write_backlog:
+            if written < len(data):
+                # a memoryview, so that the rest isn't copied each time
+                # a large write only partially goes through
+                self.write_backlog = memoryview(data)[written:]
                 raise core.eagain(characters_written=written)
 
+            self.write_backlog = ''
             return written
 
+    def write_file(self, file_body):
+        with self.write_backlog_rlock:
+            self.file_backlog = [file_body, 0]
+            self._write_file_backlog()
+
+    def _write_file_backlog(self):
+        file_body, offset = self.file_backlog
+        fd = file_body.fileno() if self.sendfile else None
+        while offset < file_body.size:
+            if fd is not None:
+                sent = self._sendfile(file_body, fd, offset)
+            else:
+                sent = self._send_file_piece(file_body, offset)
+            offset += sent
+            if offset < file_body.size and not sent:
+                self.file_backlog[1] = offset
+                raise core.eagain()
+        self.file_backlog = None
+
+    def _sendfile(self, file_body, fd, offset):
+        try:
+            sent = self.sendfile(self.socket.fileno(), fd,
+                                 file_body.offset + offset,
+                                 file_body.size - offset)
+        except (OSError, IOError) as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return 0
+            raise
+        if not sent:
+            raise core.IncompleteWrite('file ended {0} bytes short of its '
+                                       'size'.format(file_body.size - offset))
+        return sent
+
+    def _send_file_piece(self, file_body, offset):
+        # sendfile's not an option, so read into a reusable buffer and
+        # write slices of it. whatever can't be written is read again
+        # next time, rather than kept around.
+        if self.send_buffer is None:
+            self.send_buffer = bytearray(self.SEND_SIZE)
+        amount = file_body.readinto(self.send_buffer, offset)
+        if not amount:
+            raise core.IncompleteWrite('file ended {0} bytes short of its '
+                                       'size'.format(file_body.size - offset))
+        view = memoryview(self.send_buffer)[:amount]
+        written = 0
+        while written < amount:
+            sent = self.outbound.write(view[written:])
+            if not sent:
+                break
+            written += sent
+        return written
+
     write_line = write_data
 
     def read_line(self):
@@ -208,11 +294,171 @@ class SocketDriver(BaseIODriver):
             self.peek_buffer = []
             return result
 
+    def read(self, headers_only=False, max_amount=None):
+        """Reads whatever the socket has available in one large
+        readinto, and feeds it all to the reader at once, rather than
+        a read call per line or chunk. Bodies of known length are read
+        directly into the body's preallocated buffer.
+
+        With *headers_only*, returns False once the headers are in,
+        leaving the body to :meth:`read_some`. *max_amount* caps each
+        readinto, bounding how much of the body is read along with the
+        headers."""
+        reader = self.reader
+        recv_view = self.recv_view
+        if max_amount is not None:
+            recv_view = recv_view[:max(max_amount, 1)]
+        while not reader.complete:
+            if headers_only and self.inbound_headers_completed:
+                return False
+            # bodies of known length are read straight into place
+            body_buffer = reader.get_body_buffer()
+            if body_buffer is not None:
+                amount = self.outbound.readinto(body_buffer)
+                del body_buffer
+                if amount is None:
+                    raise core.eagain()
+                reader.feed_into(amount)
+            else:
+                amount = self.outbound.readinto(recv_view)
+                if amount is None:
+                    raise core.eagain()
+                reader.feed(self.recv_view[:amount].tobytes())
+            if not amount and not reader.complete:
+                raise core.EndOfStream
+        self.state = M.Complete
+        return True
+
+    def read_some(self, max_amount=None):
+        """Makes a single readinto of up to *max_amount* bytes and feeds
+        them to the reader, returning whether the reader is complete.
+        For pulling bodies along at the consumer's pace."""
+        reader = self.reader
+        if reader.complete:
+            return True
+        recv_view = self.recv_view
+        if max_amount is not None:
+            recv_view = recv_view[:max(max_amount, 1)]
+        amount = self.outbound.readinto(recv_view)
+        if amount is None:
+            raise core.eagain()
+        reader.feed(self.recv_view[:amount].tobytes())
+        if not amount and not reader.complete:
+            raise core.EndOfStream
+        return reader.complete
+
+    def _write_parts(self, parts):
+        """Writes a list of buffers with as few calls as possible: a
+        single scatter/gather sendmsg where available, otherwise with
+        runs of small buffers joined together. Whatever can't be written
+        is kept in write_backlog/parts_backlog, by offset."""
+        if len(parts) == 1:
+            return self.write_data(parts[0])
+        elif not parts:
+            return 0
+        if self.sendmsg is None:
+            buffers = _coalesce(parts, self.COALESCE_SIZE)
+            for i, buf in enumerate(buffers):
+                try:
+                    self.write_data(buf)
+                except io.BlockingIOError:
+                    self.parts_backlog.extend(buffers[i + 1:])
+                    raise
+            return
+        while parts:
+            batch = parts[:self.IOV_MAX]
+            try:
+                written = self.sendmsg(batch)
+            except (OSError, IOError, socket.error) as e:
+                if e.args[0] not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    raise
+                written = 0
+            i = 0
+            while i < len(batch) and written >= len(batch[i]):
+                written -= len(batch[i])
+                i += 1
+            if i < len(batch):
+                self.write_backlog = memoryview(parts[i])[written:]
+                self.parts_backlog.extend(parts[i + 1:])
+                raise core.eagain()
+            parts = parts[len(batch):]
+
+    def _write_backlog(self):
+        if self.write_backlog:
+            self.write_data(self.write_backlog)
+        if self.parts_backlog:
+            parts = list(self.parts_backlog)
+            self.parts_backlog.clear()
+            self._write_parts(parts)
+        if self.file_backlog:
+            self._write_file_backlog()
+
+    @property
+    def has_backlog(self):
+        return bool(self.write_backlog or self.parts_backlog
+                    or self.file_backlog)
+
     def write(self):
+        """Writes out the writer's messages, gathering small ones (e.g.,
+        the request line and headers) into a single send."""
         with self.write_backlog_rlock:
-            if self.write_backlog:
-                self.write_data(self.write_backlog)
-        return super(SocketDriver, self).write()
+            self._write_backlog()
+            parts, size = [], 0
+            for state in self.writer_iter:
+                self.state = state
+                if state is M.Complete:
+                    break
+                elif state.type == M.HaveFile.type:
+                    # queued before the parts ahead of it are flushed,
+                    # so that it's sent with the rest of the backlog if
+                    # they can't all go out yet
+                    self.file_backlog = [state.value, 0]
+                    self._write_parts(parts)
+                    parts, size = [], 0
+                    self.write_file(state.value)
+                elif state.type in (M.HaveLine.type, M.HaveData.type):
+                    parts.append(state.value)
+                    size += len(state.value)
+                    if (size >= self.MAX_COALESCE
+                            or len(state.value) >= self.COALESCE_SIZE):
+                        self._write_parts(parts)
+                        parts, size = [], 0
+                else:
+                    raise RuntimeError("Unknown state {0!r}".format(state))
+            self._write_parts(parts)
+            return self.writer.complete
+
+    @property
+    def want_read(self):
+        # the request has to be out before the response is read
+        if self.has_backlog:
+            return False
+        return super(SocketDriver, self).want_read
+
+    @property
+    def want_write(self):
+        return self.has_backlog or super(SocketDriver, self).want_write
+
+
+def _coalesce(parts, max_size):
+    """Joins runs of buffers smaller than *max_size*, leaving larger
+    ones as-is so they aren't copied.
+
+    >>> _coalesce(['a', 'b', 'big', 'c', 'd'], 3)
+    ['ab', 'big', 'cd']
+    """
+    ret, run = [], []
+    for part in parts:
+        if len(part) < max_size:
+            run.append(part)
+            continue
+        if run:
+            ret.append(b''.join(run))
+            run = []
+        ret.append(part)
+    if run:
+        ret.append(b''.join(run))
+    return ret
 
 
 class SSLSocketIO(SocketIO):
@@ -267,6 +513,136 @@ class SSLSocketDriver(SocketDriver):
         return super(SSLSocketDriver, self).want_write
 
 
+class PipelinedSocketDriver(SSLSocketDriver):
+    """\
+    Pipelines HTTP/1.1 requests: every request added with
+    :meth:`add_request` is written back to back on the one socket,
+    without waiting for responses, which are then read in the same
+    (FIFO) order. Only use this for idempotent requests, as the server
+    may close the connection with requests left unanswered (see
+    :attr:`readers`).
+    """
+    def __init__(self, socket):
+        super(PipelinedSocketDriver, self).__init__(socket,
+                                                    reader=None,
+                                                    writer=None)
+        self.writers = deque()
+        self.readers = deque()
+        self.completed = []  # readers of complete responses, in order
+
+    def add_request(self, raw_request, reader=None, writer=None):
+        "Queues up *raw_request*, returning the reader for its response."
+        if reader is None:
+            reader = P.ResponseReader(request_method=raw_request.method)
+        if writer is None:
+            writer = raw_request.get_writer()
+        self.writers.append(writer)
+        self.readers.append(reader)
+        if self.writer is None:
+            self._next_writer()
+        if self.reader is None:
+            self.reader = reader
+        return reader
+
+    def _next_writer(self):
+        writers = self.writers
+        if self.writer is not None and writers[0] is self.writer:
+            writers.popleft()
+        self.writer = writers[0] if writers else None
+        self.writer_iter = iter(self.writer) if self.writer else None
+
+    def _next_reader(self):
+        done = self.readers.popleft()
+        self.completed.append(done)
+        self.reader = self.readers[0] if self.readers else None
+        # the server may have sent the start of the next response
+        # along with the end of this one
+        leftover = done.pop_unparsed()
+        if leftover and self.reader is not None:
+            self.reader.feed(leftover)
+
+    def stop_writing(self):
+        """Drops the requests that haven't been fully written, e.g.,
+        once the server has closed its end. Their readers are left
+        in place, to fail on the end of the stream."""
+        self.writers.clear()
+        self.writer = self.writer_iter = None
+        self.write_backlog = ''
+        self.parts_backlog.clear()
+        self.file_backlog = None
+
+    @property
+    def sent_count(self):
+        "Number of queued readers whose requests have been fully written."
+        return len(self.readers) - len(self.writers)
+
+    def write(self):
+        """Writes queued requests, returning True once all of them have
+        been sent."""
+        while self.writer is not None:
+            if not super(PipelinedSocketDriver, self).write():
+                return False
+            self._next_writer()
+        return True
+
+    def read(self, headers_only=False, max_amount=None):
+        """Reads responses to the requests sent so far, returning True
+        once every queued request has its response."""
+        while self.reader is not None:
+            if self.reader.complete:
+                self._next_reader()
+                continue
+            if not self.sent_count:
+                return False  # nothing can be answered yet
+            amount = self.outbound.readinto(self.recv_buffer)
+            if amount is None:
+                raise core.eagain()
+            self.reader.feed(self.recv_view[:amount].tobytes())
+            if not amount and not self.reader.complete:
+                # unanswered requests are left in self.readers
+                raise core.EndOfStream
+        return True
+
+    def read_some(self, max_amount=None):
+        """Makes a single readinto of up to *max_amount* bytes and feeds
+        them to the responses in order, returning True once every
+        queued request has its response, as :meth:`read` does."""
+        while self.reader is not None and self.reader.complete:
+            self._next_reader()
+        if self.reader is None:
+            return True
+        if not self.sent_count:
+            return False
+        recv_view = self.recv_view
+        if max_amount is not None:
+            recv_view = recv_view[:max(max_amount, 1)]
+        amount = self.outbound.readinto(recv_view)
+        if amount is None:
+            raise core.eagain()
+        self.reader.feed(self.recv_view[:amount].tobytes())
+        if not amount and not self.reader.complete:
+            raise core.EndOfStream
+        while self.reader is not None and self.reader.complete:
+            self._next_reader()
+        return self.reader is None
+
+    @property
+    def want_read(self):
+        if self.outbound._ssl_state:
+            return self.outbound._ssl_state == ssl.SSL_ERROR_WANT_READ
+        return self.reader is not None and self.sent_count > 0
+
+    @property
+    def want_write(self):
+        if self.outbound._ssl_state:
+            return self.outbound._ssl_state == ssl.SSL_ERROR_WANT_WRITE
+        return self.writer is not None or self.has_backlog
+
+    @property
+    def inbound_headers_completed(self):
+        return self.reader is None or self.reader.headers_reader.complete
+
+
 class BufferedReaderDriver(BaseIODriver):
 
     def __init__(self, raw_request, inbound, outbound):
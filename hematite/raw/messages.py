@@ -22,6 +22,12 @@ def make_message(name, *fields):
 HaveData = make_message('HaveData', 'value')
 HaveLine = make_message('HaveLine', 'value')
 HavePeek = make_message('HavePeek', 'value')
+# a whole header block, blank line included, see Reader.feed
+HaveHeaderBlock = make_message('HaveHeaderBlock', 'value')
+# a FileBody to be sent as-is, see BaseIODriver.write_file
+HaveFile = make_message('HaveFile', 'value')
+# data that was read directly into the body's buffer, see Reader.feed_into
+HaveBuffered = make_message('HaveBuffered', 'amount')
 
 NeedData = make_message('NeedData', 'amount')
 NeedLine = make_message('NeedLine', 'none')(None)
@@ -30,3 +36,7 @@ NeedPeek = make_message('NeedPeek', 'amount')
 Empty = make_message('Empty', 'none')(None)
 Complete = make_message('Complete', 'none')(None)
 WantDisconnect = make_message('WantDisconnect', 'none')(None)
+
+# events returned by Reader.feed
+HeadersComplete = make_message('HeadersComplete', 'value')
+BodyData = make_message('BodyData', 'value')
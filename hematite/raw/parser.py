@@ -6,7 +6,7 @@ from hematite.compat import BytestringHelper, make_sentinel
 from hematite.raw import datastructures
 from hematite.raw import core
 from hematite.url import URL, _ABS_PATH_RE
-from hematite.constants import CODE_REASONS
+from hematite.constants import CODE_REASONS, get_header_name
 from hematite.raw import messages as M
 from hematite.serdes import items_header_from_bytes, _list_header_from_bytes
 
@@ -17,6 +17,11 @@ _MISSING = make_sentinel()
 MAXHEADERBYTES = core.MAXLINE * 10
 MAXCHUNK = core.MAXLINE * 20
 
+# first characters, for HeadersReader._read_block
+_LWS_START = frozenset(set(core._LWS) - set(core._CRLF))
+_TOKEN_START = frozenset([chr(i) for i in range(256)
+                          if chr(i) not in core._TOKEN_EXCLUDE])
+
 
 class HTTPParseException(core.HTTPException):
     """Raised when an error occurs while parsing an HTTP message"""
@@ -297,35 +302,214 @@ class _ProtocolElement(object):
 class Reader(_ProtocolElement):
     __metaclass__ = ABCMeta
 
+    # set by message readers, see feed()
+    headers_reader = None
+    body_reader = None
+    # True while the reader wants the first line of a header block,
+    # which feed() can then send whole, as a HaveHeaderBlock
+    at_headers = False
+
     def __init__(self, *args, **kwargs):
         super(Reader, self).__init__(*args, **kwargs)
+        self._start()
 
+    def _start(self):
         self.bytes_read = 0
+        self.at_headers = False
+        self.state = M.Empty
 
         self.reader = self._make_reader()
         self.state = next(self.reader)
 
+        self._wanted = self.state  # the last message yielded by the reader
+        self._unparsed = b''
+        self._eof = False
+
+    def reset(self):
+        """Readies the reader to read another message from the start,
+        so that it can be reused rather than replaced. Subclasses take
+        the same arguments here as their constructors."""
+        self._start()
+
     def send(self, message):
         # maybe just require reader.reader?
         return self.reader.send(message)
 
+    @property
+    def unparsed(self):
+        """Bytes passed to :meth:`feed` that haven't been consumed,
+        e.g., a partial line, or data past the end of the message."""
+        return self._unparsed
+
+    def pop_unparsed(self):
+        """Returns and clears :attr:`unparsed`, e.g., to hand the bytes
+        past the end of this message to the next message's reader."""
+        ret, self._unparsed = self._unparsed, b''
+        return ret
+
+    def feed(self, data):
+        """Feeds an arbitrarily-sized buffer of *data* to the reader,
+        returning a list of the events it was able to parse from it:
+        :data:`~hematite.raw.messages.HeadersComplete`,
+        :data:`~hematite.raw.messages.BodyData` and finally
+        :data:`~hematite.raw.messages.Complete`. Bytes which can't be
+        used yet are kept until the next call. An empty *data* signals
+        the end of the stream.
+
+        >>> reader = ResponseReader()
+        >>> reader.feed(b'HTTP/1.1 200 OK\\r\\nContent-Len')
+        []
+        >>> [e.type for e in reader.feed(b'gth: 2\\r\\n\\r\\nhi')]
+        ['headerscomplete', 'bodydata', 'complete']
+        """
+        if data:
+            self._unparsed += data
+        else:
+            self._eof = True
+        events = []
+        if self._wanted is M.Complete:
+            return events
+        buf, pos, eof = self._unparsed, 0, self._eof
+        wanted = self._wanted
+        body_reader = self.body_reader
+        headers_done = self.headers_reader is None
+        headers_done = headers_done or self.headers_reader.complete
+        while wanted is not M.Complete:
+            if wanted.type == M.NeedLine.type:
+                end = _find_headers_end(buf, pos) if self.at_headers else -1
+                if end >= 0:
+                    message = M.HaveHeaderBlock(buf[pos:end])
+                    pos = end
+                else:
+                    end = buf.find(b'\n', pos)
+                    if end < 0:
+                        if len(buf) - pos > core.MAXLINE:
+                            raise core.OverlongRead()
+                        if not eof:
+                            break
+                        if pos == len(buf):
+                            raise core.EndOfStream()
+                        end = len(buf) - 1
+                    message = M.HaveLine(buf[pos:end + 1])
+                    pos = end + 1
+            elif wanted.type == M.NeedData.type:
+                if pos == len(buf) and wanted.amount and not eof:
+                    break
+                data = buf[pos:pos + wanted.amount]
+                message = M.HaveData(data)
+                pos += len(data)
+            elif wanted.type == M.NeedPeek.type:
+                if len(buf) - pos < wanted.amount:
+                    if not eof:
+                        break
+                    raise core.EndOfStream()
+                message = M.HavePeek(buf[pos:pos + wanted.amount])
+            else:
+                raise RuntimeError('Unknown state {0!r}'.format(wanted))
+
+            body_read = body_reader.bytes_read if body_reader else 0
+            wanted = self._wanted = self.send(message)
+
+            # headers_reader is replaced after interim (1xx) responses
+            headers_reader = self.headers_reader
+            if not headers_done and headers_reader.complete:
+                headers_done = True
+                events.append(M.HeadersComplete(headers_reader.headers))
+            if body_reader is None:
+                body_reader = self.body_reader
+            elif body_reader.bytes_read > body_read:
+                # chunk framing is read with HaveData too, but doesn't
+                # count towards bytes_read
+                events.append(M.BodyData(message.value))
+        self._unparsed = buf[pos:] if pos else buf
+        if wanted is M.Complete:
+            events.append(M.Complete)
+        return events
+
+    def get_body_buffer(self):
+        """Returns a writable memoryview of the body bytes the reader
+        is waiting on, so that they can be read straight into the body
+        with ``readinto``/``recv_into``, then passed to
+        :meth:`feed_into`. Returns None when this isn't possible: while
+        headers or chunk framing are being read, if the body's size
+        isn't known, or if there are bytes left over from :meth:`feed`.
+        """
+        body_reader, wanted = self.body_reader, self._wanted
+        if self._unparsed or self._eof or wanted.type != M.NeedData.type:
+            return None
+        if not isinstance(body_reader, IdentityEncodedBodyReader):
+            return None
+        if body_reader.content_length is None or not wanted.amount:
+            return None
+        return body_reader.body.reserve(wanted.amount)
+
+    def feed_into(self, amount):
+        """Counterpart to :meth:`feed` for when *amount* bytes have been
+        read into the view returned by :meth:`get_body_buffer`. Returns
+        a list of events, same as :meth:`feed`, where the BodyData is a
+        memoryview of the body's buffer."""
+        if not amount:
+            return self.feed(b'')
+        body = self.body_reader.body
+        self._wanted = self.send(M.HaveBuffered(amount))
+        events = [M.BodyData(body.get_view(body.length - amount,
+                                           body.length))]
+        if self._wanted is M.Complete:
+            events.append(M.Complete)
+        return events
+
     @abstractmethod
     def _make_reader(self):
         """Called to create the parsing coroutine fed by :attribute:`send`"""
         pass
 
 
+def _find_headers_end(buf, pos):
+    """\
+    Returns the offset just past the blank line ending the header block
+    that starts at *pos* in *buf*, or -1 if the block isn't all there.
+    Also -1 for blocks that are empty or too big, which are left for
+    HeadersReader to handle a line at a time.
+    """
+    if buf.startswith(b'\n', pos) or buf.startswith(b'\r\n', pos):
+        return -1
+    # the block ends at the first line that's just a line ending. the
+    # search stops where a block would be too big, so that a large
+    # buffer (e.g., headers and a body in one read) isn't scanned whole.
+    limit = pos + MAXHEADERBYTES + 1
+    crlf_end = buf.find(b'\n\r\n', pos, limit)
+    end = buf.find(b'\n\n', pos, crlf_end + 2 if crlf_end >= 0 else limit)
+    if end >= 0:
+        size = 2
+    elif crlf_end >= 0:
+        end, size = crlf_end, 3
+    else:
+        return -1
+    # HeadersReader raises once the lines before the blank line reach
+    # the limit
+    if end + 1 - pos >= MAXHEADERBYTES:
+        return -1
+    return end + size
+
+
 class Writer(_ProtocolElement):
     __metaclass__ = ABCMeta
 
     def __init__(self, *args, **kwargs):
         super(Writer, self).__init__(*args, **kwargs)
+        self._start()
 
+    def _start(self):
         self.bytes_written = 0
 
         self.writer = self._make_writer()
         self.state = M.Empty
 
+    def reset(self):
+        """Readies the writer to write another message, see
+        :meth:`Reader.reset`."""
+        self._start()
+
     def __iter__(self):
         for result in self.writer:
             yield result
@@ -349,6 +533,13 @@ class HeadersReader(Reader):
             headers = datastructures.Headers()
         self.headers = headers
 
+    def reset(self, headers=None):
+        # the last message's headers are left to whoever has them
+        if headers is None:
+            headers = self.headers.__class__()
+        self.headers = headers
+        self._start()
+
     @classmethod
     def from_bytes(cls, bstr):
         instance = cls()
@@ -358,28 +549,57 @@ class HeadersReader(Reader):
             raise InvalidHeaders('Missing header termination')
         return instance
 
+    def _read_block(self, block):
+        """\
+        Parses a whole header block, blank line and all, as a series of
+        HaveLines would be, only faster.
+        """
+        self.bytes_read += len(block)
+        headers = self.headers
+        add, add_name = headers.add, headers.add_name
+        prev_key = _MISSING
+        for line in block.split(b'\n')[:-2]:
+            if line[:1] in _LWS_START:
+                if prev_key is _MISSING:
+                    raise InvalidHeaders('Cannot begin with a continuation',
+                                         line + b'\n')
+                add(prev_key, headers.poplast(prev_key) + line.rstrip())
+                continue
+            key, _, value = line.partition(':')
+            key = key.strip()
+            # the same check as TOKEN.match, which only anchors the start
+            if key[:1] not in _TOKEN_START:
+                raise InvalidHeaders('Invalid field name', key)
+            prev_key = key
+            add_name(get_header_name(key), value.strip())
+
     def _make_reader(self):
         prev_key = _MISSING
+        self.at_headers = True
         while self.bytes_read < MAXHEADERBYTES and not self.complete:
             self.state = M.NeedLine
             t, line = yield self.state
+            self.at_headers = False
+            if t == M.HaveHeaderBlock.type:
+                self._read_block(line)
+                break
             assert t == M.HaveLine.type
 
             if not line:
                 raise InvalidHeaders('Cannot find header termination; '
                                      'connection closed')
 
+            self.bytes_read += len(line)
+
             if core.LINE_END.match(line):
                 break
 
-            self.bytes_read += len(line)
-
             if self.ISCONTINUATION.match(line):
                 if prev_key is _MISSING:
                     raise InvalidHeaders('Cannot begin with a continuation',
                                          line)
                 last_value = self.headers.poplast(prev_key)
-                key, value = prev_key, last_value + line.rstrip()
+                self.headers.add(prev_key, last_value + line.rstrip())
             else:
                 key, _, value = line.partition(':')
                 key, value = key.strip(), value.strip()
@@ -387,12 +607,11 @@ class HeadersReader(Reader):
                     raise InvalidHeaders('Invalid field name', key)
 
                 prev_key = key
-
-            self.headers.add(key, value)
+                self.headers.add_name(get_header_name(key), value)
         else:
             raise InvalidHeaders('Consumed limit of {0} bytes '
                                  'without finding '
-                                 ' headers'.format(core.MAXHEADERBYTES))
+                                 ' headers'.format(MAXHEADERBYTES))
         # TODO trailers
         self.state = M.Complete
         while True:
@@ -405,6 +624,10 @@ class HeadersWriter(Writer):
         super(HeadersWriter, self).__init__(*args, **kwargs)
         self.headers = headers
 
+    def reset(self, headers):
+        self.headers = headers
+        self._start()
+
     def _make_writer(self):
         for k, v in self.headers.iteritems(multi=True,
                                            preserve_case=True):
@@ -433,6 +656,12 @@ class IdentityEncodedBodyReader(Reader):
 
         super(IdentityEncodedBodyReader, self).__init__(*args, **kwargs)
 
+    def reset(self, body, content_length=None):
+        self.body = body
+        self.content_length = content_length
+        self.bytes_remaining = None
+        self._start()
+
     def _make_reader(self):
         self.bytes_remaining = (self.DEFAULT_AMOUNT
                                 if self.content_length is None
@@ -444,9 +673,14 @@ class IdentityEncodedBodyReader(Reader):
 
         while not self.complete:
             t, read = yield M.NeedData(amount=self.bytes_remaining)
-            assert t == M.HaveData.type
-
-            amount = len(read)
+            if t == M.HaveBuffered.type:
+                # already in the body's buffer, see Reader.feed_into
+                amount = read
+                self.body.commit(amount)
+                read = None
+            else:
+                assert t == M.HaveData.type
+                amount = len(read)
 
             if not amount:
                 # Connection: close
@@ -459,7 +693,8 @@ class IdentityEncodedBodyReader(Reader):
 
             self.bytes_read += amount
 
-            self.body.data_received(read)
+            if read is not None:
+                self.body.data_received(read)
 
             if self.content_length is not None:
                 self.bytes_remaining = (self.content_length - self.bytes_read)
@@ -479,11 +714,23 @@ class IdentityEncodedBodyWriter(Writer):
         self.content_length = content_length
         self.bytes_remaining = None
 
+    def reset(self, body, content_length=None):
+        self.body = body
+        self.content_length = content_length
+        self.bytes_remaining = None
+        self._start()
+
     def _make_writer(self):
-        for data in self.body.send_data():
-            self.bytes_written += len(data)
-            self.state = M.HaveData(data)
+        if isinstance(self.body, datastructures.FileBody):
+            # left to the driver, which may be able to use sendfile
+            self.bytes_written += self.body.size
+            self.state = M.HaveFile(self.body)
             yield self.state
+        else:
+            for data in self.body.send_data():
+                self.bytes_written += len(data)
+                self.state = M.HaveData(data)
+                yield self.state
 
         # TODO: this logic should go elsewhere
         #if self.content_length is None:
@@ -501,12 +748,16 @@ class ChunkEncodedBodyReader(Reader):
     def __init__(self, body, *args, **kwargs):
         self.body = body
         super(ChunkEncodedBodyReader, self).__init__(*args, **kwargs)
-        self.reset()
+        self._reset_chunk()
 
-    def reset(self):
+    def reset(self, body):
+        self.body = body
+        self._start()
+        self._reset_chunk()
+
+    def _reset_chunk(self):
         self.chunk_length = None
         self.chunk_read = 0
-        self.chunk_partials = []
 
     def _make_reader(self):
         IS_HEX = self.IS_HEX
@@ -528,7 +779,6 @@ class ChunkEncodedBodyReader(Reader):
                 raise InvalidChunk('Requested too large a chunk',
                                    self.chunk_length)
 
-            last = ''
             while self.chunk_read < self.chunk_length:
                 self.state = M.NeedData(amount=self.chunk_length
                                         - self.chunk_read)
@@ -540,9 +790,8 @@ class ChunkEncodedBodyReader(Reader):
 
                 self.chunk_read += len(last)
                 self.bytes_read += len(last)
-                self.chunk_partials.append(last)
-
-            chunk = ''.join(self.chunk_partials)
+                # partials go straight into the body's buffer
+                self.body.data_received(last)
 
             self.state = M.NeedPeek(amount=2)
             t, peek = yield self.state
@@ -556,18 +805,18 @@ class ChunkEncodedBodyReader(Reader):
                 # lf is not actually lf, but real data
                 discard = 1
             else:
-                raise InvalidChunk('No trailing CRLF|LF', chunk)
+                raise InvalidChunk('No trailing CRLF|LF', chunk_header)
 
             self.state = M.NeedData(amount=discard)
             t, data = yield self.state
             assert t == M.HaveData.type
 
-            if not self.chunk_length and not chunk:
+            if not self.chunk_length:
                 self.body.complete(self.bytes_read)
                 self.state = M.Complete
             else:
-                self.reset()
-                self.body.chunk_received(chunk)
+                self._reset_chunk()
+                self.body.chunk_complete()
 
         while True:
             self.body.complete(self.bytes_read)
@@ -580,9 +829,14 @@ class ChunkEncodedBodyWriter(Writer):
         self.body = body
         super(ChunkEncodedBodyWriter, self).__init__(*args, **kwargs)
 
+    def reset(self, body):
+        self.body = body
+        self._start()
+
     def _make_writer(self):
         for chunk in self.body.send_chunk():
             header = '%x\r\n' % len(chunk)
+            self.bytes_written += len(chunk)
 
             for state in (M.HaveLine(header),
                           M.HaveData(chunk),
@@ -603,28 +857,44 @@ class ChunkEncodedBodyWriter(Writer):
 
 class RequestWriter(Writer):
 
-    def __init__(self, request_line, headers, body=None, *args, **kwargs):
+    def __init__(self, request_line, headers, body=None, head=None,
+                 *args, **kwargs):
         self.request_line = request_line
         self.headers = headers
         self.body = body
+        # the request line and headers, already serialized, to be
+        # written as-is in place of request_line and headers
+        self.head = head
         super(RequestWriter, self).__init__(*args, **kwargs)
 
+    def reset(self, request_line, headers, body=None, head=None):
+        self.request_line = request_line
+        self.headers = headers
+        self.body = body
+        self.head = head
+        self._start()
+
     def _make_writer(self):
-        rl = bytes(self.request_line) + '\r\n'
-        self.bytes_written += len(rl)
-        self.state = M.HaveLine(rl)
-        yield self.state
+        if self.head is not None:
+            self.bytes_written += len(self.head)
+            self.state = M.HaveData(self.head)
+            yield self.state
+        else:
+            rl = bytes(self.request_line) + '\r\n'
+            self.bytes_written += len(rl)
+            self.state = M.HaveLine(rl)
+            yield self.state
 
-        for m in iter(self.headers):
+            for m in iter(self.headers):
+                self.state = m
+                yield m
             self.bytes_written += self.headers.bytes_written
-            self.state = m
-            yield m
 
         if self.body:
             for m in iter(self.body):
-                self.bytes_written += self.body.bytes_written
                 self.state = m
                 yield m
+            self.bytes_written += self.body.bytes_written
 
         self.state = M.Complete
         yield self.state
@@ -643,6 +913,15 @@ class RequestReader(Reader):
 
         super(RequestReader, self).__init__(*args, **kwargs)
 
+    def reset(self):
+        from hematite.raw.request import RawRequest
+        self.raw_request = RawRequest()
+        self.headers_reader.reset()
+        self.body_reader = None
+        self.chunked = False
+        self.content_length = None
+        self._start()
+
     def _make_reader(self):
         LINE_END = core.LINE_END
         self.state = M.NeedLine
@@ -663,8 +942,10 @@ class RequestReader(Reader):
         rreq.request_line = RequestLine.from_bytes(line, expect_newline=True)
 
         self.state = self.headers_reader.state
+        self.at_headers = True
         while True:
             state = self.headers_reader.send((yield self.state))
+            self.at_headers = False
             if self.headers_reader.complete:
                 rreq.headers = self.headers_reader.headers
                 break
@@ -675,6 +956,7 @@ class RequestReader(Reader):
         self.content_length = req_traits.content_length
 
         # TODO: bodies
+        self.state = M.Complete
         while True:
             yield M.Complete
 
@@ -686,6 +968,12 @@ class ResponseWriter(Writer):
         self.body = body
         super(ResponseWriter, self).__init__(*args, **kwargs)
 
+    def reset(self, status_line, headers, body=None):
+        self.status_line = status_line
+        self.headers = headers
+        self.body = body
+        self._start()
+
     def _make_writer(self):
         sl = bytes(self.status_line) + '\r\n'
         self.bytes_written += len(sl)
@@ -693,18 +981,18 @@ class ResponseWriter(Writer):
         yield self.state
 
         for m in iter(self.headers):
-            self.bytes_written += self.headers.bytes_written
             self.state = m
             yield m
+        self.bytes_written += self.headers.bytes_written
 
         if not self.body:
             self.state = M.Complete
             return
 
         for m in iter(self.body):
-            self.bytes_written += self.body.bytes_written
             self.state = m
             yield m
+        self.bytes_written += self.body.bytes_written
 
         self.state = M.Complete
 
@@ -734,18 +1022,17 @@ def parse_message_traits(headers_dict):
     chunked = any([te.strip().lower().startswith('chunked')
                    for te in tencodings])
 
-    # WRONG - CAN BE MULTIPLE
-    #
     # 14.11
     # Content-Encoding  = "Content-Encoding" ":" 1#content-coding
-    content_encodings = hd.get('content-encoding', '')
-    content_encodings = [ce
-                         for ce in
-                         _list_header_from_bytes(content_encodings)]
-
-    decompression = None
-    if content_encodings and content_encodings[-1] in ('gzip', 'deflate'):
-        decompression = content_encodings[-1]
+    try:
+        content_encodings = [ce
+                             for ce_list in hd.getlist('content-encoding')
+                             for ce in _list_header_from_bytes(ce_list)]
+    except KeyError:
+        content_encodings = []
+    # decoded as far back as they're supported
+    decompression = (datastructures.get_decodable_codings(content_encodings)
+                     or None)
 
     return MessageTraits(chunked=chunked,
                          content_length=content_length,
@@ -753,47 +1040,94 @@ def parse_message_traits(headers_dict):
                          decompression=decompression)
 
 
+# 10.2.5, 10.3.5: never followed by a body
+NO_BODY_STATUS_CODES = frozenset([204, 304])
+
+
 class ResponseReader(Reader):
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, preallocate_body=True, request_method=None,
+                 *args, **kwargs):
         from hematite.raw.response import RawResponse  # TODO TODO
         self.raw_response = RawResponse()
+        # streamed bodies shouldn't be allocated up front, or decoded
+        # before they're read
+        self.preallocate_body = preallocate_body
+        # responses to HEAD have headers describing a body that isn't sent
+        self.request_method = request_method
+        self.no_body = False
 
         self.headers_reader = HeadersReader()
         self.body_reader = None
+        # body readers from earlier responses, see reset
+        self._identity_reader = self._chunked_reader = None
 
         self.chunked = False
         self.content_length = None
 
         super(ResponseReader, self).__init__(*args, **kwargs)
 
+    def reset(self, preallocate_body=True, request_method=None):
+        from hematite.raw.response import RawResponse
+        self.raw_response = RawResponse()
+        self.preallocate_body = preallocate_body
+        self.request_method = request_method
+        self.no_body = False
+        self.headers_reader.reset()
+        self.body_reader = None
+        self.chunked = False
+        self.content_length = None
+        self._start()
+
+    # bytes_read counts the status line(s) and headers
+    @property
+    def body_bytes_read(self):
+        "Body bytes read so far, not counting chunk framing."
+        body_reader = self.body_reader
+        return body_reader.bytes_read if body_reader is not None else 0
+
     def _make_reader(self):
         LINE_END = core.LINE_END
-        self.state = M.NeedLine
         rresp = self.raw_response
 
-        # 4.1: In the interest of robustness, servers SHOULD
-        # ignore any empty line(s) received where a
-        # Request-Line is expected. In other words, if the
-        # server is reading the protocol stream at the
-        # beginning of a message and receives a CRLF first, it
-        # should ignore the CRLF.
-        #
-        # Assume the same for status lines
-        line = '\r\n'
-        while LINE_END.match(line):
-            t, line = yield self.state
-            assert t == M.HaveLine.type
-
-        rresp.status_line = StatusLine.from_bytes(line, expect_newline=True)
-
-        self.state = self.headers_reader.state
         while True:
-            state = self.headers_reader.send((yield self.state))
-            if self.headers_reader.complete:
-                rresp.headers = self.headers_reader.headers
-                break
-            self.state = state
+            self.state = M.NeedLine
+            # 4.1: In the interest of robustness, servers SHOULD
+            # ignore any empty line(s) received where a
+            # Request-Line is expected. In other words, if the
+            # server is reading the protocol stream at the
+            # beginning of a message and receives a CRLF first, it
+            # should ignore the CRLF.
+            #
+            # Assume the same for status lines
+            line = '\r\n'
+            while LINE_END.match(line):
+                t, line = yield self.state
+                assert t == M.HaveLine.type
+                self.bytes_read += len(line)
+
+            rresp.status_line = StatusLine.from_bytes(line,
+                                                      expect_newline=True)
+
+            self.state = self.headers_reader.state
+            self.at_headers = True
+            while True:
+                state = self.headers_reader.send((yield self.state))
+                self.at_headers = False
+                if self.headers_reader.complete:
+                    rresp.headers = self.headers_reader.headers
+                    break
+                self.state = state
+            self.bytes_read += self.headers_reader.bytes_read
+
+            # 10.1: interim responses (e.g., 100 Continue) come before
+            # the final response, and have no body. 101 Switching
+            # Protocols is final, as far as HTTP is concerned.
+            status_code = rresp.status_code
+            if 100 <= status_code < 200 and status_code != 101:
+                self.headers_reader = HeadersReader()
+                continue
+            break
 
         resp_traits = parse_message_traits(rresp.headers)
         rresp.chunked = resp_traits.chunked
@@ -802,17 +1136,44 @@ class ResponseReader(Reader):
         decomp = rresp.decompression = resp_traits.decompression
         # TODO mutual exclusion
 
-        if not rresp.chunked:
-            rresp.body = datastructures.Body(decompression=decomp)
+        # 4.3: no body, regardless of what the headers say
+        self.no_body = (self.request_method == 'HEAD'
+                        or status_code in NO_BODY_STATUS_CODES
+                        or status_code < 200)
+        if self.no_body:
+            rresp.body = datastructures.Body()
+            rresp.body.complete(0)
+            self.state = M.Complete
+        elif not rresp.chunked:
+            size_hint = None
+            if self.preallocate_body:
+                size_hint = rresp.content_length
+            rresp.body = datastructures.Body(
+                decompression=decomp, size_hint=size_hint,
+                defer_decoding=not self.preallocate_body)
             content_length = rresp.content_length
-            b_reader = IdentityEncodedBodyReader(rresp.body,
-                                                 content_length=content_length)
+            b_reader = self._identity_reader
+            if b_reader is None:
+                b_reader = IdentityEncodedBodyReader(
+                    rresp.body, content_length=content_length)
+                self._identity_reader = b_reader
+            else:
+                b_reader.reset(rresp.body, content_length=content_length)
             self.body_reader = b_reader
         else:
-            rresp.body = datastructures.ChunkedBody(decompression=decomp)
-            self.body_reader = ChunkEncodedBodyReader(rresp.body)
+            rresp.body = datastructures.ChunkedBody(
+                decompression=decomp,
+                defer_decoding=not self.preallocate_body)
+            b_reader = self._chunked_reader
+            if b_reader is None:
+                b_reader = ChunkEncodedBodyReader(rresp.body)
+                self._chunked_reader = b_reader
+            else:
+                b_reader.reset(rresp.body)
+            self.body_reader = b_reader
 
-        self.state = self.body_reader.state
+        if self.body_reader is not None:
+            self.state = self.body_reader.state
         while not self.complete:
             self.state = self.body_reader.send((yield self.state))
 
@@ -830,5 +1191,12 @@ def _flush_writer_to_bytes(writer):
     Takes an instance of a Writer subclass and flushes what's left in
     it to a bytestring, mostly a testing convenience.
     """
-    return b''.join(part for _state, part in writer.writer if
-                    _state != M.Complete.type)
+    parts = []
+    for _state, part in writer.writer:
+        if _state == M.Complete.type:
+            continue
+        elif _state == M.HaveFile.type:
+            parts.extend(part.send_data())
+        else:
+            parts.append(part)
+    return b''.join(parts)
@@ -2,7 +2,6 @@
 
 from io import BytesIO
 from hematite.raw import messages as M
-from hematite.raw.messages import Complete
 from hematite.raw.datastructures import Headers, ChunkedBody, Body
 from hematite.raw.parser import (RequestLine,
                                  RequestWriter,
@@ -10,7 +9,8 @@ from hematite.raw.parser import (RequestLine,
                                  HeadersWriter,
                                  ChunkEncodedBodyWriter,
                                  IdentityEncodedBodyWriter,
-                                 parse_message_traits)
+                                 parse_message_traits,
+                                 _flush_writer_to_bytes)
 
 
 class RawRequest(object):
@@ -31,11 +31,19 @@ class RawRequest(object):
         self.host_url = kwargs.pop('host_url', url)
         self.headers = headers or Headers()
         self.body = body  # TODO: bodies
+        # the serialized request line and headers, if prepared ahead of
+        # time (see hematite.request.RequestTemplate), else None
+        self.head = kwargs.pop('head', None)
 
-        traits = parse_message_traits(self.headers)
-        self.chunked = kwargs.pop('chunked', traits.chunked)
-        self.content_length = kwargs.pop('content_length',
-                                         traits.content_length)
+        if 'chunked' in kwargs and 'content_length' in kwargs:
+            # already known, e.g., to a RequestTemplate
+            self.chunked = kwargs.pop('chunked')
+            self.content_length = kwargs.pop('content_length')
+        else:
+            traits = parse_message_traits(self.headers)
+            self.chunked = kwargs.pop('chunked', traits.chunked)
+            self.content_length = kwargs.pop('content_length',
+                                             traits.content_length)
         if kwargs:
             raise TypeError('got unexpected kwargs: %r' % kwargs.keys())
 
@@ -54,23 +62,41 @@ class RawRequest(object):
         except:
             raise TypeError('expected RequestLine or 3-tuple, not %r' % val)
 
-    def get_writer(self):
+    def get_writer(self, reuse=None):
+        """Returns a writer for the request. *reuse*, a writer from an
+        earlier request that's done being written, is reset and
+        returned, rather than allocating new writers."""
+        prev_body = reuse.body if reuse is not None else None
         if isinstance(self.body, ChunkedBody):
-            body = ChunkEncodedBodyWriter(self.body)
+            if isinstance(prev_body, ChunkEncodedBodyWriter):
+                body = prev_body
+                body.reset(self.body)
+            else:
+                body = ChunkEncodedBodyWriter(self.body)
         elif isinstance(self.body, Body):
-            body = IdentityEncodedBodyWriter(self.body,
-                                             self.content_length)
+            if isinstance(prev_body, IdentityEncodedBodyWriter):
+                body = prev_body
+                body.reset(self.body, self.content_length)
+            else:
+                body = IdentityEncodedBodyWriter(self.body,
+                                                 self.content_length)
         else:
             body = None
 
+        if reuse is not None:
+            reuse.headers.reset(self.headers)
+            reuse.reset(request_line=self.request_line,
+                        headers=reuse.headers,
+                        body=body,
+                        head=self.head)
+            return reuse
         return RequestWriter(request_line=self.request_line,
                              headers=HeadersWriter(self.headers),
-                             body=body)  # TODO: bodies
+                             body=body,
+                             head=self.head)  # TODO: bodies
 
     def to_bytes(self):
-        writer = self.get_writer()
-        return b''.join(part for _state, part in writer.writer if
-                        _state != Complete.type)
+        return _flush_writer_to_bytes(self.get_writer())
 
     @classmethod
     def from_bytes(cls, bytestr):
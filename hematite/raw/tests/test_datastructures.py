@@ -1,8 +1,13 @@
+import zlib
+
+import pytest
+
 from hematite.compat.dictutils import OMD
 from hematite.raw import datastructures as D
 
 
-def test_Headers():
+@pytest.mark.parametrize('H', [D.Headers, D.CompactHeaders])
+def test_Headers(H):
     """Headers should be case insensitive to queries but also preserve
     their content's original case"""
 
@@ -43,6 +48,11 @@ def test_Headers():
         assert dup_upper_a_headers.popall('a') == [1, 3]
         assert dup_lower_a_headers.popall('a') == [1, 3]
 
+        dup_upper_a_headers = upper_a_headers.copy()
+        del dup_upper_a_headers['A']
+        assert 'a' not in dup_upper_a_headers
+        assert dup_upper_a_headers.items(multi=True) == [('b', 2)]
+
         dup_upper_a_headers = upper_a_headers.copy()
         dup_lower_a_headers = lower_a_headers.copy()
 
@@ -78,11 +88,11 @@ def test_Headers():
         dup_upper_a_headers.update(dup_upper_a_headers)
         dup_lower_a_headers.update(dup_lower_a_headers)
 
-        dup_upper_a_headers.update(D.Headers([('c', 4)]))
+        dup_upper_a_headers.update(H([('c', 4)]))
         expected = upper_a + [('c', 4)]
         assert dup_upper_a_headers.items(multi=True) == expected
 
-        dup_lower_a_headers.update(D.Headers([('C', 4)]))
+        dup_lower_a_headers.update(H([('C', 4)]))
         expected = lower_a + [('C', 4)]
         assert dup_lower_a_headers.items(multi=True) == expected
 
@@ -95,22 +105,23 @@ def test_Headers():
         assert dup_upper_a_headers.items() == []
         assert dup_lower_a_headers.items() == []
 
-    upper_a_headers = D.Headers()
+    upper_a_headers = H()
     for k, v in upper_a:
         upper_a_headers.add(k, v)
 
-    lower_a_headers = D.Headers()
+    lower_a_headers = H()
     for k, v in lower_a:
         lower_a_headers.add(k, v)
 
     _test_assertions(upper_a_headers, lower_a_headers)
 
-    _test_assertions(D.Headers(upper_a), D.Headers(lower_a))
+    _test_assertions(H(upper_a), H(lower_a))
 
 
-def test_Headers_extend_setdefault():
+@pytest.mark.parametrize('cls', [D.Headers, D.CompactHeaders])
+def test_Headers_extend_setdefault(cls):
     def H():
-        return D.Headers([('a', 1)])
+        return cls([('a', 1)])
 
     headers = H()
     headers.update(D.Headers([('A', 2)]))
@@ -134,3 +145,179 @@ def test_Headers_extend_setdefault():
     headers = H()
     headers.update(b=2)
     assert headers.items() == [('a', 1), ('b', 2)]
+
+
+def test_CompactHeaders():
+    items = [('Host', 'example.com'), ('Accept', 'a'), ('X-A', '1'),
+             ('accept', 'b'), ('ACCEPT', 'c')]
+    headers = D.CompactHeaders(items)
+    assert headers.items(multi=True) == items
+    assert list(headers.itercaseditems())[1] == ('Accept', 'accept', 'a')
+    # the index is only built once it's needed, and kept up to date
+    assert headers._index is None
+
+    assert headers == D.Headers(items)
+    assert list(headers) == ['host', 'accept', 'x-a']
+    assert len(headers) == 3
+    assert headers['accept'] == 'c'
+    headers.add('Accept', 'd')
+    headers.add('Via', 'e')
+    assert headers.getlist('ACCEPT') == ['a', 'b', 'c', 'd']
+    assert headers.poplast('via') == 'e'
+    assert headers.poplast('accept') == 'd'
+    assert headers.poplast('via', None) is None
+
+    headers.replace('Host', 'example.org')
+    assert headers.items(multi=True)[0] == ('Host', 'example.org')
+
+    del headers['accept']
+    assert headers.items(multi=True) == [('Host', 'example.org'),
+                                         ('X-A', '1')]
+    assert headers.pop('x-a') == '1'
+    assert headers.pop('x-a', None) is None
+    with pytest.raises(KeyError):
+        headers.getlist('x-a')
+    with pytest.raises(KeyError):
+        headers.popall('x-a')
+    assert not hasattr(headers, '__dict__')
+
+
+def test_Body_buffer():
+    body = D.Body(size_hint=10)
+    assert len(body.buffer) == 10
+    body.data_received('hello')
+    view = body.reserve(5)
+    view[:] = 'world'
+    del view
+    body.commit(5)
+    assert body.reserve(1) is None  # no room left
+    assert body.data is None
+    body.complete(10)
+    assert body.view.tobytes() == 'helloworld'
+    assert body.data == 'helloworld'
+
+    body = D.Body(size_hint=10)  # server sent less than it declared
+    body.data_received('short')
+    body.complete(5)
+    assert len(body.buffer) == 5
+    assert body.data == 'short'
+
+    body = D.Body(size_hint=10)  # a view is out as the body completes
+    body.data_received('abc')
+    view = body.get_view()
+    body.complete(3)
+    assert view.tobytes() == body.data == 'abc'
+    assert body.view.tobytes() == 'abc'
+
+
+def test_ChunkedBody_buffer():
+    body = D.ChunkedBody()
+    body.data_received('hel')
+    body.data_received('lo')
+    body.chunk_complete()
+    body.chunk_received(' world')
+    body.complete(11)
+    assert body.chunk_count == 2
+    assert body.data == 'hello world'
+    assert repr(body) == '<ChunkedBody 2 chunks, 11 total bytes, complete>'
+
+
+def test_ChunkedBody_buffer_views():
+    body = D.ChunkedBody()
+    body.chunk_received('hello')
+    view = body.get_view()
+    for _ in range(100):  # outgrows the buffer the view is of
+        body.chunk_received(' world')
+    later_view = body.get_view(0, 11)
+    body.complete(body.length)
+    assert view.tobytes() == 'hello'
+    assert later_view.tobytes() == 'hello world'
+    assert body.data == 'hello' + ' world' * 100
+    assert body.view.tobytes() == body.data
+
+
+def test_Body_streaming():
+    data = ''.join([chr(i % 256) for i in range(2 ** 20)])
+    body = D.Body()
+    body.data_received(data)
+    body.start_streaming()
+    body.data_received('tail')
+    body.complete(len(data) + 4)
+    first = body.pending[0]
+    parts = [body.read_pending(4096) for _ in range(10)]
+    # read a bit at a time, not re-sliced down to what's left
+    assert body.pending[0] is first
+    while body.pending_size:
+        parts.append(body.read_pending(5000))
+    assert ''.join(parts) == data + 'tail'
+    assert set([len(p) for p in parts[:-1]]) == set([4096, 5000])
+    assert body.read_pending(10) == ''
+    assert body.data is None
+
+def _compress(data, wbits):
+    compressor = zlib.compressobj(9, zlib.DEFLATED, wbits)
+    return compressor.compress(data) + compressor.flush()
+
+
+def test_ContentDecoder_bounded():
+    data = 'x' * 2 ** 22
+    compressed = _compress(data, 16 + zlib.MAX_WBITS)
+    assert len(compressed) < 2 ** 14
+
+    decoder = D.ContentDecoder('gzip', max_output=2 ** 12)
+    pieces = list(decoder.decode(compressed[:100]))
+    pieces.extend(decoder.decode(compressed[100:]))
+    pieces.extend(decoder.flush())
+    assert max([len(p) for p in pieces]) == 2 ** 12
+    assert ''.join(pieces) == data
+
+    decoder = D.ContentDecoder('gzip')
+    decoder.feed(compressed)
+    assert decoder.read(10) == 'x' * 10  # decoded as far as it's read
+    assert len(decoder.read()) == D.MAX_DECODE_SIZE
+
+
+def test_ContentDecoder_stacked():
+    data = 'stacked ' * 1000
+    # Content-Encoding: deflate, gzip, i.e., gzipped last
+    compressed = _compress(_compress(data, zlib.MAX_WBITS),
+                           16 + zlib.MAX_WBITS)
+    decoder = D.ContentDecoder(('deflate', 'gzip'), max_output=100)
+    assert repr(decoder) == '<ContentDecoder deflate, gzip>'
+    pieces = []
+    for i in range(0, len(compressed), 7):
+        pieces.extend(decoder.decode(compressed[i:i + 7]))
+    pieces.extend(decoder.flush())
+    assert max([len(p) for p in pieces]) <= 100
+    assert ''.join(pieces) == data
+
+    body = D.Body(decompression=('deflate', 'gzip'))
+    body.data_received(compressed)
+    body.complete(len(compressed))
+    assert body.data == data
+
+
+def test_Body_streaming_decoded():
+    data = 'x' * 2 ** 24
+    compressed = _compress(data, 16 + zlib.MAX_WBITS)
+    high_water = 4096
+
+    body = D.Body(decompression='gzip', defer_decoding=True)
+    body.data_received(compressed)
+    body.complete(len(compressed))
+    assert body.length == 0  # nothing decoded until it's read
+    body.start_streaming()
+    parts, pending = [], []
+    while True:
+        body.decode_received(high_water - body.pending_size)
+        pending.append(body.pending_size)
+        if not body.pending_size:
+            break
+        parts.append(body.read_pending(1000))
+    assert max(pending) <= high_water
+    assert ''.join(parts) == data
+
+    body = D.Body(decompression='gzip', defer_decoding=True)
+    body.data_received(compressed)
+    body.complete(len(compressed))
+    assert body.data == data  # decoded whole once it's needed
@@ -0,0 +1,160 @@
+import io
+import socket
+
+import pytest
+
+from hematite.raw import core
+from hematite.raw import drivers as D
+from hematite.raw.datastructures import FileBody
+from hematite.raw.parser import ResponseReader
+from hematite.raw.request import RawRequest
+from hematite.request import Request
+
+
+def _drain(sock, amount):
+    received = []
+    while amount > 0:
+        data = sock.recv(min(amount, 65536))
+        received.append(data)
+        amount -= len(data)
+    return ''.join(received)
+
+
+@pytest.mark.parametrize('use_sendfile', [True, False])
+def test_write_file_backlog(use_sendfile, tmpdir):
+    if use_sendfile and not hasattr(D.os, 'sendfile'):
+        pytest.skip('no os.sendfile')
+    content = ''.join([chr(i % 256) for i in range(3 * 2 ** 20)])
+    path = tmpdir.join('upload')
+    path.write(content, mode='wb')
+
+    client_sock, server_sock = socket.socketpair()
+    client_sock.setblocking(0)
+    driver = D.SocketDriver(client_sock, reader=ResponseReader(),
+                            writer=RawRequest().get_writer())
+    if not use_sendfile:
+        driver.sendfile = None
+
+    with open(str(path), 'rb') as f:
+        f.seek(10)  # bodies start from the current position
+        body = FileBody(f)
+        assert body.size == len(content) - 10
+        received = []
+        try:
+            driver.write_file(body)
+        except io.BlockingIOError:
+            pass
+        while driver.file_backlog:
+            received.append(server_sock.recv(2 ** 20))
+            try:
+                driver.write()
+            except io.BlockingIOError:
+                pass
+        received.append(_drain(server_sock,
+                               body.size - sum(map(len, received))))
+    assert ''.join(received) == content[10:]
+
+
+def test_write_file_after_blocked_head(tmpdir):
+    content = ''.join([chr(i % 256) for i in range(2 ** 16)])
+    path = tmpdir.join('upload')
+    path.write(content, mode='wb')
+    client_sock, server_sock = socket.socketpair()
+    client_sock.setblocking(0)
+    server_sock.settimeout(5.0)
+    filler = 0  # fills the send buffer, so that the head can't go out
+    try:
+        while True:
+            filler += client_sock.send('x' * 2 ** 16)
+    except socket.error:
+        pass
+
+    with open(str(path), 'rb') as f:
+        rreq = Request('POST', 'http://example.com/', body=f).to_raw_request()
+        driver = D.SocketDriver(client_sock, reader=ResponseReader(),
+                                writer=rreq.get_writer())
+        with pytest.raises(io.BlockingIOError):
+            driver.write()
+        assert driver.file_backlog is not None
+        data, done = '', False
+        while not done:
+            data += server_sock.recv(2 ** 20)
+            try:
+                done = driver.write()
+            except io.BlockingIOError:
+                pass
+        while not data.endswith(content):
+            data += server_sock.recv(2 ** 20)
+    head, _, body = data[filler:].partition('\r\n\r\n')
+    assert head.startswith('POST / HTTP/1.1\r\n')
+    assert body == content
+
+
+def test_write_file_short(tmpdir):
+    path = tmpdir.join('upload')
+    path.write('short', mode='wb')
+    client_sock, server_sock = socket.socketpair()
+    driver = D.SocketDriver(client_sock, reader=ResponseReader(),
+                            writer=RawRequest().get_writer())
+    with open(str(path), 'rb') as f:
+        with pytest.raises(core.IncompleteWrite):
+            driver.write_file(FileBody(f, size=10))
+
+
+def test_write_data_backlog():
+    client_sock, server_sock = socket.socketpair()
+    client_sock.setblocking(0)
+    driver = D.SocketDriver(client_sock, reader=ResponseReader(),
+                            writer=RawRequest().get_writer())
+    data = 'x' * (4 * 2 ** 20)
+    with pytest.raises(io.BlockingIOError):
+        driver.write_data(data)
+    assert isinstance(driver.write_backlog, memoryview)
+    received = [server_sock.recv(2 ** 20)]
+    while driver.write_backlog:
+        try:
+            driver.write_data(driver.write_backlog)
+        except io.BlockingIOError:
+            received.append(server_sock.recv(2 ** 20))
+    received.append(_drain(server_sock, len(data) - sum(map(len, received))))
+    assert ''.join(received) == data
+
+
+def test_write_coalesces_head():
+    client_sock, server_sock = socket.socketpair()
+    req = RawRequest.from_bytes('GET / HTTP/1.1\r\n'
+                                'Host: example.com\r\n'
+                                'Accept: */*\r\n'
+                                '\r\n')
+    driver = D.SocketDriver(client_sock, reader=ResponseReader(),
+                            writer=req.get_writer())
+    sends = []
+    orig_write_data = driver.write_data
+
+    def write_data(data):
+        sends.append(bytes(data))
+        return orig_write_data(data)
+
+    driver.sendmsg = None
+    driver.write_data = write_data
+    assert driver.write()
+    assert len(sends) == 1
+    assert _drain(server_sock, len(sends[0])) == req.to_bytes()
+
+
+def test_pipelined_read_some():
+    client_sock, server_sock = socket.socketpair()
+    # the SSL driver wants a socket.socket, not a _socket.socket
+    driver = D.PipelinedSocketDriver(socket.socket(_sock=client_sock))
+    readers = [driver.add_request(RawRequest.from_bytes(
+        'GET /%s HTTP/1.1\r\nHost: example.com\r\n\r\n' % i))
+        for i in range(2)]
+    assert driver.write()
+    server_sock.sendall('HTTP/1.1 200 OK\r\nContent-Length: 5\r\n\r\nfirst'
+                        'HTTP/1.1 200 OK\r\nContent-Length: 6\r\n\r\nsecond')
+    reads = 1
+    while not driver.read_some(max_amount=7):
+        reads += 1
+    assert reads > 2
+    assert [r.raw_response.body.data for r in readers] == ['first', 'second']
+    assert driver.completed == readers
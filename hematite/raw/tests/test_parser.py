@@ -1,5 +1,7 @@
 import pytest
 
+from hematite import constants
+from hematite.constants import get_header_name
 from hematite.url import URL
 from hematite.raw import parser as P
 from hematite.raw import datastructures as D
@@ -282,6 +284,90 @@ def test_HeadersReader():
     assert reader.headers == _HEADER_PARSED
 
 
+def _read_headers_by_line(block):
+    reader = P.HeadersReader()
+    try:
+        # split as feed() does, on \n alone
+        for line in block.split('\n')[:-1]:
+            reader.send(M.HaveLine(line + '\n'))
+    except P.InvalidHeaders as e:
+        return e.args
+    return reader.headers.items(multi=True), reader.bytes_read
+
+
+def _read_headers_by_block(block):
+    reader = P.HeadersReader()
+    try:
+        reader.feed(block + 'leftover')
+    except P.InvalidHeaders as e:
+        return e.args
+    assert reader.complete
+    assert reader.unparsed == 'leftover'
+    return reader.headers.items(multi=True), reader.bytes_read
+
+
+@pytest.mark.parametrize('block', [
+    ''.join(_HEADER_LINES) + '\r\n',
+    'Host: example.com\n\n',
+    'A:b\r\nA:  c \r\nb: d\r\n\r\n',
+    'Folded: one\r\n two\r\n\tthree\r\nNext: x\r\n\r\n',
+    'Mixed: endings\nX: y\r\n\n',
+    'Odd: \r\r\n\r\n',
+    'No-Colon\r\n\r\n',
+    'Spaced Name: ok\r\n\r\n',
+    ' leading: continuation\r\n\r\n',
+    ': no name\r\n\r\n',
+    '(bad): name\r\n\r\n',
+    'A: b\r\n\x01: ctl\r\n\r\n'])
+def test_HeadersReader_block(block):
+    """feed() parses a complete header block in one go, with the same
+    results and errors as reading it a line at a time."""
+    assert _read_headers_by_block(block) == _read_headers_by_line(block)
+
+
+def test_HeadersReader_interned_names(monkeypatch):
+    block = 'Content-Type: a\r\nX-Interned: b\r\n\r\n'
+    first, second = P.HeadersReader(), P.HeadersReader()
+    first.feed(block)
+    second.feed(block)
+    for (orig1, lower1, _), (orig2, lower2, _) in zip(
+            first.headers.itercaseditems(), second.headers.itercaseditems()):
+        assert orig1 is orig2
+        assert lower1 is lower2
+    name = get_header_name('CONTENT-TYPE')
+    assert name.lower is get_header_name('Content-Type').lower
+    assert name.canonical == 'Content-Type'
+    assert get_header_name('X-Interned').canonical is None
+
+    # past the limit, names are looked up but not kept
+    monkeypatch.setattr(constants, 'MAX_HEADER_CASE_ENTRIES',
+                        len(constants._HEADER_NAMES))
+    name = get_header_name('X-Not-Kept')
+    assert name == ('X-Not-Kept', 'x-not-kept', None)
+    assert get_header_name('X-Not-Kept') is not name
+
+
+def test_ResponseReader_header_block():
+    reader = P.ResponseReader()
+    reader.feed('HTTP/1.1 200 OK\r\nContent-Le')
+    assert reader.at_headers
+    events = reader.feed('ngth: 2\r\nA: b\r\n\r\nhi')
+    assert not reader.at_headers
+    assert [e.type for e in events] == ['headerscomplete', 'bodydata',
+                                        'complete']
+    assert reader.raw_response.headers.items(multi=True) == [
+        ('Content-Length', '2'), ('A', 'b')]
+
+    reader = P.ResponseReader()
+    events = reader.feed('HTTP/1.1 100 Continue\r\nA: b\r\n\r\n'
+                         'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nhi')
+    assert events[-1] is M.Complete
+    assert reader.raw_response.headers.items() == [('Content-Length', '2')]
+    assert reader.bytes_read == len('HTTP/1.1 100 Continue\r\nA: b\r\n\r\n'
+                                    'HTTP/1.1 200 OK\r\n'
+                                    'Content-Length: 2\r\n\r\n')
+
+
 def test_HeadersWriter():
     writer = P.HeadersWriter(headers=_HEADER_PARSED)
     repr(writer)
@@ -297,3 +383,170 @@ def test_HeadersWriter():
         assert actual == expected
 
     assert writer.complete
+
+
+_CHUNKED_RESPONSE = ('HTTP/1.1 200 OK\r\n'
+                     'Transfer-Encoding: chunked\r\n'
+                     '\r\n'
+                     '5\r\nhello\r\n'
+                     '6\r\n world\r\n'
+                     '0\r\n\r\n')
+
+
+@pytest.mark.parametrize('size', [1, 3, 7, len(_CHUNKED_RESPONSE)])
+def test_ResponseReader_feed(size):
+    reader = P.ResponseReader()
+    events = []
+    for i in range(0, len(_CHUNKED_RESPONSE), size):
+        events.extend(reader.feed(_CHUNKED_RESPONSE[i:i + size]))
+
+    types = [e.type for e in events]
+    assert types[0] == M.HeadersComplete.type
+    assert types[-1] == M.Complete.type
+    assert types.count(M.Complete.type) == 1
+    assert ''.join([e.value for e in events
+                    if e.type == M.BodyData.type]) == 'hello world'
+    assert reader.complete
+    assert reader.raw_response.body.data == 'hello world'
+    assert reader.unparsed == ''
+
+
+def test_ResponseReader_feed_eof():
+    reader = P.ResponseReader()
+    events = reader.feed('HTTP/1.0 200 OK\r\n\r\nuntil close')
+    assert [e.type for e in events] == [M.HeadersComplete.type,
+                                        M.BodyData.type]
+    assert reader.feed('') == [M.Complete]
+    assert reader.raw_response.body.data == 'until close'
+
+    reader = P.ResponseReader()
+    reader.feed('HTTP/1.1 200 OK\r\nContent-Length: 10\r\n\r\nshort')
+    with pytest.raises(P.IncompleteBody):
+        reader.feed('')
+
+    reader = P.ResponseReader()
+    reader.feed('HTTP/1.1 200 OK\r\n')
+    with pytest.raises(P.core.EndOfStream):
+        reader.feed('')
+
+
+def test_ResponseReader_feed_keeps_leftovers():
+    reader = P.ResponseReader()
+    reader.feed('HTTP/1.1 204 No Content\r\nContent-Length: 0\r\n\r\n'
+                'HTTP/1.1 200 OK\r\n')
+    assert reader.complete
+    assert reader.unparsed == 'HTTP/1.1 200 OK\r\n'
+    assert reader.feed('more') == []
+
+
+def test_RequestReader_feed():
+    reader = P.RequestReader()
+    assert reader.feed('GET / HTTP/1.1\r\nHost: exam') == []
+    events = reader.feed('ple.com\r\n\r\n')
+    assert [e.type for e in events] == [M.HeadersComplete.type,
+                                        M.Complete.type]
+    assert events[0].value['Host'] == 'example.com'
+    assert reader.raw_request.request_line.method == 'GET'
+
+
+def test_ResponseReader_feed_into():
+    reader = P.ResponseReader()
+    assert reader.get_body_buffer() is None
+    reader.feed('HTTP/1.1 200 OK\r\nContent-Length: 11\r\n\r\n')
+    body_buffer = reader.get_body_buffer()
+    assert len(body_buffer) == 11
+    body_buffer[:5] = 'hello'
+    del body_buffer
+    events = reader.feed_into(5)
+    assert [e.value.tobytes() for e in events] == ['hello']
+
+    body_buffer = reader.get_body_buffer()
+    assert len(body_buffer) == 6
+    body_buffer[:] = ' world'
+    del body_buffer
+    events = reader.feed_into(6)
+    assert events[-1] is M.Complete
+    assert reader.raw_response.body.data == 'hello world'
+
+
+def test_ResponseReader_reset():
+    reader = P.ResponseReader()
+    reader.feed(_CHUNKED_RESPONSE)
+    first = reader.raw_response
+    body_reader = reader.body_reader
+
+    for _ in range(2):
+        reader.reset()
+        assert not reader.complete and reader.bytes_read == 0
+        reader.feed(_CHUNKED_RESPONSE)
+        assert reader.complete
+        assert reader.body_reader is body_reader
+        assert reader.raw_response is not first
+        assert reader.raw_response.body.data == 'hello world'
+    # the first response is left as it was
+    assert first.body.data == 'hello world'
+    assert first.headers['Transfer-Encoding'] == 'chunked'
+
+    reader.reset(request_method='HEAD')
+    reader.feed('HTTP/1.1 200 OK\r\nContent-Length: 5\r\n\r\n')
+    assert reader.complete and reader.no_body
+    reader.reset()
+    reader.feed('HTTP/1.1 200 OK\r\nContent-Length: 5\r\n\r\nhello')
+    assert reader.raw_response.body.data == 'hello'
+    assert not reader.no_body
+
+
+def test_RequestWriter_reuse():
+    from hematite.raw.request import RawRequest
+    first = RawRequest('POST', URL('/a'), D.Headers([('Host', 'a.com')]),
+                       body=D.Body('abc'))
+    second = RawRequest('PUT', URL('/b'), D.Headers([('Host', 'b.com')]),
+                        body=D.Body('defgh'))
+    writer = first.get_writer()
+    assert P._flush_writer_to_bytes(writer) == first.to_bytes()
+    body_writer = writer.body
+
+    reused = second.get_writer(reuse=writer)
+    assert reused is writer and reused.body is body_writer
+    assert P._flush_writer_to_bytes(reused) == second.to_bytes()
+    assert reused.complete
+
+
+def test_ResponseReader_no_body():
+    reader = P.ResponseReader(request_method='HEAD')
+    events = reader.feed('HTTP/1.1 200 OK\r\nContent-Length: 10\r\n\r\n')
+    assert events[-1] is M.Complete
+    assert reader.no_body
+    assert reader.raw_response.body.data == ''
+
+    for status in ('204 No Content', '304 Not Modified'):
+        reader = P.ResponseReader()
+        reader.feed('HTTP/1.1 %s\r\n\r\nHTTP/1.1' % status)
+        assert reader.complete
+        assert reader.unparsed == 'HTTP/1.1'
+
+
+@pytest.mark.parametrize('encodings,expected', [
+    ([], None),
+    (['gzip'], ('gzip',)),
+    (['identity'], None),
+    (['deflate, gzip'], ('deflate', 'gzip')),
+    (['deflate', 'GZIP'], ('deflate', 'gzip')),
+    (['compress, gzip'], ('gzip',)),
+    (['gzip, x-unknown'], None)])
+def test_parse_message_traits_decompression(encodings, expected):
+    headers = D.Headers([('Content-Encoding', ce) for ce in encodings])
+    assert P.parse_message_traits(headers).decompression == expected
+
+
+def test_ResponseReader_interim():
+    reader = P.ResponseReader()
+    events = reader.feed('HTTP/1.1 100 Continue\r\n\r\n'
+                         'HTTP/1.1 102 Processing\r\nX-Interim: yes\r\n\r\n'
+                         'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok')
+    assert [e.type for e in events] == [M.HeadersComplete.type,
+                                        M.BodyData.type,
+                                        M.Complete.type]
+    assert reader.raw_response.status_code == 200
+    assert 'X-Interim' not in reader.raw_response.headers
+    assert reader.raw_response.body.data == 'ok'
@@ -0,0 +1,430 @@
+# -*- coding: utf-8 -*-
+"""\
+Records responses as they come off the wire, and replays them later
+without a network, for deterministic load tests and benchmarks of the
+whole client (join, ResponseReader, Response.from_raw_response and
+all). Record with a :class:`RecordingClient`:
+
+    recording = TrafficRecording('/tmp/traffic')
+    client = RecordingClient(recording)
+    client.get('http://example.com/')
+
+and replay with a :class:`ReplayClient`, at full speed, or at the pace
+the responses were originally received, chunk by chunk:
+
+    client = ReplayClient(TrafficRecording('/tmp/traffic'), paced=True)
+    client.get('http://example.com/')
+
+Responses are keyed on the request's method and URL. When a request
+was recorded more than once, replays go through the recorded responses
+in order, starting over at the end.
+
+Replayed connections don't touch the network, but still go through
+the client's connection pool and ``join``. Each has a local
+socketpair, signaled when there's data to read, so it can be polled
+like any other socket.
+"""
+
+import heapq
+import socket
+import struct
+import threading
+from itertools import count
+
+from hematite.client import Client
+from hematite.compat import monotonic
+from hematite.raw import core
+from hematite.raw.drivers import BaseIODriver, SSLSocketDriver
+from hematite.resolver import PendingLookup
+from hematite.store import ResponseStore
+
+# each received chunk: the offset of its end in the response, and
+# seconds since the request was sent
+PACING_ENTRY = struct.Struct('<Qd')
+REPLAY_ADDRINFO = (socket.AF_INET, socket.SOCK_STREAM, 0, '',
+                   ('127.0.0.1', 0))
+
+
+class ReplayError(Exception):
+    pass
+
+
+def get_replay_key(raw_request):
+    return u'%s %s' % (raw_request.method, raw_request.host_url.to_text())
+
+
+def _split_head(wire):
+    # the header block goes in the record's head, so that recorded
+    # responses can still be looked at with ResponseStore
+    ends = [wire.find(sep) + len(sep) for sep in (b'\r\n\r\n', b'\n\n')
+            if sep in wire]
+    end = min(ends) if ends else len(wire)
+    return wire[:end], wire[end:]
+
+
+class TrafficRecording(object):
+    """\
+    Recorded responses, along with when each of their chunks arrived,
+    kept in a :class:`~hematite.store.ResponseStore` at *path*.
+    """
+    def __init__(self, path):
+        self.store = ResponseStore(path)
+        self._counts = {}  # key -> number of responses recorded
+
+    def _get_record_key(self, key, index):
+        return u'%s #%s' % (key, index)
+
+    def get_count(self, key):
+        "Returns the number of responses recorded for *key*."
+        ret = self._counts.get(key)
+        if ret is None:
+            ret = 0
+            while self._get_record_key(key, ret) in self.store:
+                ret += 1
+            self._counts[key] = ret
+        return ret
+
+    def add(self, key, wire, pacing):
+        """\
+        Records the response bytes *wire* for *key*, with *pacing*, a
+        list of (end offset, seconds after the request was sent) for
+        each chunk it arrived in.
+        """
+        index = self.get_count(key)
+        record_key = self._get_record_key(key, index)
+        head, body = _split_head(wire)
+        self.store.add_bytes(record_key, head, body)
+        self.store.add_bytes(record_key + u' pacing', b'',
+                             b''.join([PACING_ENTRY.pack(end, delay)
+                                       for end, delay in pacing]))
+        self._counts[key] = index + 1
+
+    def get(self, key, index=0):
+        """\
+        Returns the *index*-th response recorded for *key*, as the
+        response's bytes and its pacing, see :meth:`add`.
+        """
+        record_key = self._get_record_key(key, index)
+        stored = self.store.get(record_key)
+        if stored is None:
+            raise ReplayError('no response recorded for %r' % record_key)
+        wire = stored.head.tobytes() + stored.body.tobytes()
+        packed = self.store.get(record_key + u' pacing').body.tobytes()
+        pacing = [PACING_ENTRY.unpack_from(packed, offset)
+                  for offset in xrange(0, len(packed), PACING_ENTRY.size)]
+        return wire, pacing
+
+    def close(self):
+        self.store.close()
+
+    def __len__(self):
+        return len(self.store) // 2
+
+    def __repr__(self):
+        cn = self.__class__.__name__
+        return '<%s %r>' % (cn, self.store.path)
+
+
+class _RecordingIO(object):
+    # stands in for a driver's SocketIO, keeping a copy of what's read
+    def __init__(self, raw, on_read):
+        self._raw = raw
+        self._on_read = on_read
+
+    def readinto(self, b):
+        amount = self._raw.readinto(b)
+        if amount:
+            self._on_read(memoryview(b)[:amount].tobytes())
+        return amount
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+class RecordingDriver(SSLSocketDriver):
+    """\
+    An :class:`~hematite.raw.drivers.SSLSocketDriver` that keeps the
+    response's bytes as they're read, and when each chunk arrived.
+    *on_complete* is called with the driver once the response is in.
+    """
+    def __init__(self, sock, reader, writer, on_complete=None,
+                 clock=monotonic):
+        super(RecordingDriver, self).__init__(sock, reader=reader,
+                                              writer=writer)
+        self.outbound = _RecordingIO(self.outbound, self._received)
+        self.on_complete = on_complete
+        self.clock = clock
+        self.sent_at = None
+        self.chunks = []
+        self.pacing = []
+        self._size = 0
+
+    @property
+    def wire(self):
+        return b''.join(self.chunks)
+
+    def _received(self, data):
+        self.chunks.append(data)
+        self._size += len(data)
+        self.pacing.append((self._size, self.clock() - self.sent_at))
+
+    def _check_complete(self, done):
+        if done and self.on_complete is not None:
+            on_complete, self.on_complete = self.on_complete, None
+            on_complete(self)
+        return done
+
+    def write(self):
+        done = super(RecordingDriver, self).write()
+        if done and self.sent_at is None:
+            self.sent_at = self.clock()
+        return done
+
+    def read(self, headers_only=False, max_amount=None):
+        return self._check_complete(super(RecordingDriver, self).read(
+            headers_only=headers_only, max_amount=max_amount))
+
+    def read_some(self, max_amount=None):
+        return self._check_complete(super(RecordingDriver, self).read_some(
+            max_amount=max_amount))
+
+
+class RecordingClient(Client):
+    "A Client that adds every complete response to *recording*."
+    def __init__(self, recording, **kwargs):
+        super(RecordingClient, self).__init__(**kwargs)
+        self.recording = recording
+
+    def make_driver(self, raw_request, sock, reader, writer):
+        key = get_replay_key(raw_request)
+
+        def on_complete(driver):
+            self.recording.add(key, driver.wire, driver.pacing)
+        return RecordingDriver(sock, reader, writer, on_complete=on_complete)
+
+
+class ReplaySocket(object):
+    """\
+    Stands in for a connected socket: readable once signaled, and
+    always writable, so that joins can poll it like a real one.
+    """
+    def __init__(self):
+        self._sock, self._peer = socket.socketpair()
+        self._sock.setblocking(0)
+
+    def fileno(self):
+        return self._sock.fileno()
+
+    def getpeername(self):
+        return REPLAY_ADDRINFO[-1]
+
+    def signal(self):
+        try:
+            self._peer.send(b'x')
+        except socket.error:
+            pass  # closed in the meantime
+
+    def drain(self):
+        try:
+            self._sock.recv(4096)
+        except socket.error:
+            pass
+
+    def close(self):
+        self._sock.close()
+        self._peer.close()
+
+
+class _Pacer(object):
+    # signals ReplaySockets when their next chunk is due, on a thread.
+    # drivers update their chunks holding the lock, see ReplayDriver
+    def __init__(self, clock=monotonic):
+        self.clock = clock
+        self.heap = []
+        self._counter = count()
+        self._cond = threading.Condition()
+        self.lock = self._cond
+        self._thread = None
+
+    def schedule(self, when, driver, chunk):
+        with self._cond:
+            heapq.heappush(self.heap, (when, next(self._counter),
+                                       driver, chunk))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self):
+        heap = self.heap
+        while True:
+            with self._cond:
+                while not heap:
+                    self._cond.wait()
+                when = heap[0][0]
+                delay = when - self.clock()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                _, _, driver, chunk = heapq.heappop(heap)
+                # chunks already taken (e.g., read late, along with an
+                # earlier one) would leave the socket readable for
+                # nothing, which looks stale to the pool
+                if driver._next_chunk == chunk:
+                    driver.socket.signal()
+
+
+class ReplayDriver(BaseIODriver):
+    """\
+    Serves a recorded response (*wire*, see
+    :meth:`TrafficRecording.get`) to *reader*. The request is written
+    nowhere. With a *pacer*, each chunk is held back until as long
+    after the request was sent as it was when recorded, otherwise
+    everything's available at once.
+    """
+    def __init__(self, sock, reader, writer, wire, pacing=None, pacer=None):
+        super(ReplayDriver, self).__init__(reader=reader, writer=writer)
+        self.socket = sock
+        self.wire = wire
+        self.pacing = pacing or [(len(wire), 0.0)]
+        self.pacer = pacer
+        self.pos = 0
+        self.available = 0
+        self.sent_at = None
+        self._next_chunk = 0
+        self._scheduled_chunk = None
+
+    def write_line(self, line):
+        pass
+
+    def write_data(self, data):
+        pass
+
+    def write(self):
+        done = super(ReplayDriver, self).write()
+        if done and self.sent_at is None:
+            self.sent_at = monotonic()
+            self._update_available()
+            if self.available:
+                self.socket.signal()
+        return done
+
+    def _update_available(self):
+        """Takes any signal off the socket, makes the chunks due by now
+        available, and schedules a signal for when the next one is."""
+        pacing = self.pacing
+        if self.pacer is None:
+            self.socket.drain()
+            self._next_chunk = len(pacing)
+            self.available = len(self.wire)
+            return
+        # with the pacer's lock, a signal is either drained here, or
+        # sent after, and only if its chunk is still to come
+        with self.pacer.lock:
+            self.socket.drain()
+            elapsed = monotonic() - self.sent_at
+            while (self._next_chunk < len(pacing)
+                   and pacing[self._next_chunk][1] <= elapsed):
+                self.available = pacing[self._next_chunk][0]
+                self._next_chunk += 1
+            if (self._next_chunk < len(pacing)
+                    and self._scheduled_chunk != self._next_chunk):
+                self._scheduled_chunk = self._next_chunk
+                due = self.sent_at + pacing[self._next_chunk][1]
+                self.pacer.schedule(due, self, self._next_chunk)
+
+    def _feed_some(self, max_amount=None):
+        if self.pos >= self.available:
+            if self.available < len(self.wire):
+                raise core.eagain()
+            # the end of the recording is the end of the stream, which
+            # ends responses delimited by the connection closing
+            self.reader.feed(b'')
+            if not self.reader.complete:
+                raise core.EndOfStream
+            return
+        start, end = self.pos, self.available
+        if max_amount is not None:
+            end = min(end, start + max(max_amount, 1))
+        # as with SocketDriver.read, bodies of known length are copied
+        # straight into place
+        body_buffer = self.reader.get_body_buffer()
+        if body_buffer is not None:
+            end = min(end, start + len(body_buffer))
+            body_buffer[:end - start] = self.wire[start:end]
+            del body_buffer
+            self.pos = end
+            self.reader.feed_into(end - start)
+        else:
+            self.pos = end
+            self.reader.feed(self.wire[start:end])
+
+    def read(self, headers_only=False, max_amount=None):
+        self._update_available()
+        reader = self.reader
+        while not reader.complete:
+            if headers_only and self.inbound_headers_completed:
+                return False
+            self._feed_some(max_amount)
+        return True
+
+    def read_some(self, max_amount=None):
+        if not self.reader.complete:
+            self._update_available()
+            self._feed_some(max_amount)
+        return self.reader.complete
+
+    def _take(self, end):
+        if self.pos >= self.available:
+            raise core.eagain()
+        end = min(end, self.available)
+        data, self.pos = self.wire[self.pos:end], end
+        return data
+
+    def read_line(self):
+        end = self.wire.find(b'\n', self.pos, self.available)
+        if end < 0:
+            raise core.eagain()
+        return self._take(end + 1)
+
+    def read_data(self, amount):
+        return self._take(self.pos + amount)
+
+    def read_peek(self, amount):
+        return self.wire[self.pos:min(self.pos + amount, self.available)]
+
+
+class ReplayClient(Client):
+    """\
+    A Client that answers requests with the responses in *recording*,
+    without a network. With *paced*, responses arrive at the pace they
+    were recorded at, otherwise as fast as they can be read.
+    """
+    def __init__(self, recording, paced=False, **kwargs):
+        super(ReplayClient, self).__init__(**kwargs)
+        self.recording = recording
+        self.pacer = _Pacer() if paced else None
+        self._replayed = {}  # key -> number of responses replayed
+
+    def lookup_addrinfo(self, request):
+        ret = PendingLookup(request.host_url, cached=True)
+        ret.result, ret.done = REPLAY_ADDRINFO, True
+        return ret
+
+    def get_addrinfo(self, request):
+        return REPLAY_ADDRINFO
+
+    def get_socket(self, request, addrinfo, nonblocking):
+        return ReplaySocket()
+
+    def make_driver(self, raw_request, sock, reader, writer):
+        key = get_replay_key(raw_request)
+        recorded_count = self.recording.get_count(key)
+        if not recorded_count:
+            raise ReplayError('no response recorded for %r' % key)
+        index = self._replayed.get(key, 0)
+        self._replayed[key] = index + 1
+        wire, pacing = self.recording.get(key, index % recorded_count)
+        return ReplayDriver(sock, reader, writer, wire, pacing,
+                            pacer=self.pacer)
@@ -9,11 +9,14 @@ from hematite.raw.parser import HTTPVersion
 from hematite import serdes
 from hematite.url import parse_hostinfo
 from hematite.fields import REQUEST_FIELDS, HTTP_REQUEST_FIELDS
-from hematite.raw.datastructures import Body, ChunkedBody
+from hematite.raw.datastructures import Body, ChunkedBody, FileBody
 
 DEFAULT_METHOD = 'GET'
 DEFAULT_VERSION = HTTPVersion(1, 1)
 DEFAULT_SCHEME = 'http'
+# the headers a RequestTemplate leaves open by default, as the ones most
+# likely to change from one send to the next
+DEFAULT_TEMPLATE_SLOTS = ('If-None-Match', 'Content-Length', 'Authorization')
 
 
 class Request(object):
@@ -26,6 +29,8 @@ class Request(object):
 
         self.url = self._raw_url
         self._init_headers()
+        if kw.pop('eager_headers', False):
+            self.parse_headers()
 
         # TODO: maybe should defer this
         _url = self._url
@@ -50,14 +55,21 @@ class Request(object):
         if isinstance(value, str):
             self._body = Body(value)
             self.content_length = len(value)
+        elif isinstance(value, FileBody):
+            self._body = value
+            self.content_length = value.size
+        elif hasattr(value, 'read') and hasattr(value, 'seek'):
+            # files are sent as-is rather than as an iterable of lines
+            self._body = FileBody(value)
+            self.content_length = self._body.size
         elif not value:
             self._body = None
         elif isinstance(value, Iterable):
             self._body = ChunkedBody(value)
             self.chunked = True
         else:
-            raise ValueError('Body must be string, iterable of strings '
-                             'or None')
+            raise ValueError('Body must be string, file, iterable of '
+                             'strings or None')
 
     # TODO: could use a metaclass for this, could also build it at init
     _header_field_map = dict([(hf.http_name, hf)
@@ -65,6 +77,7 @@ class Request(object):
     locals().update([(hf.attr_name, hf) for hf in REQUEST_FIELDS])
     _init_headers = serdes._init_headers
     _get_header_dict = serdes._get_headers
+    parse_headers = serdes._parse_headers
 
     def get_copy(self):
         type_self = type(self)
@@ -76,14 +89,16 @@ class Request(object):
         # now, to override/actually set a few critical fields
         # TODO: make a copy of raw headers, too?
         ret.headers = Headers()
-        for header, value in self.headers.items():  # TODO multi=True?
+        ret._unparsed_headers = set(self._unparsed_headers)
+        for header, value in self.headers.items(multi=True):
             _get_hv_copy = getattr(value, 'get_copy', None)
             if callable(_get_hv_copy):
-                ret.headers[header] = _get_hv_copy()
+                ret.headers.add(header, _get_hv_copy())
             else:
-                ret.headers[header] = value
+                ret.headers.add(header, value)
         #ret._url = self._url.get_copy()
         # TODO ret.cookies = self.cookies
+        return ret
 
     @classmethod
     def from_raw_request(cls, raw_req):
@@ -119,3 +134,108 @@ class Request(object):
 
     def validate(self):
         pass
+
+
+class RequestTemplate(object):
+    """\
+    A Request frozen for sending over and over, e.g., to poll the same
+    endpoint. The request line and headers are serialized once, up
+    front, except for the headers named in *slots*, which are filled
+    in for each send. Sending then comes down to joining the
+    serialized prefix with the slot headers:
+
+    >>> tmpl = RequestTemplate(Request('GET', 'http://example.com/feed'))
+    >>> tmpl.get_head({'If-None-Match': '"v2"'}).split('\\r\\n')
+    ['GET /feed HTTP/1.1', 'Host: example.com', 'If-None-Match: "v2"', '', '']
+
+    Whatever values *request* has for the slots are used as defaults.
+    Bodies aren't part of the template, they're passed to
+    :meth:`to_raw_request` for each send.
+    """
+    def __init__(self, request, slots=DEFAULT_TEMPLATE_SLOTS):
+        if request._body is not None:
+            raise ValueError('templates are made from requests without'
+                             ' bodies, pass bodies to to_raw_request()')
+        raw_request = request.to_raw_request()
+        self.method = raw_request.method
+        self.url = raw_request.url
+        self.host_url = raw_request.host_url
+        self.http_version = raw_request.http_version
+        self.slots = tuple(slots)
+        self._slot_keys = [(name, name.lower()) for name in self.slots]
+
+        self._slot_names = set([key for _, key in self._slot_keys])
+        self._header_items, self.defaults = [], {}
+        for name, value in raw_request.headers.iteritems(multi=True):
+            if name.lower() in self._slot_names:
+                self.defaults[name.lower()] = value
+            else:
+                self._header_items.append((name, value))
+        prefix = RawRequest(method=self.method,
+                            url=self.url,
+                            http_version=self.http_version,
+                            headers=Headers(self._header_items)).to_bytes()
+        self.prefix = prefix[:-2]  # the blank line comes after the slots
+
+    def _get_slot_items(self, values):
+        values = dict([(k.lower(), v) for k, v in (values or {}).items()])
+        unknown = set(values) - self._slot_names
+        if unknown:
+            raise ValueError('not slots of this template: %r'
+                             % sorted(unknown))
+        ret = []
+        for name, key in self._slot_keys:
+            value = values[key] if key in values else self.defaults.get(key)
+            if value is not None:
+                ret.append((name, serdes.default_header_to_bytes(value)))
+        return ret
+
+    def get_head(self, values=None):
+        """\
+        Returns the request line and headers as bytes, with the slots
+        filled in from the dict *values*, keyed by header name. Slots
+        left out keep their defaults, and slots set to None are left
+        out of the head.
+        """
+        return self._get_head(self._get_slot_items(values))
+
+    def _get_head(self, slot_items):
+        parts = [self.prefix]
+        for name, value in slot_items:
+            parts.append('%s: %s\r\n' % (name, value))
+        parts.append('\r\n')
+        return ''.join(parts)
+
+    def to_raw_request(self, values=None, body=None):
+        """\
+        Returns a RawRequest, ready to send, with the slots filled in
+        from *values* (see :meth:`get_head`) and *body*, a bytestring,
+        if any. Its Content-Length is set to match, which requires a
+        Content-Length slot.
+        """
+        values = dict([(k.lower(), v) for k, v in (values or {}).items()])
+        content_length = None
+        if body is not None:
+            if not isinstance(body, str):
+                raise TypeError('expected body to be a bytestring, not %r'
+                                % type(body))
+            if 'content-length' not in self._slot_names:
+                raise ValueError('sending a body requires a Content-Length'
+                                 ' slot')
+            content_length = values['content-length'] = len(body)
+            body = Body(body)
+        slot_items = self._get_slot_items(values)
+        return RawRequest(method=self.method,
+                          url=self.url,
+                          host_url=self.host_url,
+                          http_version=self.http_version,
+                          headers=Headers(self._header_items + slot_items),
+                          body=body,
+                          head=self._get_head(slot_items),
+                          chunked=False,
+                          content_length=content_length)
+
+    def __repr__(self):
+        cn = self.__class__.__name__
+        return '<%s "%s %s" slots=%r>' % (cn, self.method, self.url,
+                                          self.slots)
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import errno
+import socket
+import threading
+from Queue import Queue
+from collections import OrderedDict
+
+DEFAULT_MAX_WORKERS = 8
+# getaddrinfo doesn't expose record TTLs, so cache entries get a fixed
+# lifetime instead.
+DEFAULT_TTL = 60.0
+DEFAULT_NEGATIVE_TTL = 5.0
+DEFAULT_MAX_ENTRIES = 4096
+
+
+def lookup_url(url):
+    host = url.host
+    port = url.port or (443 if url.scheme.lower() == 'https' else 80)
+
+    # here we use the value of url.family to indicate whether host
+    # is already an IP or not. the user might have mucked with
+    # this, so maybe a better check is in order. (URL defaults family
+    # to u'' rather than None.)
+    if not url.family:
+        # assuming TCP ;P
+        # big wtf: no kwargs on getaddrinfo
+        addrinfos = socket.getaddrinfo(host,
+                                       port,
+                                       socket.AF_UNSPEC,  # v4/v6
+                                       socket.SOCK_STREAM,
+                                       socket.IPPROTO_TCP)
+        # TODO: configurable behavior on multiple returns?
+        # TODO: (cont.) set preference for IPv4/v6
+
+        # NOTE: raises exception on unresolvable hostname, so
+        #       addrinfo[0] should never indexerror
+        family, socktype, proto, canonname, sockaddr = addrinfos[0]
+        ret = (family, socktype) + sockaddr
+    elif url.family is socket.AF_INET:
+        ret = (url.family, socket.SOCK_STREAM, host, port)
+    elif url.family is socket.AF_INET6:
+        # TODO: how to handle flowinfo, scopeid here? is None even valid?
+        ret = (url.family, socket.SOCK_STREAM, host, port, None, None)
+    else:
+        raise ValueError('invalid family on url: %r' % url)
+
+    # NOTE: it'd be cool to just return an unconnected socket
+    # here, but even unconnected sockets use fds
+    return ret
+
+
+def _get_cache_key(url):
+    port = url.port or (443 if url.scheme.lower() == 'https' else 80)
+    return (url.host.lower(), port)
+
+
+class PendingLookup(object):
+    """\
+    The result of :meth:`Resolver.lookup`. Lookups that have to go to
+    the thread pool get a pipe, the read end of which is exposed via
+    :meth:`fileno` and becomes readable once the lookup is done, so
+    the lookup can sit in a select/poll loop next to sockets.
+    """
+    def __init__(self, url, cached=False):
+        self.url = url
+        self.cached = cached
+        self.result = None
+        self.error = None
+        self.done = False
+        self._rfd = self._wfd = None
+        self._lock = threading.Lock()
+        if not cached:
+            self._rfd, self._wfd = os.pipe()
+
+    def fileno(self):
+        return self._rfd
+
+    def _finish(self, result=None, error=None):
+        # called from the worker thread
+        with self._lock:
+            self.result, self.error = result, error
+            self.done = True
+            if self._wfd is not None:  # None if abandoned
+                os.write(self._wfd, 'x')
+
+    def get_result(self):
+        "Returns the addrinfo, raising the lookup's socket.error if any."
+        self.close()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def close(self):
+        with self._lock:
+            rfd, wfd = self._rfd, self._wfd
+            self._rfd = self._wfd = None
+        for fd in (rfd, wfd):
+            if fd is None:
+                continue
+            try:
+                os.close(fd)
+            except OSError as ose:
+                if ose.errno != errno.EBADF:
+                    raise
+
+    def __repr__(self):
+        cn = self.__class__.__name__
+        return '<%s %r done=%s cached=%s>' % (cn, self.url.host,
+                                              self.done, self.cached)
+
+
+class Resolver(object):
+    """\
+    Resolves hosts on a bounded pool of worker threads, keeping
+    results (including failures, for ``negative_ttl`` seconds) in an
+    in-process cache. ``hits`` and ``misses`` count cache lookups over
+    the lifetime of the resolver.
+    """
+    def __init__(self,
+                 max_workers=DEFAULT_MAX_WORKERS,
+                 ttl=DEFAULT_TTL,
+                 negative_ttl=DEFAULT_NEGATIVE_TTL,
+                 max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_workers = max_workers
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self._cache = OrderedDict()  # key -> (expires_at, result, error)
+        self._lock = threading.Lock()
+        self._queue = Queue()
+        self._workers = []
+
+    def lookup(self, url):
+        """\
+        Returns a :class:`PendingLookup` for *url*. Cache hits and IP
+        literals come back already done, everything else is queued
+        for the worker threads.
+        """
+        if url.family:
+            ret = PendingLookup(url, cached=True)
+            ret.result = lookup_url(url)
+            ret.done = True
+            return ret
+        key = _get_cache_key(url)
+        cached = self._get_cached(key)
+        if cached is not None:
+            self.hits += 1
+            ret = PendingLookup(url, cached=True)
+            ret.result, ret.error = cached
+            ret.done = True
+            return ret
+        self.misses += 1
+        ret = PendingLookup(url)
+        self._ensure_workers()
+        self._queue.put(ret)
+        return ret
+
+    def resolve(self, url):
+        "Blocking, cache-aware version of :func:`lookup_url`."
+        if url.family:
+            return lookup_url(url)
+        key = _get_cache_key(url)
+        cached = self._get_cached(key)
+        if cached is None:
+            self.misses += 1
+            return self._resolve(key, url)
+        self.hits += 1
+        result, error = cached
+        if error is not None:
+            raise error
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def _resolve(self, key, url):
+        try:
+            result = lookup_url(url)
+        except socket.error as se:
+            self._set_cached(key, None, se)
+            raise
+        self._set_cached(key, result, None)
+        return result
+
+    def _get_cached(self, key):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            expires_at, result, error = entry
+            if expires_at < time.time():
+                del self._cache[key]
+                return None
+            return result, error
+
+    def _set_cached(self, key, result, error):
+        ttl = self.negative_ttl if error is not None else self.ttl
+        with self._lock:
+            self._cache.pop(key, None)
+            self._cache[key] = (time.time() + ttl, result, error)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def _ensure_workers(self):
+        if len(self._workers) >= self.max_workers:
+            return
+        worker = threading.Thread(target=self._work)
+        worker.daemon = True
+        worker.start()
+        self._workers.append(worker)
+
+    def _work(self):
+        while True:
+            lookup = self._queue.get()
+            url = lookup.url
+            key = _get_cache_key(url)
+            # a lookup for the same host may have been queued ahead
+            cached = self._get_cached(key)
+            if cached is not None:
+                lookup._finish(*cached)
+                continue
+            try:
+                result = self._resolve(key, url)
+            except socket.error as se:
+                lookup._finish(None, se)
+            except Exception as e:
+                lookup._finish(None, e)
+            else:
+                lookup._finish(result, None)
+
+    def __repr__(self):
+        cn = self.__class__.__name__
+        return ('<%s hits=%s misses=%s entries=%s>'
+                % (cn, self.hits, self.misses, len(self._cache)))
@@ -26,6 +26,8 @@ class Response(object):
         self._data = None
 
         self._init_headers()
+        if kw.pop('eager_headers', False):
+            self.parse_headers()
         # TODO: lots
         return
 
@@ -34,6 +36,7 @@ class Response(object):
     locals().update([(hf.attr_name, hf) for hf in RESPONSE_FIELDS])
     _init_headers = serdes._init_headers
     _get_header_dict = serdes._get_headers
+    parse_headers = serdes._parse_headers
 
     def _load_data(self):
         self._data = self._body.data
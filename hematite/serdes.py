@@ -4,7 +4,7 @@ import re
 import time
 from datetime import datetime, timedelta
 
-from hematite.constants import HEADER_CASE_MAP
+from hematite.constants import get_header_name
 from hematite.raw import core
 from hematite.raw.datastructures import Headers
 
@@ -14,11 +14,14 @@ from hematite.raw.datastructures import Headers
 
 def _init_headers(self):
     self.headers = Headers()
+    # known headers are kept as bytes until their field is accessed
+    self._unparsed_headers = set()
     # plenty of ways to arrange this
     hf_map = self._header_field_map
-    for hname, lower_hname, hval in self._raw_headers.itercaseditems():
+    for hname, hval in self._raw_headers.iteritems(multi=True):
+        # parsed names are already in the table, see get_header_name
+        norm_hname = get_header_name(hname).canonical
         try:
-            norm_hname = HEADER_CASE_MAP[lower_hname]
             field = hf_map[norm_hname]
         except KeyError:
             # preserves insertion order and duplicates
@@ -30,14 +33,24 @@ def _init_headers(self):
                 # TODO: this won't catch e.g., Cache-Control + CACHE-CONTROL
                 # in the same preamble/envelope
                 val_list = self._raw_headers.getlist(hname)
-                hval = ','.join(val_list)
-            field.__set__(self, hval)
+                hval = ', '.join(val_list)
+            field.set_raw(self, hval)
+
+
+def _parse_headers(self):
+    """Parses the known headers that haven't been accessed yet,
+    raising on the first invalid one. For validating a message up
+    front, rather than as its fields are used."""
+    hf_map = self._header_field_map
+    for hname in list(getattr(self, '_unparsed_headers', ())):
+        hf_map[hname].__get__(self)
 
 
 def _get_headers(self, drop_empty=True):
     # TODO: option for unserialized?
     ret = Headers()
     hf_map = self._header_field_map
+    unparsed = getattr(self, '_unparsed_headers', ())
     for hname, hval in self.headers.items(multi=True):
         if drop_empty and hval is None or hval == '':
             # TODO: gonna need a field.is_empty or something
@@ -47,7 +60,10 @@ def _get_headers(self, drop_empty=True):
         except KeyError:
             ret.add(hname, default_header_to_bytes(hval))
         else:
-            ret.add(hname, field.to_bytes(hval))
+            if hname in unparsed:
+                ret.add(hname, hval)  # never parsed, so still bytes
+            else:
+                ret.add(hname, field.to_bytes(hval))
     return ret
 
 ###
@@ -191,6 +207,8 @@ def content_header_from_bytes(val):
 def http_date_from_bytes(date_str):
     # TODO: is the strip really necessary?
     timetuple = _date_tz_from_bytes(date_str.strip())
+    if timetuple is None:
+        raise ValueError('invalid HTTP date: %r' % date_str)
     tz_seconds = timetuple[-1] or 0
     tz_offset = timedelta(seconds=tz_seconds)
     return datetime(*timetuple[:7]) - tz_offset
@@ -0,0 +1,429 @@
+# -*- coding: utf-8 -*-
+"""\
+An append-only, on-disk store of responses, read through mmap, so that
+one with millions of entries opens instantly and stays out of the
+Python heap:
+
+    store = ResponseStore('/var/cache/hematite/responses')
+    store.add(u'GET http://example.com/', client_resp.raw_response)
+    stored = store.get(u'GET http://example.com/')
+    stored.status_line.status_code, stored.headers['Content-Type']
+    stored.body  # a memoryview into the map, no copy
+
+Responses go into a segment file, one record after another, each with
+its key, header block and body. Alongside is an index file
+(``<path>.idx``), an open-addressed hash table of (key hash, offset,
+length, header block length) slots, also mapped, so lookups touch only
+a slot or two and the record itself. The index is only a shortcut: a
+missing or damaged one is rebuilt from the segment, and records
+appended after it was last written (e.g., by a process that died
+before getting to it) are picked up on open.
+
+Adding a key again supersedes the earlier record, which stays in the
+segment until it's rewritten, see :meth:`ResponseStore.compact`.
+"""
+
+import os
+import mmap
+import struct
+import hashlib
+
+from hematite.raw.parser import StatusLine, HeadersReader
+from hematite.raw.response import RawResponse
+from hematite.raw.datastructures import Headers, Body
+
+SEGMENT_MAGIC = b'HMTSEG01'
+INDEX_MAGIC = b'HMTIDX01'
+# each record: key length, header block length, body length
+RECORD_HEADER = struct.Struct('<HIQ')
+# the index: magic, slot count, entry count, segment bytes indexed
+INDEX_HEADER = struct.Struct('<8sQQQ')
+# each slot: key hash (0 if empty), record offset, record length,
+# header block length
+INDEX_SLOT = struct.Struct('<QQQI4x')
+DEFAULT_CAPACITY = 2 ** 12
+# the index is doubled before it gets fuller than this
+MAX_LOAD = 0.5
+MAX_KEY_LENGTH = 2 ** 16 - 1
+
+# headers that no longer describe a body once it's been stored whole
+# and decoded
+_FRAMING_HEADERS = ('Transfer-Encoding', 'Content-Length',
+                    'Content-Encoding')
+
+
+class StoreError(Exception):
+    pass
+
+
+def _hash_key(key):
+    # 0 marks an empty slot
+    return struct.unpack('<Q', hashlib.sha1(key).digest()[:8])[0] or 1
+
+
+def _encode_key(key):
+    if isinstance(key, unicode):
+        key = key.encode('utf-8')
+    if len(key) > MAX_KEY_LENGTH:
+        raise StoreError('keys are limited to %s bytes' % MAX_KEY_LENGTH)
+    return key
+
+
+def get_stored_headers(raw_response):
+    """\
+    Returns a copy of *raw_response*'s headers describing its body as
+    received, that is, whole (not chunked) and with any content-codings
+    the body decoded removed.
+    """
+    headers = Headers(raw_response.headers.iteritems(multi=True))
+    body = raw_response.body
+    codings = []
+    if 'Content-Encoding' in headers:
+        codings = [c.strip() for v in headers.getlist('Content-Encoding')
+                   for c in v.split(',')
+                   if c.strip() and c.strip().lower() != 'identity']
+    decoder = getattr(body, 'decoder', None)
+    if decoder is not None:
+        codings = codings[:len(codings) - len(decoder.codings)]
+    for name in _FRAMING_HEADERS:
+        if name in headers:
+            del headers[name]
+    if codings:
+        headers['Content-Encoding'] = ', '.join(codings)
+    data = body.data if body is not None else None
+    headers['Content-Length'] = str(len(data or b''))
+    return headers
+
+
+class StoredResponse(object):
+    """\
+    A response read from a :class:`ResponseStore`. *head* (the status
+    line and headers) and *body* are memoryviews into the store's map.
+    The head is only parsed once the status line or headers are
+    accessed.
+    """
+    __slots__ = ('key', 'head', 'body', '_status_line', '_headers')
+
+    def __init__(self, key, head, body):
+        self.key = key
+        self.head = head
+        self.body = body
+        self._status_line = None
+        self._headers = None
+
+    def _parse_head(self):
+        head = self.head.tobytes()
+        line, _, block = head.partition(b'\n')
+        reader = HeadersReader()
+        reader.feed(block)
+        if not reader.complete:
+            raise StoreError('incomplete header block for %r' % self.key)
+        self._status_line = StatusLine.from_bytes(line)
+        self._headers = reader.headers
+
+    @property
+    def status_line(self):
+        if self._status_line is None:
+            self._parse_head()
+        return self._status_line
+
+    @property
+    def headers(self):
+        if self._headers is None:
+            self._parse_head()
+        return self._headers
+
+    def to_raw_response(self):
+        "Returns a complete RawResponse, with a copy of the body."
+        data = self.body.tobytes()
+        body = Body()
+        if data:
+            body.data_received(data)
+        body.complete(len(data))
+        return RawResponse(status_line=self.status_line,
+                           headers=Headers(self.headers.iteritems(
+                               multi=True)),
+                           body=body)
+
+    def __repr__(self):
+        cn = self.__class__.__name__
+        return '<%s %r, %s body bytes>' % (cn, self.key, len(self.body))
+
+
+class ResponseStore(object):
+    """\
+    Stores responses by key (bytes or text, e.g., ``u'GET <url>'``)
+    in the segment file at *path* and its index, creating them as
+    needed. *capacity* is the initial number of index slots.
+
+    Memoryviews handed out by :meth:`get` stay valid after the store
+    is closed, as each keeps the map it points into alive.
+    """
+    def __init__(self, path, capacity=DEFAULT_CAPACITY):
+        self.path = path
+        self.index_path = path + '.idx'
+        self._segment = open(path, 'a+b')
+        self._segment.seek(0, os.SEEK_END)
+        if not self._segment.tell():
+            self._segment.write(SEGMENT_MAGIC)
+            self._segment.flush()
+        self._segment_map = None
+        self._index_file = None
+        self._index_map = None
+        self.capacity = self.count = self.indexed_size = 0
+        self._check_segment()
+        if not self._open_index():
+            self._create_index(max(capacity, 1))
+        self._index_records(self.indexed_size)
+
+    # segment
+
+    @property
+    def segment_size(self):
+        self._segment.seek(0, os.SEEK_END)
+        return self._segment.tell()
+
+    def _check_segment(self):
+        self._segment.seek(0)
+        if self._segment.read(len(SEGMENT_MAGIC)) != SEGMENT_MAGIC:
+            raise StoreError('not a response store segment: %r' % self.path)
+
+    def _get_view(self, offset, length):
+        seg_map = self._segment_map
+        if seg_map is None or offset + length > len(seg_map):
+            # the segment has grown since it was mapped. earlier maps
+            # stay alive for as long as views into them do.
+            self._segment.flush()
+            seg_map = mmap.mmap(self._segment.fileno(), 0,
+                                access=mmap.ACCESS_READ)
+            self._segment_map = seg_map
+        return memoryview(buffer(seg_map, offset, length))
+
+    def _read_record_header(self, offset):
+        view = self._get_view(offset, RECORD_HEADER.size)
+        return RECORD_HEADER.unpack(view.tobytes())
+
+    def _append(self, key, head, body):
+        seg = self._segment
+        seg.seek(0, os.SEEK_END)
+        offset = seg.tell()
+        seg.write(RECORD_HEADER.pack(len(key), len(head), len(body)))
+        seg.write(key)
+        seg.write(head)
+        seg.write(body)
+        seg.flush()
+        return offset, seg.tell() - offset
+
+    def _index_records(self, start):
+        """Indexes the records from *start* to the end of the segment,
+        stopping at a partially written one, which is dropped."""
+        end, offset = self.segment_size, start
+        while offset + RECORD_HEADER.size <= end:
+            key_len, head_len, body_len = self._read_record_header(offset)
+            length = RECORD_HEADER.size + key_len + head_len + body_len
+            if offset + length > end:
+                break
+            key = self._get_view(offset + RECORD_HEADER.size,
+                                 key_len).tobytes()
+            self._set_slot(key, offset, length, head_len)
+            offset += length
+        if offset < end:
+            self._segment.truncate(offset)
+        self._set_indexed_size(offset)
+
+    # index
+
+    def _open_index(self):
+        try:
+            index_file = open(self.index_path, 'r+b')
+        except IOError:
+            return False
+        try:
+            header = index_file.read(INDEX_HEADER.size)
+            magic, capacity, count, indexed_size = INDEX_HEADER.unpack(header)
+            expected = INDEX_HEADER.size + capacity * INDEX_SLOT.size
+            if (magic != INDEX_MAGIC or not capacity
+                    or os.fstat(index_file.fileno()).st_size != expected
+                    or indexed_size > self.segment_size):
+                raise StoreError('invalid index')
+        except (struct.error, StoreError):
+            index_file.close()
+            return False
+        self._index_file = index_file
+        self._index_map = mmap.mmap(index_file.fileno(), 0)
+        self.capacity, self.count = capacity, count
+        self.indexed_size = indexed_size
+        return True
+
+    def _create_index(self, capacity):
+        """Writes out an empty index with *capacity* slots and indexes
+        the whole segment into it."""
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, capacity, 0,
+                                      len(SEGMENT_MAGIC)))
+            f.truncate(INDEX_HEADER.size + capacity * INDEX_SLOT.size)
+        os.rename(tmp_path, self.index_path)
+        self._close_index()
+        if not self._open_index():
+            raise StoreError('could not create index %r' % self.index_path)
+
+    def _close_index(self):
+        if self._index_map is not None:
+            self._index_map.close()
+            self._index_file.close()
+        self._index_map = self._index_file = None
+
+    def _write_index_header(self):
+        INDEX_HEADER.pack_into(self._index_map, 0, INDEX_MAGIC,
+                               self.capacity, self.count, self.indexed_size)
+
+    def _set_indexed_size(self, indexed_size):
+        self.indexed_size = indexed_size
+        self._write_index_header()
+
+    def _find_slot(self, key, key_hash):
+        """Returns the position of *key*'s slot, or of the empty slot
+        where it would go, along with the slot's contents."""
+        index_map, capacity = self._index_map, self.capacity
+        pos = key_hash % capacity
+        while True:
+            slot_offset = INDEX_HEADER.size + pos * INDEX_SLOT.size
+            slot = INDEX_SLOT.unpack_from(index_map, slot_offset)
+            if not slot[0]:
+                return slot_offset, slot
+            if slot[0] == key_hash and self._get_key(slot) == key:
+                return slot_offset, slot
+            pos = (pos + 1) % capacity
+
+    def _get_key(self, slot):
+        _, offset, _, _ = slot
+        key_len = self._read_record_header(offset)[0]
+        return self._get_view(offset + RECORD_HEADER.size, key_len).tobytes()
+
+    def _set_slot(self, key, offset, length, head_len):
+        key_hash = _hash_key(key)
+        slot_offset, slot = self._find_slot(key, key_hash)
+        if not slot[0]:
+            if self.count + 1 > self.capacity * MAX_LOAD:
+                self._grow()
+                slot_offset, slot = self._find_slot(key, key_hash)
+            self.count += 1
+        INDEX_SLOT.pack_into(self._index_map, slot_offset,
+                             key_hash, offset, length, head_len)
+
+    def _iter_slots(self):
+        index_map = self._index_map
+        for pos in xrange(self.capacity):
+            slot = INDEX_SLOT.unpack_from(
+                index_map, INDEX_HEADER.size + pos * INDEX_SLOT.size)
+            if slot[0]:
+                yield slot
+
+    def _grow(self):
+        slots = list(self._iter_slots())
+        indexed_size = self.indexed_size
+        self._create_index(self.capacity * 2)
+        for _, offset, length, head_len in slots:
+            key = self._get_key((None, offset, None, None))
+            key_hash = _hash_key(key)
+            slot_offset, _ = self._find_slot(key, key_hash)
+            INDEX_SLOT.pack_into(self._index_map, slot_offset,
+                                 key_hash, offset, length, head_len)
+        self.count = len(slots)
+        self._set_indexed_size(indexed_size)
+
+    # public
+
+    def add(self, key, raw_response):
+        """\
+        Stores the complete *raw_response* under *key*. The body is
+        stored as received, decoded from any chunking and (supported)
+        content-codings, with headers to match, see
+        :func:`get_stored_headers`.
+        """
+        data = raw_response.body.data if raw_response.body else b''
+        if data is None:
+            raise StoreError('streamed responses cannot be stored')
+        head = RawResponse(status_line=raw_response.status_line,
+                           headers=get_stored_headers(raw_response)).to_bytes()
+        self.add_bytes(key, head, bytes(data))
+
+    def add_bytes(self, key, head, body):
+        """Stores the header block *head* (status line included) and
+        *body* under *key*, as they are."""
+        key = _encode_key(key)
+        offset, length = self._append(key, head, body)
+        self._set_slot(key, offset, length, len(head))
+        self._set_indexed_size(offset + length)
+
+    def get(self, key, default=None):
+        "Returns the :class:`StoredResponse` for *key*, or *default*."
+        key = _encode_key(key)
+        _, slot = self._find_slot(key, _hash_key(key))
+        if not slot[0]:
+            return default
+        return self._load(key, slot)
+
+    def _load(self, key, slot):
+        _, offset, length, head_len = slot
+        start = offset + RECORD_HEADER.size + len(key)
+        view = self._get_view(start, offset + length - start)
+        return StoredResponse(key, view[:head_len], view[head_len:])
+
+    def __contains__(self, key):
+        key = _encode_key(key)
+        return bool(self._find_slot(key, _hash_key(key))[1][0])
+
+    def __len__(self):
+        return self.count
+
+    def iterkeys(self):
+        for slot in self._iter_slots():
+            yield self._get_key(slot)
+
+    __iter__ = iterkeys
+
+    def iteritems(self):
+        for slot in self._iter_slots():
+            key = self._get_key(slot)
+            yield key, self._load(key, slot)
+
+    def compact(self):
+        """\
+        Rewrites the segment without superseded records, then reopens
+        it. Views from before stay valid, as they hold the old map.
+        """
+        tmp_path = self.path + '.tmp'
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        new_store = ResponseStore(tmp_path, capacity=self.capacity)
+        try:
+            for key, stored in self.iteritems():
+                new_store.add_bytes(key, stored.head.tobytes(),
+                                    stored.body.tobytes())
+        finally:
+            new_store.close()
+        self.close()
+        # without an index, a crash between renames means a rebuild,
+        # rather than an index of the wrong segment
+        os.remove(self.index_path)
+        os.rename(tmp_path, self.path)
+        os.rename(tmp_path + '.idx', self.index_path)
+        self.__init__(self.path)
+
+    def close(self):
+        self._close_index()
+        # the segment map is left to be collected with the last view
+        self._segment_map = None
+        self._segment.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __repr__(self):
+        cn = self.__class__.__name__
+        return '<%s %r, %s responses>' % (cn, self.path, self.count)
@@ -1,6 +1,10 @@
 import os
+
 import pytest
 
+# make_response is re-exported for the tests
+from hematite.loopback import LoopbackServer, make_response
+
 
 @pytest.fixture(scope='module')
 def file_fixture(request):
@@ -12,3 +16,10 @@ def file_fixture(request):
         return open(os.path.join(fixture_path, fn))
 
     return file_fixture
+
+
+@pytest.fixture
+def loopback_server(request):
+    server = LoopbackServer()
+    request.addfinalizer(server.stop)
+    return server
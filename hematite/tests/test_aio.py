@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from hematite import aio
+from hematite.client import Client, RequestTimeout
+from hematite.tests.pytest_support import make_response
+
+if aio.asyncio is None:
+    pytest.skip('asyncio (or trollius) is not installed',
+                allow_module_level=True)
+
+
+@pytest.fixture
+def loop(request):
+    loop = aio.asyncio.new_event_loop()
+    request.addfinalizer(loop.close)
+    return loop
+
+
+def test_coro_get(loopback_server, loop):
+    loopback_server.routes['/chunked'] = ('HTTP/1.1 200 OK\r\n'
+                                          'Transfer-Encoding: chunked\r\n'
+                                          '\r\n'
+                                          '3\r\nabc\r\n0\r\n\r\n')
+    client = Client()
+    futures = [client.get.coro(loopback_server.url('/one'), loop=loop),
+               client.get.coro(loopback_server.url('/chunked'), loop=loop)]
+    resps = loop.run_until_complete(aio.asyncio.gather(*futures, loop=loop))
+    assert [r.is_complete for r in resps] == [True, True]
+    assert resps[0].get_data() == 'hello'
+    assert resps[1].response.status_code == 200
+    assert resps[1].raw_response.body.data == 'abc'
+    assert resps[0].driver is None  # join() was never involved
+
+
+def test_coro_post_body(loopback_server, loop):
+    loopback_server.routes['/echo'] = lambda head, body: make_response(body)
+    client = Client()
+    future = client.post.coro(loopback_server.url('/echo'), body='ping',
+                              loop=loop)
+    resp = loop.run_until_complete(future)
+    assert resp.raw_response.body.data == 'ping'
+
+
+def test_coro_timeout(loopback_server, loop):
+    # no Content-Length, so the body is read until the server hangs up
+    loopback_server.routes['/slow'] = 'HTTP/1.1 200 OK\r\n\r\npartial'
+    client = Client()
+    future = client.get.coro(loopback_server.url('/slow'), timeout=0.1,
+                             loop=loop)
+    with pytest.raises(RequestTimeout):
+        loop.run_until_complete(future)
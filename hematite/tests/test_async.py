@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+
+import time
+import socket
+
+from hematite import async
+from hematite.compat import selectors, monotonic
+from hematite.client import Client, RequestTimeout
+from hematite.tests.pytest_support import LoopbackServer, make_response
+
+
+class SocketJoinable(object):
+    "Reads a fixed number of bytes off of one end of a socketpair."
+    def __init__(self, sock, expected):
+        self.sock = sock
+        self.expected = expected
+        self.received = ''
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    @property
+    def want_read(self):
+        return len(self.received) < self.expected
+
+    want_write = False
+
+    def do_read(self):
+        self.received += self.sock.recv(4096)
+        return False
+
+    def do_write(self):
+        return False
+
+
+class ForcedJoinable(object):
+    "Wants to write, without an fd, until it's written *writes* times."
+    def __init__(self, writes):
+        self.writes = writes
+        self.write_count = 0
+
+    def fileno(self):
+        return None
+
+    @property
+    def want_write(self):
+        return self.write_count < self.writes
+
+    want_read = False
+
+    def do_write(self):
+        self.write_count += 1
+        return False
+
+
+def test_join_sockets():
+    pairs = [socket.socketpair() for i in range(20)]
+    joinables = [SocketJoinable(a, 5) for a, b in pairs]
+    for i, (a, b) in enumerate(pairs):
+        b.sendall('%05d' % i)
+    async.join(joinables, timeout=2.0)
+    assert [j.received for j in joinables] == ['%05d' % i
+                                               for i in range(20)]
+    for a, b in pairs:
+        a.close()
+        b.close()
+
+
+def test_join_alternate_poller(loopback_server):
+    orig_poller = async.DefaultPoller
+    async.DefaultPoller = selectors.SelectSelector
+    try:
+        client = Client()
+        resps = [client.get.async(loopback_server.url('/%s' % i))
+                 for i in range(10)]
+        async.join(resps, timeout=5.0)
+    finally:
+        async.DefaultPoller = orig_poller
+    assert all([r.is_complete for r in resps])
+    assert [r.get_data() for r in resps] == ['hello'] * 10
+
+
+def test_join_pooled_handoff(loopback_server):
+    # more requests than connections, so sockets get handed from one
+    # response to the next within a single join
+    from hematite.pool import ConnectionPool
+    client = Client(pool=ConnectionPool(max_per_host=2))
+    resps = [client.get.async(loopback_server.url('/%s' % i))
+             for i in range(8)]
+    async.join(resps, timeout=5.0)
+    assert all([r.is_complete for r in resps])
+    assert loopback_server.connection_count == 2
+
+
+class DeadlineJoinable(SocketJoinable):
+    "Never gets its data, and gives up at its deadline."
+    def __init__(self, sock, deadline):
+        super(DeadlineJoinable, self).__init__(sock, 1)
+        self.deadline = deadline
+        self.expired = False
+
+    @property
+    def want_read(self):
+        return not self.expired
+
+    def check_deadline(self, now):
+        self.expired = now >= self.deadline
+        if not self.expired:
+            return False
+        self.deadline = None
+        return True
+
+
+def test_join_deadlines():
+    pairs = [socket.socketpair() for i in range(3)]
+    now = monotonic()
+    joinables = [DeadlineJoinable(a, now + t)
+                 for (a, b), t in zip(pairs, [0.05, 0.1, 0.15])]
+    async.join(joinables, timeout=5.0)
+    # the poller woke up for each deadline, rather than the timeout
+    assert monotonic() - now < 1.0
+    assert all([j.expired for j in joinables])
+    for a, b in pairs:
+        a.close()
+        b.close()
+
+
+def test_join_forced():
+    # e.g., waiting on a pool slot held outside the join
+    waiting = ForcedJoinable(writes=10 ** 9)
+    async.join([waiting], timeout=0.3, select_timeout=0.05)
+    assert 2 <= waiting.write_count <= 10
+
+    # but not before the first write
+    start = monotonic()
+    async.join([ForcedJoinable(writes=1)], select_timeout=1.0)
+    assert monotonic() - start < 0.5
+
+def test_join_request_timeouts(loopback_server):
+    def slow(head, body):
+        time.sleep(1.0)
+        return make_response()
+    loopback_server.routes['/slow'] = slow
+    client = Client()
+    slow_resps = [client.get.async(loopback_server.url('/slow'),
+                                   timeout=0.2),
+                  client.get.async(loopback_server.url('/slow'),
+                                   read_timeout=0.2)]
+    resps = [client.get.async(loopback_server.url('/%s' % i))
+             for i in range(5)]
+    start = monotonic()
+    async.join(slow_resps + resps, timeout=5.0)
+    assert monotonic() - start < 0.9
+    assert all([r.is_complete for r in resps])
+    for resp in slow_resps:
+        assert not resp.is_complete
+        assert isinstance(resp.error, RequestTimeout)
+        assert resp.deadline is None
+    assert 'complete within' in str(slow_resps[0].error)
+    assert 'no data' in str(slow_resps[1].error)
+
+
+def test_connect_deadline():
+    from hematite.client import ClientResponse
+    from hematite.request import Request
+    resp = ClientResponse(Client(), Request('GET', 'http://example.com/'),
+                          connect_timeout=1.0, read_timeout=2.0)
+    assert resp.deadline is None  # not started yet
+    resp.metrics.marks.update(started=10.0, pool_acquired=10.5)
+    assert resp.deadline == 11.5
+    assert not resp.check_deadline(11.0)
+    assert resp.check_deadline(11.5)
+    assert 'connect' in str(resp.error)
+    assert resp.deadline is None
+
+
+def test_fetch_many(loopback_server):
+    pulled = []
+
+    def gen_urls():
+        for i in range(30):
+            pulled.append(i)
+            yield loopback_server.url('/%s' % i)
+
+    client = Client()
+    fetched = client.fetch_many(gen_urls(), concurrency=4)
+    first = next(fetched)
+    assert first.is_complete
+    assert len(pulled) <= 4 + 4  # in flight, plus waiting on a slot
+    resps = [first] + list(fetched)
+    assert len(resps) == 30
+    assert all([r.is_complete for r in resps])
+    assert sorted([r.raw_request.url for r in resps]) == sorted(
+        ['/%s' % i for i in range(30)])
+    # pooled connections were reused, rather than 30 being opened
+    assert loopback_server.connection_count <= 4
+
+
+def test_fetch_many_per_host(loopback_server):
+    other_server = LoopbackServer()
+    try:
+        urls = ([loopback_server.url('/') for i in range(10)]
+                + [other_server.url('/') for i in range(10)])
+        client = Client()
+        resps = list(client.fetch_many(urls, concurrency=8, per_host=2))
+        assert len(resps) == 20
+        assert all([r.is_complete for r in resps])
+        assert loopback_server.connection_count <= 2
+        assert other_server.connection_count <= 2
+    finally:
+        other_server.stop()
+
+
+def test_fetch_many_failures(loopback_server):
+    def slow(head, body):
+        time.sleep(1.0)
+        return make_response()
+    loopback_server.routes['/slow'] = slow
+    urls = [loopback_server.url('/slow'), loopback_server.url('/fast')]
+    client = Client()
+    resps = list(client.fetch_many(urls, read_timeout=0.2))
+    assert [r.raw_request.url for r in resps] == ['/fast', '/slow']
+    assert resps[0].is_complete
+    assert isinstance(resps[1].error, RequestTimeout)
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+
+from hematite import bench
+
+
+def test_run_benchmarks(tmpdir):
+    benchmarks = bench.get_benchmarks()
+    names = [b.name for b in benchmarks]
+    assert len(names) == len(set(names))
+    assert bench.get_benchmarks(['loopback.']) == [
+        b for b in benchmarks if b.name.startswith('loopback.')]
+
+    results = bench.run_benchmarks(benchmarks, repeat=1, scale=0.001)
+    assert sorted(results['results']) == sorted(names)
+    for result in results['results'].values():
+        assert result['number'] >= 1
+        assert 0 < result['min'] <= result['median'] <= result['max']
+
+    path = str(tmpdir.join('results.json'))
+    bench.save_results(results, path)
+    loaded = bench.load_results(path)
+    comparison = bench.compare_results(loaded, results)
+    assert [c[0] for c in comparison] == sorted(names)
+    assert not any([c[-1] for c in comparison])
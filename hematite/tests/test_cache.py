@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+
+import zlib
+import time
+
+from hematite.cache import (HTTPCache, CacheEntry, MemoryCacheStorage,
+                            DiskCacheStorage, StoreCacheStorage)
+from hematite.client import Client
+from hematite.request import Request
+from hematite.tests.pytest_support import make_response
+
+LAST_MODIFIED = 'Sat, 05 Nov 1994 11:32:01 GMT'
+
+
+def _get_count(server, path):
+    return len([head for head, _ in server.requests
+                if head.split(' ', 2)[1] == path])
+
+
+def test_fresh_hit(loopback_server):
+    loopback_server.routes['/fresh'] = make_response(
+        'fresh', headers=[('Cache-Control', 'max-age=60')])
+    client = Client(cache=HTTPCache())
+    url = loopback_server.url('/fresh')
+
+    first = client.get(url)
+    assert not first.from_cache
+    second = client.get(url)
+    assert second.from_cache
+    assert second.get_data() == 'fresh'
+    assert second.raw_response.headers['Age'] == '0'
+    assert _get_count(loopback_server, '/fresh') == 1
+
+    client.post(url, body='x')  # unsafe methods invalidate
+    assert not client.get(url).from_cache
+    assert _get_count(loopback_server, '/fresh') == 3
+
+
+def test_decoded_hit(loopback_server):
+    data = 'plain text, more than once, ' * 3
+    gzipper = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    gzipped = gzipper.compress(data) + gzipper.flush()
+    loopback_server.routes['/gzip'] = make_response(
+        gzipped, headers=[('Content-Encoding', 'gzip'),
+                          ('Cache-Control', 'max-age=60')])
+    loopback_server.routes['/chunked'] = (
+        'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n'
+        'Cache-Control: max-age=60\r\n\r\n5\r\nhello\r\n0\r\n\r\n')
+    client = Client(cache=HTTPCache())
+
+    for path, expected in (('/gzip', data), ('/chunked', 'hello')):
+        url = loopback_server.url(path)
+        assert client.get(url).get_data() == expected
+        cached = client.get(url)
+        assert cached.from_cache
+        assert cached.get_data() == expected
+        headers = cached.raw_response.headers
+        assert headers['Content-Length'] == str(len(expected))
+        assert 'Content-Encoding' not in headers
+        assert 'Transfer-Encoding' not in headers
+
+
+def test_not_cached(loopback_server):
+    loopback_server.routes['/no-store'] = make_response(
+        headers=[('Cache-Control', 'no-store, max-age=60')])
+    loopback_server.routes['/plain'] = make_response()
+    client = Client(cache=HTTPCache())
+    for path in ('/no-store', '/plain'):
+        for _ in range(2):
+            assert not client.get(loopback_server.url(path)).from_cache
+        assert _get_count(loopback_server, path) == 2
+    assert len(client.cache.storage) == 0
+
+
+def test_revalidate(loopback_server):
+    def respond(head, body):
+        if 'if-none-match: "v1"' in head.lower():
+            return make_response('', status='304 Not Modified',
+                                 headers=[('ETag', '"v1"'),
+                                          ('Cache-Control', 'max-age=60')])
+        return make_response('payload', headers=[('ETag', '"v1"'),
+                                                 ('Cache-Control', 'no-cache'),
+                                                 ('X-Version', '1')])
+    loopback_server.routes['/etag'] = respond
+    client = Client(cache=HTTPCache())
+    url = loopback_server.url('/etag')
+
+    assert not client.get(url).from_cache
+    second = client.get(url)
+    assert second.from_cache
+    assert second.raw_response.status_code == 200
+    assert second.get_data() == 'payload'
+    assert second.raw_response.headers['X-Version'] == '1'
+    assert 'if-none-match: "v1"' in loopback_server.requests[-1][0].lower()
+    # the 304 updated the entry's freshness
+    third = client.get(url)
+    assert third.from_cache
+    assert _get_count(loopback_server, '/etag') == 2
+
+
+def test_last_modified(loopback_server):
+    def respond(head, body):
+        if 'if-modified-since' in head.lower():
+            return make_response('', status='304 Not Modified')
+        return make_response('dated', headers=[('Last-Modified',
+                                                LAST_MODIFIED),
+                                               ('Cache-Control',
+                                                'max-age=0')])
+    loopback_server.routes['/dated'] = respond
+    client = Client(cache=HTTPCache())
+    url = loopback_server.url('/dated')
+    client.get(url)
+    second = client.get(url)
+    assert second.from_cache
+    assert second.get_data() == 'dated'
+    head = loopback_server.requests[-1][0]
+    assert 'If-Modified-Since: ' + LAST_MODIFIED in head
+
+
+def test_vary(loopback_server):
+    def respond(head, body):
+        lang = 'fr' if 'x-lang: fr' in head.lower() else 'en'
+        return make_response(lang, headers=[('Vary', 'X-Lang'),
+                                            ('Cache-Control', 'max-age=60')])
+    loopback_server.routes['/vary'] = respond
+    client = Client(cache=HTTPCache())
+    url = loopback_server.url('/vary')
+
+    def get(lang):
+        req = Request('GET', url)
+        client.populate_headers(req)
+        req.headers['X-Lang'] = lang
+        return client.request(req)
+
+    assert get('en').get_data() == 'en'
+    assert get('fr').get_data() == 'fr'
+    en, fr = get('en'), get('fr')
+    assert en.from_cache and en.get_data() == 'en'
+    assert fr.from_cache and fr.get_data() == 'fr'
+    assert _get_count(loopback_server, '/vary') == 2
+
+
+def _make_entry(body, lifetime=60):
+    return CacheEntry('HTTP/1.1 200 OK', [('Content-Length', str(len(body))),
+                                          ('ETag', '"x"')],
+                      body, lifetime=lifetime, etag='"x"')
+
+
+def test_entry_freshness():
+    entry = _make_entry('abc')
+    now = entry.response_time
+    assert entry.is_fresh(now)
+    assert not entry.is_fresh(now + 61)
+    assert not entry.is_fresh(now + 10, max_age=5)
+    entry.age = 100
+    assert not entry.is_fresh(now)
+
+
+def test_memory_storage_budget():
+    entry_size = _make_entry('x' * 100).size
+    storage = MemoryCacheStorage(max_bytes=entry_size * 2)
+    for key in 'abc':
+        storage.set(key, [_make_entry('x' * 100)])
+    assert storage.get('a') is None
+    assert storage.size == entry_size * 2
+    storage.get('b')  # now most recently used
+    storage.set('d', [_make_entry('x' * 100)])
+    assert storage.get('c') is None
+    assert storage.get('b') is not None
+
+    storage.set('huge', [_make_entry('x' * entry_size * 3)])
+    assert storage.get('huge') is None
+
+
+def test_disk_storage(tmpdir):
+    storage = DiskCacheStorage(str(tmpdir.join('cache')))
+    assert storage.get(u'GET http://example.com/') is None
+    entries = [_make_entry('\xff\x00\n' * 10), _make_entry('')]
+    entries[0].vary = (('accept-language', 'fr'),)
+    storage.set(u'GET http://example.com/', entries)
+
+    loaded = storage.get(u'GET http://example.com/')
+    assert [e.body for e in loaded] == [e.body for e in entries]
+    assert loaded[0].vary == (('accept-language', 'fr'),)
+    assert loaded[0].etag == '"x"'
+    assert loaded[0].lifetime == 60
+    assert loaded[0].headers['Content-Length'] == '30'
+    assert loaded[0].is_fresh(time.time())
+
+    path = storage.get_path(u'GET http://example.com/')
+    with open(path, 'wb') as f:
+        f.write('garbage')
+    assert storage.get(u'GET http://example.com/') is None
+    storage.delete(u'GET http://example.com/')
+    storage.delete(u'GET http://example.com/')
+
+
+def test_store_storage(tmpdir, loopback_server):
+    path = str(tmpdir.join('cache'))
+    storage = StoreCacheStorage(path)
+    assert storage.get(u'GET http://example.com/') is None
+    entries = [_make_entry('\xff\x00\n' * 10), _make_entry('')]
+    entries[0].vary = (('accept-language', 'fr'),)
+    storage.set(u'GET http://example.com/', entries)
+    storage.close()
+
+    storage = StoreCacheStorage(path)
+    loaded = storage.get(u'GET http://example.com/')
+    assert isinstance(loaded[0].body, memoryview)  # read from the map
+    assert [e.body.tobytes() for e in loaded] == [e.body for e in entries]
+    assert loaded[0].vary == (('accept-language', 'fr'),)
+    assert loaded[0].etag == '"x"'
+    assert loaded[0].is_fresh(time.time())
+    storage.delete(u'GET http://example.com/')
+    assert storage.get(u'GET http://example.com/') is None
+    storage.set(u'GET ' + u'x' * 2 ** 16, entries)  # too long, not kept
+
+    def respond(head, body):
+        lang = 'fr' if 'x-lang: fr' in head.lower() else 'en'
+        return make_response(lang, headers=[('Vary', 'X-Lang'),
+                                            ('Cache-Control', 'max-age=60')])
+    loopback_server.routes['/vary'] = respond
+    client = Client(cache=HTTPCache(storage))
+    url = loopback_server.url('/vary')
+
+    def get(lang):
+        req = Request('GET', url)
+        client.populate_headers(req)
+        req.headers['X-Lang'] = lang
+        return client.request(req)
+
+    # the second variant is stored along with the first, as loaded
+    assert [get(lang).get_data() for lang in ('en', 'fr')] == ['en', 'fr']
+    en, fr = get('en'), get('fr')
+    assert en.from_cache and en.get_data() == 'en'
+    assert fr.from_cache and fr.get_data() == 'fr'
+    assert _get_count(loopback_server, '/vary') == 2
+    storage.close()
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+from hematite.client import Client
+from hematite.tests.pytest_support import make_response
+
+
+def test_file_body(loopback_server, tmpdir):
+    content = 'a' * 100000 + 'z'
+    path = tmpdir.join('upload')
+    path.write(content, mode='wb')
+    loopback_server.routes['/echo'] = lambda head, body: make_response(body)
+
+    client = Client()
+    with open(str(path), 'rb') as f:
+        resp = client.post(loopback_server.url('/echo'), body=f)
+    assert resp.get_data() == content
+    head, body = loopback_server.requests[-1]
+    assert 'content-length: 100001' in head.lower()
+
+
+def test_template_send(loopback_server):
+    def respond(head, body):
+        etag = '"v2"' if 'if-none-match: "v1"' in head.lower() else '"v1"'
+        return make_response(body, headers=[('ETag', etag)])
+    loopback_server.routes['/poll'] = respond
+
+    client = Client()
+    tmpl = client.get_template(loopback_server.url('/poll'))
+    etag = None
+    for _ in range(2):
+        resp = client.request(tmpl.to_raw_request({'If-None-Match': etag}))
+        etag = resp.raw_response.headers['ETag']
+    assert etag == '"v2"'
+    resp = client.request(tmpl.to_raw_request(body='ping'))
+    assert resp.get_data() == 'ping'
+
+    heads = [head for head, _ in loopback_server.requests]
+    assert 'If-None-Match' not in heads[0]
+    assert 'If-None-Match: "v1"' in heads[1]
+    assert all(['User-Agent: Hematite' in head for head in heads])
+    assert loopback_server.connection_count == 1
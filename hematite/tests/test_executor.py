@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+import socket
+
+from hematite.executor import HashRing, ShardedExecutor
+from hematite.url import URL
+from hematite.request import Request
+from hematite.tests.pytest_support import make_response
+
+
+def test_hash_ring():
+    keys = ['host%s.example.com' % i for i in range(1000)]
+    ring = HashRing(range(4))
+    before = dict([(k, ring.get_node(k)) for k in keys])
+    counts = [before.values().count(n) for n in range(4)]
+    assert min(counts) > 100  # roughly even
+
+    ring.remove_node(3)
+    after = dict([(k, ring.get_node(k)) for k in keys])
+    moved = [k for k in keys if before[k] != after[k]]
+    # only the removed node's keys move
+    assert all([before[k] == 3 for k in moved])
+    assert 3 not in after.values()
+
+
+def test_sharded_fetch(loopback_server):
+    loopback_server.routes['/echo'] = lambda head, body: make_response(body)
+    closed = socket.socket()
+    closed.bind(('127.0.0.1', 0))
+    closed_url = 'http://127.0.0.1:%s/' % closed.getsockname()[1]
+    closed.close()
+
+    requests = [loopback_server.url('/%s' % i) for i in range(20)]
+    requests.append(Request('POST', loopback_server.url('/echo'),
+                            body='ping'))
+    requests.append(closed_url)
+    with ShardedExecutor(workers=2, concurrency=4) as executor:
+        assert (executor.get_worker(URL(requests[0].decode('ascii')))
+                == executor.get_worker(URL(requests[1].decode('ascii'))))
+        results = sorted(executor.fetch(iter(requests)))
+    assert [r.index for r in results] == range(22)
+    for result in results[:20]:
+        assert result.error is None
+        assert result.raw_response.status_code == 200
+        assert result.raw_response.body.data == 'hello'
+    assert results[20].raw_response.body.data == 'ping'
+    assert results[21].raw_response is None
+    assert results[21].error
+    assert results[21].url == closed_url.decode('ascii')
+    # all of the loopback server's requests went to one worker's pool
+    assert loopback_server.connection_count <= 4
+
+
+def test_close_abandoned_fetch(loopback_server):
+    # more results than fit in the pipe, with only one of them fetched
+    loopback_server.routes['/large'] = make_response('x' * 2 ** 16)
+    requests = [loopback_server.url('/large')] * 8
+    executor = ShardedExecutor(workers=2, concurrency=4)
+    results = executor.fetch(requests)
+    assert next(results).error is None
+    executor.close()
+    assert not executor.processes
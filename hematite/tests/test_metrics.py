@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from hematite.client import Client
+from hematite.metrics import RequestMetrics, MetricsCollector
+from hematite.raw.parser import IncompleteBody
+from hematite.request import Request
+from hematite.tests.pytest_support import make_response
+
+
+def test_metrics_marks():
+    now = [1.0]
+    metrics = RequestMetrics(clock=lambda: now[0])
+    now[0] = 2.0
+    metrics.mark('started')
+    now[0] = 3.5
+    metrics.mark('complete')
+    now[0] = 9.0
+    metrics.mark('complete')  # the first mark sticks
+    assert metrics.get_duration('total') == 1.5
+    assert metrics.get_duration('dns') is None
+    assert metrics.durations == {'total': 1.5}
+    assert metrics.to_dict()['marks'] == {'created': 0.0,
+                                          'started': 1.0,
+                                          'complete': 2.5}
+    with pytest.raises(ValueError):
+        metrics.get_duration('nonexistent')
+
+
+def test_collector_batches():
+    batches = []
+    collector = MetricsCollector(batches.append, batch_size=2)
+    for i in range(3):
+        collector.add(i)
+    assert batches == [[0, 1]]
+    collector.flush()
+    collector.flush()
+    assert batches == [[0, 1], [2]]
+
+
+def test_client_metrics(loopback_server):
+    loopback_server.routes['/echo'] = lambda head, body: make_response(body)
+    batches = []
+    client = Client(metrics_sink=batches.append)
+    req = Request('POST', loopback_server.url('/echo'), body='ping')
+    first = client.request(req)
+    second = client.get(loopback_server.url('/'))
+    assert batches == []
+    client.flush_metrics()
+    assert batches == [[first.metrics, second.metrics]]
+
+    metrics = first.metrics
+    assert metrics.method == 'POST'
+    assert metrics.status_code == 200
+    assert metrics.error is None
+    assert not metrics.reused_connection
+    assert metrics.request_body_bytes == 4
+    assert metrics.request_header_bytes == len(req.to_bytes()) - 4
+    assert metrics.response_body_bytes == 4
+    assert metrics.response_header_bytes == len(make_response('ping')) - 4
+    durations = metrics.durations
+    for phase in ('pool_wait', 'dns', 'connect', 'send', 'wait',
+                  'headers', 'body', 'ttfb', 'total'):
+        assert durations[phase] >= 0
+    assert 'tls' not in durations
+    assert durations['total'] >= durations['ttfb']
+
+    metrics = second.metrics
+    assert metrics.reused_connection
+    assert metrics.response_body_bytes == len('hello')
+    assert 'dns' not in metrics.durations
+    assert 'connect' not in metrics.durations
+
+
+def test_client_metrics_error(loopback_server):
+    loopback_server.routes['/short'] = ('HTTP/1.1 200 OK\r\n'
+                                        'Content-Length: 10\r\n'
+                                        'Connection: close\r\n'
+                                        '\r\nshort')
+    batches = []
+    client = Client(metrics_sink=batches.append)
+    with pytest.raises(IncompleteBody):
+        client.get(loopback_server.url('/short'))
+    client.flush_metrics()
+    [[metrics]] = batches
+    assert isinstance(metrics.error, IncompleteBody)
+    assert metrics.response_body_bytes == 5
+    assert 'complete' not in metrics.marks
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+from hematite.client import Client
+from hematite.request import Request
+from hematite.tests.pytest_support import make_response
+
+
+def _requests(server, paths, method='GET'):
+    return [Request(method, server.url(path)) for path in paths]
+
+
+def test_pipeline(loopback_server):
+    loopback_server.routes['/a'] = make_response('first')
+    loopback_server.routes['/b'] = make_response(
+        '5\r\nsecon\r\n1\r\nd\r\n0\r\n\r\n',
+        headers=[('Transfer-Encoding', 'chunked')])
+    loopback_server.routes['/empty'] = 'HTTP/1.1 204 No Content\r\n\r\n'
+    client = Client()
+    reqs = _requests(loopback_server, ['/a', '/b', '/empty'])
+    reqs.append(Request('HEAD', loopback_server.url('/a')))
+    resps = client.pipeline(reqs)
+
+    assert [r.is_complete for r in resps] == [True] * 4
+    assert [r.get_data() for r in resps] == ['first', 'second', '', '']
+    assert resps[3].response.status_code == 200
+    assert loopback_server.connection_count == 1
+    assert len(loopback_server.requests) == 4
+
+    # the connection went back to the pool afterwards
+    client.get(loopback_server.url('/'))
+    assert loopback_server.connection_count == 1
+
+
+def test_pipeline_closed_early(loopback_server):
+    loopback_server.routes['/close'] = make_response(
+        'bye', headers=[('Connection', 'close')])
+    client = Client()
+    resps = client.pipeline(_requests(loopback_server,
+                                      ['/', '/close', '/', '/']))
+    assert [r.is_complete for r in resps] == [True, True, False, False]
+    assert resps[1].get_data() == 'bye'
+    assert resps[2].error is not None
+    assert client.pool.get_idle_count(resps[0].pool_key) == 0
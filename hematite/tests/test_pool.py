@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+import time
+import socket
+
+from hematite import async
+from hematite.client import Client
+from hematite.pool import ConnectionPool, PooledConnection
+from hematite.tests.pytest_support import make_response
+
+KEY = ('http', 'example.com', 80)
+
+
+def _connected(pool, key=KEY):
+    conn = pool.acquire(key)
+    conn.socket, conn._peer = socket.socketpair()
+    return conn
+
+
+def test_pool_limits():
+    pool = ConnectionPool(max_per_host=2, max_idle_per_host=1)
+    first, second = _connected(pool), _connected(pool)
+    assert pool.acquire(KEY) is None
+    assert pool.acquire(('http', 'example.org', 80)) is not None
+
+    pool.release(first)
+    pool.release(second)  # beyond max_idle_per_host, so it's closed
+    assert pool.get_idle_count(KEY) == 1
+    assert second.socket is None
+
+    assert pool.acquire(KEY) is first
+    assert pool.get_active_count(KEY) == 1
+
+
+def test_pool_drops_stale_and_expired():
+    pool = ConnectionPool(idle_timeout=10.0)
+    conn = _connected(pool)
+    pool.release(conn)
+    conn._peer.close()  # server hung up while idle
+    new_conn = pool.acquire(KEY)
+    assert new_conn is not conn
+    assert isinstance(new_conn, PooledConnection)
+    assert not new_conn.is_connected
+
+    pool = ConnectionPool(idle_timeout=10.0)
+    conn = _connected(pool)
+    pool.release(conn)
+    conn.last_released -= 11.0
+    pool.evict_idle()
+    assert pool.get_idle_count(KEY) == 0
+    assert conn.socket is None
+
+
+def test_client_reuses_connection(loopback_server):
+    client = Client()
+    first = client.get(loopback_server.url('/one'))
+    second = client.get(loopback_server.url('/two'))
+    assert first.response.status_code == second.response.status_code == 200
+    assert second.get_data() == 'hello'
+    assert not first.reused_connection
+    assert second.reused_connection
+    assert loopback_server.connection_count == 1
+    # the connection's parsers were reset for the second request
+    assert second.reader is first.reader
+    assert second.writer is first.writer
+    assert first.raw_response is not second.raw_response
+    assert first.get_data() == 'hello'
+
+
+def test_client_honors_connection_close(loopback_server):
+    closing_resp = make_response(headers=[('Connection', 'close')])
+    loopback_server.routes['/close'] = closing_resp
+    client = Client()
+    client.get(loopback_server.url('/close'))
+    second = client.get(loopback_server.url('/close'))
+    assert not second.reused_connection
+    assert loopback_server.connection_count == 2
+
+
+def test_join_timeout_releases_slot(loopback_server):
+    def slow(head, body):
+        time.sleep(0.5)
+        return make_response()
+    loopback_server.routes['/slow'] = slow
+    client = Client(pool=ConnectionPool(max_per_host=1))
+
+    abandoned = client.get.async(loopback_server.url('/slow'))
+    async.join([abandoned], timeout=0.1)
+    assert not abandoned.is_complete
+    assert client.pool.get_active_count(('http', loopback_server.host,
+                                         loopback_server.port)) == 0
+    assert client.get(loopback_server.url('/'), timeout=2.0).get_data()
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+import select
+import time
+
+import pytest
+
+from hematite import async
+from hematite.compat import monotonic
+from hematite.raw.parser import ResponseReader
+from hematite.request import Request
+from hematite.replay import (TrafficRecording, RecordingClient, ReplayClient,
+                             ReplayDriver, ReplayError, ReplaySocket, _Pacer)
+from hematite.tests.pytest_support import LoopbackServer, make_response
+
+CHUNKED = ('HTTP/1.1 200 OK\r\n'
+           'Transfer-Encoding: chunked\r\n'
+           '\r\n'
+           '5\r\nhello\r\n6\r\n world\r\n0\r\n\r\n')
+
+
+def _record(tmpdir):
+    server = LoopbackServer({'/one': make_response('one'),
+                             '/chunked': CHUNKED})
+    counter = []
+
+    def count_up(head, body):
+        counter.append(head)
+        return make_response(str(len(counter)))
+    server.routes['/count'] = count_up
+    recording = TrafficRecording(str(tmpdir.join('traffic')))
+    try:
+        client = RecordingClient(recording)
+        for path in ('/one', '/chunked', '/count', '/count'):
+            assert client.get(server.url(path)).is_complete
+    finally:
+        server.stop()
+    return server, recording
+
+
+def test_record_replay(tmpdir):
+    server, recording = _record(tmpdir)
+    assert len(recording) == 4
+    recording.close()
+
+    recording = TrafficRecording(str(tmpdir.join('traffic')))
+    client = ReplayClient(recording)
+    assert client.get(server.url('/one')).get_data() == 'one'
+    resp = client.get(server.url('/chunked'))
+    assert resp.get_data() == 'hello world'
+    assert resp.raw_response.chunked
+    # responses recorded for the same request are replayed in turn
+    assert [client.get(server.url('/count')).get_data()
+            for _ in range(3)] == ['1', '2', '1']
+
+    resps = [client.get.async(server.url('/one')) for _ in range(20)]
+    async.join(resps, timeout=5.0)
+    assert all([r.get_data() == 'one' for r in resps])
+    # replayed connections are pooled like any other
+    assert client.pool.get_idle_count(resps[0].pool_key) > 0
+
+    with pytest.raises(ReplayError):
+        client.get(server.url('/missing'))
+
+
+def test_replay_paced(tmpdir):
+    server, recording = _record(tmpdir)
+    wire, _ = recording.get(u'GET ' + server.url('/one').decode('ascii'))
+    # pretend the response arrived in two chunks, the second 0.1s late
+    recording.add(u'GET http://example.com/slow', wire,
+                  [(10, 0.0), (len(wire), 0.1)])
+    client = ReplayClient(recording, paced=True)
+
+    start = time.time()
+    resp = client.get('http://example.com/slow')
+    assert resp.get_data() == 'one'
+    assert time.time() - start >= 0.1
+    headers_only = client.get('http://example.com/slow',
+                              autoload_body=False)
+    assert headers_only.headers_received
+    assert ''.join(headers_only.iter_content(1)) == 'one'
+
+    start = time.time()
+    assert ReplayClient(recording).get(
+        'http://example.com/slow').get_data() == 'one'
+    assert time.time() - start < 0.1
+
+
+def test_replay_paced_late_read():
+    wire = make_response('one')
+    # a pacer running late: the second chunk's read before its signal
+    pacer = _Pacer(clock=lambda: monotonic() - 0.2)
+    sock = ReplaySocket()
+    rreq = Request('GET', 'http://example.com/').to_raw_request()
+    driver = ReplayDriver(sock, ResponseReader(), rreq.get_writer(),
+                          wire, [(10, 0.0), (len(wire), 0.05)],
+                          pacer=pacer)
+    try:
+        assert driver.write()
+        time.sleep(0.1)
+        assert driver.read()
+        assert driver.reader.raw_response.body.data == 'one'
+        time.sleep(0.3)
+        # otherwise a pooled connection would look stale
+        assert select.select([sock], [], [], 0)[0] == []
+    finally:
+        sock.close()
@@ -1,6 +1,10 @@
 # -*- coding: utf-8 -*-
 
-from hematite.request import Request
+from io import BytesIO
+
+import pytest
+
+from hematite.request import Request, RequestTemplate
 
 BASIC_REQ = '\r\n'.join(['GET /html/rfc3986 HTTP/1.1',
                          'Host: tooxols.ietf.org',
@@ -45,3 +49,35 @@ def test_wikipedia_req():
     assert req.connection == 'keep-alive'
     re_req = req.to_bytes()
     assert _cmpable_req(re_req) == _cmpable_req(WP_REQ)
+
+
+def test_file_body():
+    req = Request('POST', 'http://example.com/', body=BytesIO('hi'))
+    assert req.content_length == 2
+    assert req.to_bytes().endswith('\r\n\r\nhi')
+
+
+def test_template():
+    req = Request('GET', 'http://example.com/feed?a=b c')
+    req.headers['Authorization'] = 'Basic abc'
+    req.headers['X-Other'] = 'same'
+    tmpl = RequestTemplate(req)
+    assert _cmpable_req(tmpl.get_head()) == _cmpable_req(req.to_bytes())
+
+    req.if_none_match = '"v2"'
+    assert (_cmpable_req(tmpl.get_head({'if-none-match': '"v2"'}))
+            == _cmpable_req(req.to_bytes()))
+    assert 'Authorization' not in tmpl.get_head({'Authorization': None})
+
+    rreq = tmpl.to_raw_request({'If-None-Match': '"v3"'}, body='hello')
+    assert rreq.to_bytes() == rreq.head + 'hello'
+    assert rreq.headers['Content-Length'] == '5'
+    assert rreq.headers['If-None-Match'] == '"v3"'
+    assert rreq.headers['X-Other'] == 'same'
+
+    with pytest.raises(ValueError):
+        tmpl.get_head({'X-Other': 'different'})
+    with pytest.raises(ValueError):
+        RequestTemplate(req, slots=()).to_raw_request(body='hello')
+    with pytest.raises(ValueError):
+        RequestTemplate(Request('POST', 'http://example.com/', body='x'))
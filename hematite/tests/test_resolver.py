@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+import select
+import socket
+
+import pytest
+
+from hematite import resolver
+from hematite.url import URL
+from hematite.client import Client
+from hematite.pool import ConnectionPool
+
+
+def test_lookup_cache():
+    res = resolver.Resolver(max_workers=2)
+    url = URL(u'http://localhost:8080/')
+    lookup = res.lookup(url)
+    assert not lookup.cached
+    readable, _, _ = select.select([lookup], [], [], 5.0)
+    assert readable and lookup.done
+    family, socktype = lookup.get_result()[:2]
+    assert socktype == socket.SOCK_STREAM
+    assert lookup.fileno() is None  # pipe closed once consumed
+
+    second = res.lookup(URL(u'http://LOCALHOST:8080/other'))
+    assert second.cached and second.done
+    assert second.get_result() == lookup.result
+    assert (res.hits, res.misses) == (1, 1)
+
+
+def test_negative_cache(monkeypatch):
+    calls = []
+
+    def _fail_lookup(url):
+        calls.append(url)
+        raise socket.gaierror(socket.EAI_NONAME, 'no such host')
+
+    monkeypatch.setattr(resolver, 'lookup_url', _fail_lookup)
+    res = resolver.Resolver(negative_ttl=60.0)
+    url = URL(u'http://nonexistent.invalid/')
+    for i in range(3):
+        with pytest.raises(socket.gaierror):
+            res.resolve(url)
+    assert len(calls) == 1
+
+    res.negative_ttl = -1.0
+    res.clear()
+    with pytest.raises(socket.gaierror):
+        res.resolve(url)
+    with pytest.raises(socket.gaierror):
+        res.resolve(url)
+    assert len(calls) == 3
+
+
+def test_client_resolver_timings(loopback_server):
+    client = Client(pool=ConnectionPool(max_idle_per_host=0))
+    url = 'http://localhost:%s/' % loopback_server.port
+    first = client.get(url)
+    second = client.get(url)
+    assert first.get_data() == second.get_data() == 'hello'
+    assert first.timings['resolver_misses'] == 1
+    assert second.timings['resolver_hits'] == 1
+    assert second.norm_timings['resolver_hits'] == 1
@@ -1,3 +1,4 @@
+import pytest
 
 from datetime import datetime
 
@@ -179,3 +180,32 @@ def test_folding_headers():
     rt_headers = resp._get_header_dict()
     cc_expected = 'must-revalidate, proxy-revalidate, no-cache'
     assert rt_headers['Cache-Control'] == cc_expected
+
+
+def test_lazy_headers():
+    resp = Response.from_bytes(RESP_200_BYTES)
+    assert 'Date' in resp._unparsed_headers
+    assert resp.headers['Date'] == 'Tue, 11 Mar 2014 06:29:33 GMT'
+    assert isinstance(resp.date, datetime)
+    assert 'Date' not in resp._unparsed_headers
+    assert isinstance(resp.headers['Date'], datetime)
+    # parsing in place keeps the original order
+    assert resp.to_bytes() == RESP_200_BYTES
+
+
+def test_lazy_headers_validation():
+    raw_resp_str = ('HTTP/1.1 200 OK\r\n'
+                    'Date: not a date\r\n'
+                    'Last-Modified: Mon, 10 Mar 2014 01:22:01 GMT\r\n'
+                    '\r\n')
+    resp = Response.from_bytes(raw_resp_str)  # not parsed yet
+    assert isinstance(resp.last_modified, datetime)
+    with pytest.raises(ValueError):
+        resp.date
+    with pytest.raises(ValueError):
+        resp.parse_headers()
+    assert resp.to_bytes() == raw_resp_str  # unparsed bytes pass through
+
+    raw_resp = RawResponse.from_bytes(raw_resp_str)
+    with pytest.raises(ValueError):
+        Response(200, headers=raw_resp.headers, eager_headers=True)
@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
+import pytest
+
 from hematite.serdes import (content_range_spec_from_bytes,
                              content_range_spec_to_bytes,
                              content_header_from_bytes,
@@ -88,6 +90,8 @@ def test_http_date_from_bytes():
     for serialized, expected in _DATE_TESTS:
         deserialized = http_date_from_bytes(serialized)
         assert str(deserialized) == expected
+    with pytest.raises(ValueError):
+        http_date_from_bytes('not a date')
 
 
 _CONTENT_TESTS = [('', ('', [])),
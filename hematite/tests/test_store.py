@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+import zlib
+
+import pytest
+
+from hematite.store import ResponseStore, StoreError, get_stored_headers
+from hematite.raw.response import RawResponse
+from hematite.raw.datastructures import Headers, Body
+
+
+def _make_raw_response(data, headers=(), **kw):
+    headers = Headers(list(headers) or [('Content-Type', 'text/plain')])
+    body = Body(**kw)
+    body.data_received(data)
+    body.complete(len(data))
+    return RawResponse(status_line='HTTP/1.1 200 OK', headers=headers,
+                       body=body)
+
+
+def test_store_roundtrip(tmpdir):
+    path = str(tmpdir.join('responses'))
+    with ResponseStore(path, capacity=4) as store:
+        for i in range(20):
+            store.add(u'GET /%s' % i, _make_raw_response('body %s' % i))
+        store.add(u'GET /3', _make_raw_response('newer'))
+        assert len(store) == 20
+        assert store.capacity >= 40
+        stored = store.get(u'GET /3')
+        assert u'GET /4' in store
+        assert u'GET /missing' not in store
+        assert store.get(u'GET /missing') is None
+
+    assert isinstance(stored.body, memoryview)
+    assert stored.body.tobytes() == 'newer'
+    assert stored.status_line.status_code == 200
+    assert stored.headers['Content-Length'] == '5'
+
+    with ResponseStore(path) as store:
+        assert len(store) == 20
+        assert sorted(store.iterkeys()) == sorted(['GET /%s' % i
+                                                   for i in range(20)])
+        rresp = store.get('GET /7').to_raw_response()
+        assert rresp.body.data == 'body 7'
+        assert rresp.headers['Content-Type'] == 'text/plain'
+
+        size = store.segment_size
+        store.compact()
+        assert store.segment_size < size
+        assert store.get('GET /3').body.tobytes() == 'newer'
+        assert len(store) == 20
+
+
+def test_store_recovery(tmpdir):
+    path = str(tmpdir.join('responses'))
+    with ResponseStore(path) as store:
+        store.add_bytes('a', 'HTTP/1.1 204 No Content\r\n\r\n', '')
+        store.add_bytes('b', 'HTTP/1.1 200 OK\r\n\r\n', 'bee')
+        size = store.segment_size
+    with open(path, 'ab') as f:
+        f.write('\x01\x00partial')  # a torn write
+    tmpdir.join('responses.idx').remove()
+
+    with ResponseStore(path) as store:
+        assert len(store) == 2
+        assert store.segment_size == size
+        assert store.get('a').status_line.status_code == 204
+        assert len(store.get('a').headers) == 0
+        assert store.get('b').body.tobytes() == 'bee'
+
+    with open(str(tmpdir.join('other')), 'wb') as f:
+        f.write('not a store')
+    with pytest.raises(StoreError):
+        ResponseStore(str(tmpdir.join('other')))
+
+
+def test_get_stored_headers():
+    data = 'decoded ' * 10
+    rresp = _make_raw_response(zlib.compress(data),
+                               headers=[('Content-Encoding', 'deflate'),
+                                        ('Transfer-Encoding', 'chunked')],
+                               decompression='deflate')
+    assert rresp.body.data == data
+    headers = get_stored_headers(rresp)
+    assert 'Content-Encoding' not in headers
+    assert 'Transfer-Encoding' not in headers
+    assert headers['Content-Length'] == str(len(data))
+    # the originals are left alone
+    assert rresp.headers['Content-Encoding'] == 'deflate'
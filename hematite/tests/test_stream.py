@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+import zlib
+
+from hematite.client import Client
+from hematite.request import Request
+from hematite.tests.pytest_support import make_response
+
+
+def _stream(client, url, high_water=None):
+    req = Request('GET', url)
+    client.populate_headers(req)
+    resp = client.request(req, autoload_body=False, async=True)
+    if high_water:
+        resp.high_water = high_water
+    return resp
+
+
+def test_iter_content(loopback_server):
+    body = ''.join([chr(ord('a') + i % 26) for i in range(100000)])
+    loopback_server.routes['/big'] = make_response(body)
+    client = Client()
+    resp = _stream(client, loopback_server.url('/big'), high_water=4096)
+
+    parts, pending = [], []
+    for part in resp.iter_content(1000):
+        parts.append(part)
+        pending.append(resp.raw_response.body.pending_size)
+    assert ''.join(parts) == body
+    assert set([len(p) for p in parts[:-1]]) == set([1000])
+    assert max(pending) < 4096
+    assert resp.is_complete
+    assert resp.response.status_code == 200
+    assert resp.get_data() is None  # streamed, so not kept
+
+    # the connection went back to the pool
+    client.get(loopback_server.url('/'))
+    assert loopback_server.connection_count == 1
+
+
+def test_iter_content_gzip(loopback_server):
+    body = 'x' * 2 ** 24
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    data = compressor.compress(body) + compressor.flush()
+    loopback_server.routes['/gzip'] = make_response(
+        data, headers=[('Content-Encoding', 'gzip')])
+    client = Client()
+    resp = _stream(client, loopback_server.url('/gzip'), high_water=4096)
+    resp._wait_for_headers()
+    raw_body = resp.raw_response.body
+    # what came in with the headers is left compressed
+    assert raw_body.length == raw_body.pending_size == 0
+
+    parts, pending = [], []
+    for part in resp.iter_content(1000):
+        parts.append(part)
+        pending.append(raw_body.pending_size)
+    assert ''.join(parts) == body
+    assert max(pending) <= 4096
+    client.get(loopback_server.url('/'))
+    assert loopback_server.connection_count == 1
+
+def test_iter_lines_chunked_gzip(loopback_server):
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    data = compressor.compress('one\r\ntwo\nthree') + compressor.flush()
+    chunked = ''.join(['%x\r\n%s\r\n' % (len(data[i:i + 5]), data[i:i + 5])
+                       for i in range(0, len(data), 5)]) + '0\r\n\r\n'
+    loopback_server.routes['/lines'] = make_response(
+        chunked, headers=[('Transfer-Encoding', 'chunked'),
+                          ('Content-Encoding', 'gzip')])
+    resp = _stream(Client(), loopback_server.url('/lines'))
+    assert list(resp.iter_lines(chunk_size=2)) == ['one', 'two', 'three']
+
+
+def test_iter_content_loaded(loopback_server):
+    resp = Client().get(loopback_server.url('/'))
+    assert list(resp.iter_content(2)) == ['he', 'll', 'o']
+    assert resp.get_data() == 'hello'
+
+
+def test_iter_content_abandoned(loopback_server):
+    loopback_server.routes['/big'] = make_response('x' * 100000)
+    client = Client()
+    resp = _stream(client, loopback_server.url('/big'))
+    next(resp.iter_content(10))  # generator is dropped here
+    assert resp.connection is None
+    assert client.pool.get_idle_count(resp.pool_key) == 0